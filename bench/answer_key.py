@@ -0,0 +1,71 @@
+# Grading throughput: the precompiled AnswerKey against the former grading of SubjectService, which
+# rebuilt the concrete task models of the test and called check_answer of every task for each attempt.
+#
+#   python bench/answer_key.py [--attempts 20000]
+
+import random
+import argparse
+from datetime import datetime, timezone
+
+from bench_utils import seconds_per_call, print_table
+from subject_storage import bench_test, OPTIONS_COUNT, TASKS_COUNT
+
+from global_types.TaskTypes import SingleChoiceTask, MultipleChoiceTask, TaskType
+from global_types.TestTypes import Test
+from subject_service.AnswerKey import AnswerKey
+from subject_service.TestTypes import TestSolutionAttempt, CheckedAttempt
+
+
+def specify_test_tasks(test : Test) -> Test:
+    return Test(
+        info=test.info,
+        tasks=[SingleChoiceTask(question=task.question, tag=task.tag, options=task.options, type=task.type,
+                                answer=task.answer, points=task.points) if task.type == TaskType.SINGLE_CHOICE
+               else MultipleChoiceTask(question=task.question, tag=task.tag, options=task.options, type=task.type,
+                                       answer=task.answer, points=task.points) for task in test.tasks],
+        pass_percents=test.pass_percents
+    )
+
+
+def check_attempt(solution_attempt : TestSolutionAttempt, test : Test) -> CheckedAttempt:
+    test = specify_test_tasks(test)
+    task_points = [test.tasks[index].check_answer(answer) for index, answer in enumerate(solution_attempt.answers)]
+    attempt_points = sum(task_points)
+    overall_points = sum([task.points for task in test.tasks])
+    try:
+        attempt_percents = attempt_points / overall_points * 100
+    except Exception:
+        attempt_percents = 100
+    return CheckedAttempt(solution_attempt=solution_attempt, task_points=task_points, attempt_points=attempt_points,
+                          overall_points=overall_points, attempt_percents=attempt_percents,
+                          passed=(attempt_percents >= test.pass_percents))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--attempts', type=int, default=20000)
+    args = parser.parse_args()
+    random.seed(0)
+
+    test = bench_test()
+    solved_at = datetime.now(timezone.utc)
+    solution_attempts = [TestSolutionAttempt(solved_by=f'student_{index}', solved_at=solved_at, answers=[
+                             sorted(random.sample(range(OPTIONS_COUNT), random.randint(0, OPTIONS_COUNT))) if task_index % 2
+                             else random.randrange(OPTIONS_COUNT) for task_index in range(TASKS_COUNT)])
+                         for index in range(args.attempts)]
+    answer_key = AnswerKey(test)
+    if answer_key.check_many(solution_attempts) != [check_attempt(solution_attempt, test) for solution_attempt in solution_attempts]:
+        raise Exception('the answer key grades differently')
+
+    former = seconds_per_call(lambda: [check_attempt(solution_attempt, test) for solution_attempt in solution_attempts], number=1, repeat=3)
+    compiled = seconds_per_call(lambda: answer_key.check_many(solution_attempts), number=1, repeat=3)
+    with_compile = seconds_per_call(lambda: AnswerKey(test).check(solution_attempts[0]), number=1000)
+    print_table(['', 'attempts/s', 'us per attempt'], [
+        ['check_answer per task', f'{args.attempts / former:,.0f}', f'{former / args.attempts * 1e6:.1f}'],
+        ['AnswerKey.check_many', f'{args.attempts / compiled:,.0f}', f'{compiled / args.attempts * 1e6:.1f}'],
+        ['AnswerKey built per attempt', f'{1 / with_compile:,.0f}', f'{with_compile * 1e6:.1f}'],
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# Memory of --attempts checked attempts of one test instance with --tasks tasks, measured with tracemalloc.
+#
+# models: a list of CheckedAttempt models, how the attempts were kept before
+# table:  an AttemptTable, the attempts streamed in one by one like on load from the storage
+# Both are built from JSON rows, so the usernames and answers are allocated inside the measurement.
+# The run fails if the table does not give back the same attempts.
+#
+#   python bench/attempt_memory.py [--attempts 100000] [--tasks 20]
+
+import gc
+import random
+import argparse
+import tracemalloc
+
+from bench_utils import print_table
+from subject_storage import PUBLISHED_AT
+
+from global_types.TaskTypes import SingleChoiceTask, MultipleChoiceTask, TaskType
+from global_types.TestTypes import Test, TestInfo
+from subject_service.AnswerKey import AnswerKey
+from subject_service.AttemptTable import AttemptTable, Usernames
+from subject_service.TestTypes import TestSolutionAttempt, CheckedAttempt
+
+
+OPTIONS_COUNT = 4
+
+
+def memory_test(tasks_count : int) -> Test:
+    tasks = []
+    for index in range(tasks_count):
+        options = [f'option {option}' for option in range(OPTIONS_COUNT)]
+        if index % 2:
+            tasks.append(MultipleChoiceTask(question=f'question {index}', tag=f'tag {index % 3}', options=options,
+                                            answer=sorted({0, index % OPTIONS_COUNT}), points=2, type=TaskType.MULTIPLE_CHOICE))
+        else:
+            tasks.append(SingleChoiceTask(question=f'question {index}', tag=f'tag {index % 3}', options=options,
+                                          answer=index % OPTIONS_COUNT, points=1, type=TaskType.SINGLE_CHOICE))
+    return Test(info=TestInfo(id='mmm_test_0', name='bench', description='bench test'), tasks=tasks, pass_percents=50)
+
+
+def attempt_rows(test : Test, attempts_count : int) -> list[str]:
+    answer_key = AnswerKey(test)
+    return [answer_key.check(TestSolutionAttempt(solved_by=f'student_{index}', solved_at=PUBLISHED_AT, answers=[
+                sorted(random.sample(range(OPTIONS_COUNT), random.randint(0, OPTIONS_COUNT))) if task.type == TaskType.MULTIPLE_CHOICE
+                else random.randrange(OPTIONS_COUNT) for task in test.tasks])).model_dump_json()
+            for index in range(attempts_count)]
+
+
+def traced_bytes(build) -> tuple[object, int]:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--attempts', type=int, default=100000)
+    parser.add_argument('--tasks', type=int, default=20)
+    args = parser.parse_args()
+    random.seed(0)
+
+    test = memory_test(args.tasks)
+    rows = attempt_rows(test, args.attempts)
+    models, models_bytes = traced_bytes(lambda: [CheckedAttempt.model_validate_json(row) for row in rows])
+    table, table_bytes = traced_bytes(lambda: AttemptTable(test, Usernames(), (CheckedAttempt.model_validate_json(row) for row in rows)))
+    if table.attempts() != models:
+        raise Exception('the attempt table gives back different attempts')
+    if table.irregular:
+        raise Exception(f'{len(table.irregular)} rows did not fit the packed layout')
+
+    print(f'{args.attempts} attempts, {args.tasks} tasks')
+    print_table(['', 'MiB', 'bytes per attempt'], [
+        ['CheckedAttempt models', f'{models_bytes / 2 ** 20:.1f}', f'{models_bytes / args.attempts:,.0f}'],
+        ['AttemptTable', f'{table_bytes / 2 ** 20:.1f}', f'{table_bytes / args.attempts:,.0f}'],
+        ['saved', f'{(models_bytes - table_bytes) / 2 ** 20:.1f}', f'{models_bytes / table_bytes:.1f}x'],
+    ])
+
+
+if __name__ == '__main__':
+    main()
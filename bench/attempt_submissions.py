@@ -0,0 +1,95 @@
+# Load test of concurrent test attempt submissions against one SubjectService worker (SQLite storage).
+#
+# --instances subjects with one published instance each, --students students per subject. Every student
+# submits twice at the same time, so each request races against its own duplicate and against the other
+# students of the instance. Reported are the latency percentiles and the throughput, once with the lock
+# per instance and once with every instance sharing one lock (the former global _attempt_lock).
+# The run fails if a student ends up with more than one attempt, in memory or in the storage.
+#
+#   python bench/attempt_submissions.py [--instances 20] [--students 100] [--threads 16]
+
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_utils import print_table
+from subject_storage import bench_test, random_attempt, fill, create_worker
+
+from subject_service.AnswerKey import AnswerKey
+from subject_service.SubjectStorage import SQLiteSubjectStorage
+
+
+def percentile(values : list[float], fraction : float) -> float:
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run(instances : int, students : int, threads : int, shared_lock : bool) -> list:
+    path = os.path.join(tempfile.mkdtemp(), 'subjects.db')
+    test = bench_test()
+    answer_key = AnswerKey(test)
+    fill(path, instances, 0, test)
+    storage = SQLiteSubjectStorage(path)
+    for index in range(instances):
+        for student in range(students):
+            storage.add_member(f'mmm_subject_{index}', f'student_{student}', 'student')
+    app, service = create_worker('submissions', path)
+    if shared_lock:
+        lock = threading.Lock()
+        for locks in service.INSTANCE_LOCKS.values():
+            for instance_key in locks:
+                locks[instance_key] = lock
+    headers = {'ServiceSecret': 'bench'}
+    submissions = [(f'mmm_subject_{index}', f'student_{student}',
+                    json.dumps(random_attempt(answer_key, f'student_{student}').solution_attempt.answers))
+                   for index in range(instances) for student in range(students)] * 2
+    random.shuffle(submissions)
+
+    def submit(submission) -> tuple[int, float]:
+        subject_id, student, answers = submission
+        client = app.test_client()
+        started = time.perf_counter()
+        response = client.post(f'/subject_service/save_test_attempt/{subject_id}?username={student}',
+                               data={'test_id': json.dumps(test.info.id), 'remark': json.dumps('A'), 'answers': answers},
+                               headers=headers)
+        return response.status_code, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(submit, submissions))
+    seconds = time.perf_counter() - started
+
+    accepted = sum(1 for status_code, _ in results if status_code == 200)
+    if accepted != instances * students:
+        raise Exception(f'{accepted} accepted submissions, expected {instances * students}')
+    for index in range(instances):
+        solvers = [attempt.solution_attempt.solved_by for attempt in service.ATTEMPT_TABLES[f'mmm_subject_{index}'][(test.info.id, 'A')].attempts()]
+        if len(solvers) != students or len(set(solvers)) != students:
+            raise Exception(f'mmm_subject_{index} has {len(solvers)} attempts of {len(set(solvers))} students')
+    stored = storage._connection.execute('SELECT COUNT(*), COUNT(DISTINCT subject_id || solved_by) FROM checked_attempts').fetchone()
+    if stored != (instances * students, instances * students):
+        raise Exception(f'the storage has {stored[0]} attempts of {stored[1]} students')
+    latencies = sorted(latency for _, latency in results)
+    return ['one shared lock' if shared_lock else 'lock per instance', f'{len(results) / seconds:,.0f}/s',
+            *(f'{percentile(latencies, fraction) * 1e3:.2f}' for fraction in (0.5, 0.95, 0.99))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--instances', type=int, default=20)
+    parser.add_argument('--students', type=int, default=100)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+    random.seed(0)
+
+    rows = [run(args.instances, args.students, args.threads, shared_lock) for shared_lock in (False, True)]
+    print(f'{2 * args.instances * args.students} submissions ({args.instances * args.students} duplicates) on {args.threads} threads, no duplicate stored')
+    print_table(['', 'throughput', 'p50 ms', 'p95 ms', 'p99 ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
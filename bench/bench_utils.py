@@ -0,0 +1,18 @@
+import os
+import sys
+import timeit
+
+# the services are imported like in their containers, e.g. subject_service.SubjectService
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')))
+
+
+def seconds_per_call(function, number : int = 1000, repeat : int = 5) -> float:
+    # best of the repeats, the other runs only add scheduler noise
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def print_table(header : list[str], rows : list[list]) -> None:
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+    for row in [header] + rows:
+        print('  '.join(str(cell).rjust(width) if index else str(cell).ljust(width)
+                        for index, (cell, width) in enumerate(zip(row, widths))))
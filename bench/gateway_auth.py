@@ -0,0 +1,66 @@
+# Auth overhead of a secure gateway route per request.
+#
+# verify: signature check of the jwt, identity and Role lookup on every request (the former @jwt_required path)
+# miss:   _authenticate with a token cache that keeps nothing, i.e. the first request of a token
+# cached: _authenticate for an already verified token plus the allowed-roles bitset check
+# The last rows are whole requests through /frontend_api/get_test_summary with the upstream stubbed.
+#
+#   python bench/gateway_auth.py [--number 20000]
+
+import argparse
+
+from bench_utils import seconds_per_call, print_table
+from gateway_routes import create_gateway, check_response
+
+from flask_jwt_extended import create_access_token, verify_jwt_in_request, get_jwt_identity
+
+from gateway_api_service.TokenCache import TokenCache
+from gateway_api_service.UserTypes import Role
+
+
+ALLOWED_ROLES = [Role.TEACHER]
+
+
+def verify_every_time() -> bool:
+    verify_jwt_in_request()
+    identity = get_jwt_identity()
+    return Role(identity[0]) in ALLOWED_ROLES
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    app, gateway, _ = create_gateway()
+    with app.app_context():
+        token = create_access_token(identity=(Role.TEACHER.value, 'mmm'))
+    headers = {'Authorization': f'Bearer {token}'}
+    allowed_roles_mask = 2
+    token_cache = gateway.token_cache
+
+    rows = []
+    with app.test_request_context('/frontend_api/get_test_summary/mmm_subject_1', headers=headers):
+        verify = seconds_per_call(verify_every_time, number=args.number)
+        gateway.token_cache = TokenCache(max_entries=0)
+        miss = seconds_per_call(lambda: gateway._authenticate()[0] & allowed_roles_mask, number=args.number)
+        gateway.token_cache = token_cache
+        gateway._authenticate()
+        cached = seconds_per_call(lambda: gateway._authenticate()[0] & allowed_roles_mask, number=args.number)
+    rows += [['verify', f'{verify * 1e6:.2f}'], ['miss', f'{miss * 1e6:.2f}'], ['cached', f'{cached * 1e6:.2f}']]
+
+    client = app.test_client()
+    request_number = max(args.number // 20, 10)
+    def summary_request():
+        return client.get('/frontend_api/get_test_summary/mmm_subject_1?test_id=mmm_test_0&remark=A', headers=headers)
+    check_response(summary_request())
+    gateway.token_cache = TokenCache(max_entries=0)
+    uncached_request = seconds_per_call(summary_request, number=request_number)
+    gateway.token_cache = token_cache
+    cached_request = seconds_per_call(summary_request, number=request_number)
+    rows += [['request, miss', f'{uncached_request * 1e6:.2f}'], ['request, cached', f'{cached_request * 1e6:.2f}']]
+    print_table(['auth', 'us per request'], rows)
+
+
+if __name__ == '__main__':
+    main()
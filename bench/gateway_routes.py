@@ -0,0 +1,143 @@
+# Per request overhead of the gateway for every proxied route.
+#
+# legacy:   the upstream url is rebuilt by string surgery on the request url, like the former
+#           _before_request/_redirect did it on every request
+# compiled: the root comes from the matched rule and the url template of _create_endpoint is filled
+# request:  a whole request through the gateway (auth, routing, proxy), the upstream call is stubbed
+#
+#   python bench/gateway_routes.py [--number 2000]
+
+import argparse
+
+from bench_utils import seconds_per_call, print_table
+
+from flask import Flask
+from flask_jwt_extended import create_access_token
+
+from gateway_api_service.GatewayAPIService import GatewayAPIService, RULE_PARAM_RE
+
+
+SERVICES = ('user_service', 'test_service', 'subject_service')
+SECRETS = {**{service: f'{service}_secret' for service in SERVICES}, 'service_api': 'service_api_secret'}
+QUERY = 'test_id=mmm_test_0&remark=A'
+
+
+class StubRaw:
+    def stream(self, chunk_size, decode_content=False):
+        yield b'{}'
+
+
+class StubResponse:
+    status_code = 200
+    headers = {'Content-Type': 'application/json'}
+    raw = StubRaw()
+
+    def close(self):
+        pass
+
+
+def create_gateway() -> tuple[Flask, GatewayAPIService, list[dict]]:
+    # the keyword arguments of every _create_endpoint call are recorded for the legacy rewrite
+    routes = []
+    create_endpoint = GatewayAPIService._create_endpoint
+    def recording_create_endpoint(self, **kwargs):
+        routes.append(kwargs)
+        return create_endpoint(self, **kwargs)
+    app = Flask('GatewayAPIService')
+    app.config['JWT_SECRET_KEY'] = 'bench-jwt-secret-key-of-32-bytes'
+    # the identity is a (role, username) list, which PyJWT >= 2.10 rejects as the sub claim
+    app.config['JWT_IDENTITY_CLAIM'] = 'identity'
+    # every request goes upstream instead of being answered from the response cache
+    app.config['RESPONSE_CACHE_TTL'] = 0
+    GatewayAPIService._create_endpoint = recording_create_endpoint
+    try:
+        gateway = GatewayAPIService(app, {service: f'https://{service}:8000' for service in SERVICES}, SECRETS)
+    finally:
+        GatewayAPIService._create_endpoint = create_endpoint
+    gateway._upstream_request = lambda service, method, url, **kwargs: StubResponse()
+    return app, gateway, routes
+
+
+def check_response(response) -> None:
+    # a failed auth or routing would only measure the error path
+    if response.status_code != 200:
+        raise Exception(f'{response.request.method} {response.request.path}: {response.status_code} {response.get_data(as_text=True)}')
+
+
+def legacy_url(caller_request, redirect_host_url : str, redirect_root : str, username_arg) -> tuple[str, str]:
+    root = caller_request.url.removeprefix(caller_request.host_url).split('/')[0]
+    caller_root = caller_request.url.removeprefix(caller_request.host_url).split('/')[0]
+    url = redirect_host_url + '/'
+    if redirect_root:
+        url += redirect_root
+    url += caller_request.url.removeprefix(caller_request.host_url + caller_root)
+    if username_arg is not None:
+        if '?' in url:
+            url += '&'
+        else:
+            url += '?'
+        url += 'username=' + username_arg
+    return root, url
+
+
+def compiled_url(gateway : GatewayAPIService, caller_request, upstream_url_template : str, username_arg) -> tuple[str, str]:
+    root = gateway._endpoint_roots.get(caller_request.endpoint)
+    return root, gateway._build_redirect_url(upstream_url_template, caller_request.view_args,
+                                             caller_request.query_string.decode(), username_arg)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    app, gateway, routes = create_gateway()
+    client = app.test_client()
+    url_adapter = app.url_map.bind('localhost')
+    with app.app_context():
+        roles = {role for route in routes for role in route.get('allowed_roles', [])}
+        tokens = {role: create_access_token(identity=(role.value, 'mmm')) for role in roles}
+
+    rows = []
+    totals = [0.0, 0.0, 0.0]
+    for route in routes:
+        method = route['methods'][0]
+        path = RULE_PARAM_RE.sub(lambda match: f'{match.group(1)}_1', route['url'])
+        caller_root = route['url'].lstrip('/').split('/')[0]
+        upstream_url_template = route['redirect_host_url'] + '/' + route['redirect_root'] \
+            + RULE_PARAM_RE.sub(r'{\1}', route['url'].removeprefix('/' + caller_root))
+        headers = {}
+        if route.get('secure'):
+            headers['Authorization'] = f'Bearer {tokens[route["allowed_roles"][0]]}'
+        if caller_root == 'service_api':
+            headers.update({'ServiceSecret': SECRETS['service_api'], 'username': 'mmm'})
+        username_arg = 'mmm' if route.get('provide_username_arg') else None
+
+        # a new request object per call, the url properties of werkzeug are cached per request
+        with app.test_request_context(path, method=method, query_string=QUERY, headers=headers) as context:
+            environ = context.request.environ
+        rule, view_args = url_adapter.match(path, method=method, return_rule=True)
+        def new_request():
+            caller_request = app.request_class(environ)
+            caller_request.url_rule, caller_request.view_args = rule, view_args
+            return caller_request
+        legacy_url(new_request(), route['redirect_host_url'], route['redirect_root'], username_arg)
+        compiled_url(gateway, new_request(), upstream_url_template, username_arg)
+        construct = seconds_per_call(new_request, number=args.number)
+        legacy = seconds_per_call(lambda: legacy_url(new_request(), route['redirect_host_url'], route['redirect_root'], username_arg),
+                                  number=args.number) - construct
+        compiled = seconds_per_call(lambda: compiled_url(gateway, new_request(), upstream_url_template, username_arg),
+                                    number=args.number) - construct
+        check_response(client.open(path, method=method, query_string=QUERY, headers=headers))
+        whole_request = seconds_per_call(lambda: client.open(path, method=method, query_string=QUERY, headers=headers),
+                                         number=max(args.number // 10, 10))
+        for index, value in enumerate((legacy, compiled, whole_request)):
+            totals[index] += value
+        rows.append([f'{method} {route["url"]}', f'{legacy * 1e6:.2f}', f'{compiled * 1e6:.2f}', f'{whole_request * 1e6:.1f}'])
+
+    rows.append([f'mean of {len(routes)} routes'] + [f'{total / len(routes) * 1e6:.2f}' for total in totals])
+    print_table(['route', 'legacy us', 'compiled us', 'request us'], rows)
+
+
+if __name__ == '__main__':
+    main()
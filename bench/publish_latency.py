@@ -0,0 +1,84 @@
+# Latency of fetching the test of a publish, through the gateway (/service_api/get_test) and over the
+# direct channel to the TestService. The services run in this process on werkzeug servers, plain http.
+#
+# full:       the test is not cached, the TestService answers it
+# revalidate: the cached ETag is sent, the TestService answers 304
+#
+#   python bench/publish_latency.py [--number 300]
+
+import time
+import logging
+import argparse
+import threading
+import statistics
+
+from bench_utils import print_table
+
+from flask import Flask
+from werkzeug.serving import make_server
+
+from test_service.TestService import TestService
+from gateway_api_service.GatewayAPIService import GatewayAPIService
+from subject_service.SubjectService import SubjectService
+
+
+SECRETS = {'user_service': 'user_service_secret', 'test_service': 'test_service_secret',
+           'subject_service': 'subject_service_secret', 'service_api': 'service_api_secret'}
+CLOSED_URL = 'http://127.0.0.1:9'
+
+
+def serve(app : Flask) -> str:
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}'
+
+
+def create_subject_service(service_api_url : str, test_service_url) -> SubjectService:
+    app = Flask('SubjectService')
+    app.config.update(SERVICE_SECRET=SECRETS['subject_service'], SERVICE_API_SECRET=SECRETS['service_api'],
+                      TEST_SERVICE_URL=test_service_url, TEST_SERVICE_SECRET=SECRETS['test_service'])
+    return SubjectService(app, service_api_url)
+
+
+def fetch_milliseconds(subject_service : SubjectService, number : int, cached : bool) -> list[float]:
+    milliseconds = []
+    subject_service._fetch_test('mmm_test_0', 'mmm')
+    for _ in range(number):
+        if not cached:
+            subject_service.fetched_tests.clear()
+        started = time.perf_counter()
+        subject_service._fetch_test('mmm_test_0', 'mmm')
+        milliseconds.append((time.perf_counter() - started) * 1e3)
+    return milliseconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=300)
+    args = parser.parse_args()
+    # one access log line per request would be measured as well
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    test_app = Flask('TestService')
+    test_app.config['SERVICE_SECRET'] = SECRETS['test_service']
+    TestService(test_app, CLOSED_URL)
+    test_service_url = serve(test_app)
+    gateway_app = Flask('GatewayAPIService')
+    gateway_app.config['JWT_SECRET_KEY'] = 'bench-jwt-secret-key-of-32-bytes'
+    # every fetch reaches the TestService on both paths
+    gateway_app.config['RESPONSE_CACHE_TTL'] = 0
+    GatewayAPIService(gateway_app, {'user_service': CLOSED_URL, 'test_service': test_service_url, 'subject_service': CLOSED_URL}, SECRETS)
+    gateway_url = serve(gateway_app)
+
+    rows = []
+    for name, subject_service in (('gateway', create_subject_service(gateway_url, None)),
+                                  ('direct', create_subject_service(CLOSED_URL, test_service_url))):
+        for cached in (False, True):
+            milliseconds = fetch_milliseconds(subject_service, args.number, cached)
+            rows.append([name, 'revalidate' if cached else 'full', f'{statistics.median(milliseconds):.2f}',
+                         f'{sorted(milliseconds)[int(len(milliseconds) * 0.95)]:.2f}'])
+    print_table(['path', 'fetch', 'median ms', 'p95 ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# The subject as a student sees it: --instances published tests, each attempted by all --students students.
+#
+# former:  the view built like before, every test stripped of its answers again and the attempts of
+#          all students scanned for the ones of the student, on validated models
+# indexed: SubjectService._cut_for_student from the cached answer-free tests and the attempt tables
+# The last row is a whole get_subject request of a student (SQLite storage, JSON response).
+#
+#   python bench/student_view.py [--instances 50] [--students 300]
+
+import os
+import json
+import random
+import argparse
+import tempfile
+from datetime import datetime, timezone
+
+from bench_utils import seconds_per_call, print_table
+from subject_storage import bench_test, create_worker, OPTIONS_COUNT, TASKS_COUNT
+
+from global_types.TaskTypes import SingleChoiceTask, MultipleChoiceTask, TaskType
+from global_types.TestTypes import Test, TestInfo
+from global_types.WireFormat import JSON, encode
+from subject_service.AnswerKey import AnswerKey
+from subject_service.TestTypes import TestInstance, TestSolutionAttempt
+from subject_service.SubjectTypes import SubjectInfo, Subject
+from subject_service.SubjectStorage import SQLiteSubjectStorage
+
+
+SUBJECT_ID = 'mmm_subject_0'
+
+
+def build_subject(instances : int, students : int) -> Subject:
+    solved_at = datetime.now(timezone.utc)
+    test_instances = []
+    for index in range(instances):
+        test = bench_test().model_copy(update={'info': TestInfo(id=f'mmm_test_{index}', name=f'test {index}', description='bench test')})
+        answer_key = AnswerKey(test)
+        test_instances.append(TestInstance(test=test, remark='A', published_at=solved_at, published_by='mmm', solution_attempts=answer_key.check_many([
+            TestSolutionAttempt(solved_by=f'student_{student}', solved_at=solved_at, answers=[
+                sorted(random.sample(range(OPTIONS_COUNT), random.randint(0, OPTIONS_COUNT))) if task_index % 2
+                else random.randrange(OPTIONS_COUNT) for task_index in range(TASKS_COUNT)])
+            for student in range(students)])))
+    return Subject(info=SubjectInfo(id=SUBJECT_ID, name='bench', description='bench subject', owner='mmm', teachers=['mmm']),
+                   student_access_code='student', teacher_access_code='teacher',
+                   students=[f'student_{student}' for student in range(students)], test_instances=test_instances)
+
+
+def former_cut_test_answers(test : Test) -> Test:
+    new_tasks = []
+    for task in test.tasks:
+        if task.type == TaskType.SINGLE_CHOICE:
+            new_tasks.append(SingleChoiceTask(question=task.question, tag=task.tag, options=task.options, type=task.type,
+                                              answer=-1, points=task.points))
+        if task.type == TaskType.MULTIPLE_CHOICE:
+            new_tasks.append(MultipleChoiceTask(question=task.question, tag=task.tag, options=task.options, type=task.type,
+                                                answer=[], points=task.points))
+    return Test(info=test.info, tasks=new_tasks, pass_percents=test.pass_percents)
+
+
+def former_cut_for_student(student : str, subject : Subject) -> Subject:
+    student_subject = Subject(info=subject.info, teacher_access_code='', student_access_code='', students=[], test_instances=[])
+    for original_instance in subject.test_instances:
+        student_attempts = []
+        for original_attempt in original_instance.solution_attempts:
+            if original_attempt.solution_attempt.solved_by == student:
+                student_attempts.append(original_attempt)
+        student_subject.test_instances.append(TestInstance(
+            test=former_cut_test_answers(original_instance.test),
+            remark=original_instance.remark,
+            published_at=original_instance.published_at,
+            published_by=original_instance.published_by,
+            solution_attempts=student_attempts
+        ))
+    return student_subject
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--instances', type=int, default=50)
+    parser.add_argument('--students', type=int, default=300)
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+    random.seed(0)
+
+    subject = build_subject(args.instances, args.students)
+    path = os.path.join(tempfile.mkdtemp(), 'subjects.db')
+    # the storage keeps the attempts apart, the model passed to it is not changed
+    SQLiteSubjectStorage(path).migrate({SUBJECT_ID: subject}, {'mmm': 1})
+    app, service = create_worker('student_view', path)
+    client = app.test_client()
+    student = f'student_{args.students // 2}'
+    url = f'/subject_service/get_subject/{SUBJECT_ID}?username={student}'
+    headers = {'ServiceSecret': 'bench', 'Accept': 'application/json'}
+
+    former_body = encode(former_cut_for_student(student, subject), JSON)
+    indexed_body = encode(service._cut_for_student(student, service.SUBJECTS_DATABASE[SUBJECT_ID]), JSON)
+    response = client.get(url, headers=headers)
+    if not json.loads(former_body) == json.loads(indexed_body) == json.loads(response.get_data()):
+        raise Exception('the student views differ')
+
+    former = seconds_per_call(lambda: encode(former_cut_for_student(student, subject), JSON), number=args.number)
+    indexed = seconds_per_call(lambda: encode(service._cut_for_student(student, service.SUBJECTS_DATABASE[SUBJECT_ID]), JSON),
+                               number=args.number)
+    whole_request = seconds_per_call(lambda: client.get(url, headers=headers), number=args.number)
+    print(f'{args.instances} instances x {args.students} students, {len(indexed_body) / 1024:.0f} KiB view')
+    print_table(['student view', 'ms'], [['former', f'{former * 1e3:.2f}'], ['indexed', f'{indexed * 1e3:.2f}'],
+                                         ['request', f'{whole_request * 1e3:.2f}']])
+
+
+if __name__ == '__main__':
+    main()
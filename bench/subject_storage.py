@@ -0,0 +1,179 @@
+# Read/write throughput of the SQLite subject storage, and how fast a second worker picks up changes.
+#
+# The database is filled with --subjects subjects sharing --attempts attempts (one test instance per
+# subject, one attempt per student). Then:
+# write:  single attempt inserts through the storage (one transaction with its change log entry each)
+# read:   single attempt and whole subject reads
+# load:   a worker starting on the database (every subject and attempt into memory)
+# sync:   a worker applying one attempt / one subject change of another worker on its next request,
+#         compared to a full reload
+#
+#   python bench/subject_storage.py [--subjects 10000] [--attempts 1000000]
+
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+
+from bench_utils import print_table
+
+from flask import Flask
+
+from global_types.TestTypes import Test, TestInfo
+from global_types.TaskTypes import SingleChoiceTask, MultipleChoiceTask, TaskType
+from subject_service.AnswerKey import AnswerKey
+from subject_service.TestTypes import TestSolutionAttempt
+from subject_service.SubjectStorage import SQLiteSubjectStorage
+from subject_service.SubjectService import SubjectService
+
+
+TASKS_COUNT = 10
+OPTIONS_COUNT = 4
+PUBLISHED_AT = '2024-01-15T10:00:00+00:00'
+
+
+def bench_test() -> Test:
+    tasks = []
+    for index in range(TASKS_COUNT):
+        options = [f'option {option}' for option in range(OPTIONS_COUNT)]
+        if index % 2:
+            tasks.append(MultipleChoiceTask(question=f'question {index}', tag=f'tag {index % 3}', options=options,
+                                            answer=sorted({0, index % OPTIONS_COUNT}), points=2, type=TaskType.MULTIPLE_CHOICE))
+        else:
+            tasks.append(SingleChoiceTask(question=f'question {index}', tag=f'tag {index % 3}', options=options,
+                                          answer=index % OPTIONS_COUNT, points=1, type=TaskType.SINGLE_CHOICE))
+    return Test(info=TestInfo(id='mmm_test_0', name='bench', description='bench test'), tasks=tasks, pass_percents=50)
+
+
+def random_attempt(answer_key : AnswerKey, student : str):
+    answers = [[option for option in range(OPTIONS_COUNT) if random.random() < 0.4] if index % 2 else random.randrange(OPTIONS_COUNT)
+               for index in range(TASKS_COUNT)]
+    return answer_key.check(TestSolutionAttempt(solved_by=student, solved_at=PUBLISHED_AT, answers=answers))
+
+
+def fill(path : str, subjects_count : int, attempts_count : int, test : Test) -> None:
+    # bulk rows straight into the schema of the storage
+    storage = SQLiteSubjectStorage(path)
+    answer_key = AnswerKey(test)
+    templates = [random_attempt(answer_key, 'template') for _ in range(100)]
+    students_per_subject = attempts_count // subjects_count
+    connection = storage._connection
+    connection.execute('BEGIN')
+    connection.executemany('INSERT INTO subjects (id, name, description, owner, student_access_code, teacher_access_code) VALUES (?, ?, ?, ?, ?, ?)',
+                           ((f'mmm_subject_{index}', f'subject {index}', '', 'mmm', 'student', 'teacher') for index in range(subjects_count)))
+    connection.executemany('INSERT INTO subject_members (subject_id, username, role) VALUES (?, ?, ?)',
+                           ((f'mmm_subject_{index}', 'mmm', 'teacher') for index in range(subjects_count)))
+    connection.executemany('INSERT INTO subject_members (subject_id, username, role) VALUES (?, ?, ?)',
+                           ((f'mmm_subject_{index}', f'student_{student}', 'student')
+                            for index in range(subjects_count) for student in range(students_per_subject)))
+    test_json = test.model_dump_json()
+    connection.executemany('INSERT INTO test_instances (subject_id, test_id, remark, test, published_at, published_by) VALUES (?, ?, ?, ?, ?, ?)',
+                           ((f'mmm_subject_{index}', test.info.id, 'A', test_json, PUBLISHED_AT, 'mmm') for index in range(subjects_count)))
+    def attempt_rows():
+        for index in range(subjects_count):
+            for student in range(students_per_subject):
+                attempt = templates[(index + student) % len(templates)]
+                yield (f'mmm_subject_{index}', test.info.id, 'A', f'student_{student}', PUBLISHED_AT,
+                       json.dumps(attempt.solution_attempt.answers), json.dumps(attempt.task_points),
+                       attempt.attempt_points, attempt.overall_points, attempt.attempt_percents, int(attempt.passed))
+    connection.executemany('INSERT INTO checked_attempts (subject_id, test_id, remark, solved_by, solved_at, answers, task_points, '
+                           'attempt_points, overall_points, attempt_percents, passed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                           attempt_rows())
+    connection.execute('INSERT INTO subject_id_counters (username, counter) VALUES (?, ?)', ('mmm', subjects_count))
+    connection.execute('COMMIT')
+
+
+def create_worker(name : str, path : str) -> tuple[Flask, SubjectService]:
+    app = Flask(name)
+    app.config.update(SERVICE_SECRET='bench', SERVICE_API_SECRET='bench', SUBJECT_STORAGE='sqlite', SUBJECT_DATABASE_PATH=path)
+    return app, SubjectService(app, 'https://gateway_api:5000')
+
+
+def per_second(count : int, seconds : float) -> str:
+    return f'{count / seconds:,.0f}/s'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--subjects', type=int, default=10000)
+    parser.add_argument('--attempts', type=int, default=1000000)
+    parser.add_argument('--operations', type=int, default=2000)
+    args = parser.parse_args()
+    random.seed(0)
+
+    path = os.path.join(tempfile.mkdtemp(), 'subjects.db')
+    test = bench_test()
+    answer_key = AnswerKey(test)
+    started = time.perf_counter()
+    fill(path, args.subjects, args.attempts, test)
+    print(f'filled {args.subjects} subjects, {args.attempts} attempts in {time.perf_counter() - started:.1f} s ({os.path.getsize(path) / 2 ** 20:.0f} MiB)')
+    rows = []
+
+    storage = SQLiteSubjectStorage(path)
+    subject_ids = [f'mmm_subject_{random.randrange(args.subjects)}' for _ in range(args.operations)]
+    attempts = [random_attempt(answer_key, f'writer_{index}') for index in range(args.operations)]
+    started = time.perf_counter()
+    for subject_id, attempt in zip(subject_ids, attempts):
+        storage.add_attempt(subject_id, test.info.id, 'A', attempt)
+    rows.append(['write', 'add_attempt', per_second(args.operations, time.perf_counter() - started)])
+
+    students_per_subject = args.attempts // args.subjects
+    started = time.perf_counter()
+    for subject_id in subject_ids:
+        storage.load_attempt(subject_id, test.info.id, 'A', f'student_{random.randrange(students_per_subject)}')
+    rows.append(['read', 'load_attempt', per_second(args.operations, time.perf_counter() - started)])
+    started = time.perf_counter()
+    for subject_id in subject_ids[:args.operations // 10]:
+        storage.load_subject(subject_id)
+    rows.append(['read', f'load_subject ({students_per_subject} attempts)', per_second(args.operations // 10, time.perf_counter() - started)])
+
+    started = time.perf_counter()
+    writer_app, writer = create_worker('writer', path)
+    rows.append(['load', 'worker start', f'{time.perf_counter() - started:.2f} s'])
+    reader_app, reader = create_worker('reader', path)
+    writer_client, reader_client = writer_app.test_client(), reader_app.test_client()
+    headers = {'ServiceSecret': 'bench'}
+
+    # one student submits on the writer, the reader applies it on its next request
+    sync_seconds = []
+    for index in range(min(args.operations, 200)):
+        subject_id = f'mmm_subject_{index % args.subjects}'
+        student = f'late_student_{index}'
+        writer_client.post(f'/subject_service/subject_subscribe_student/{subject_id}?username={student}',
+                           data={'access_code': json.dumps('student')}, headers=headers)
+        reader._sync_database()
+        response = writer_client.post(f'/subject_service/save_test_attempt/{subject_id}?username={student}',
+                                      data={'test_id': json.dumps(test.info.id), 'remark': json.dumps('A'),
+                                            'answers': json.dumps(random_attempt(answer_key, student).solution_attempt.answers)},
+                                      headers=headers)
+        if response.status_code != 200:
+            raise Exception(response.get_data(as_text=True))
+        started = time.perf_counter()
+        reader._sync_database()
+        sync_seconds.append(time.perf_counter() - started)
+        if student not in reader.ATTEMPT_TABLES[subject_id][(test.info.id, 'A')]:
+            raise Exception('the reader has missed the attempt')
+    rows.append(['sync', 'one attempt', f'{sorted(sync_seconds)[len(sync_seconds) // 2] * 1e3:.3f} ms'])
+
+    subject_seconds = []
+    for index in range(20):
+        subject_id = f'mmm_subject_{index % args.subjects}'
+        writer_client.post(f'/subject_service/subject_subscribe_student/{subject_id}?username=new_student_{index}',
+                           data={'access_code': json.dumps('student')}, headers=headers)
+        started = time.perf_counter()
+        reader._sync_database()
+        subject_seconds.append(time.perf_counter() - started)
+    rows.append(['sync', f'one subject ({students_per_subject} attempts)', f'{sorted(subject_seconds)[len(subject_seconds) // 2] * 1e3:.3f} ms'])
+
+    started = time.perf_counter()
+    reader._load_database()
+    rows.append(['sync', 'full reload', f'{time.perf_counter() - started:.2f} s'])
+    if reader_client.get('/subject_service/get_all_subjects_info', headers=headers).status_code != 200:
+        raise Exception('the reader cannot serve after the reload')
+    print_table(['', 'operation', 'throughput / time'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# Validating and serializing a test of --tasks tasks, half single and half multiple choice.
+#
+# former: the test validated with the base Task (answer: Any) and every task rebuilt as its concrete
+#         class by hand, like SubjectService._specify_test_tasks did
+# union:  Test from global_types, the discriminated union on type builds the concrete class directly
+# The last row serializes the multiple choice answers typed set[int], the type they briefly had.
+#
+#   python bench/task_types.py [--tasks 100]
+
+import json
+import argparse
+
+from pydantic import BaseModel
+
+from bench_utils import seconds_per_call, print_table
+
+from global_types.TaskTypes import Task, SingleChoiceTask, MultipleChoiceTask, TaskType
+from global_types.TestTypes import Test, TestInfo
+
+
+OPTIONS_COUNT = 4
+
+
+class FormerTest(BaseModel):
+    info: TestInfo
+    tasks: list[Task]
+    pass_percents: float
+
+
+class SetAnswerTask(MultipleChoiceTask):
+    answer: set[int]
+
+
+class SetAnswerTest(BaseModel):
+    info: TestInfo
+    tasks: list[SingleChoiceTask | SetAnswerTask]
+    pass_percents: float
+
+
+def test_dict(tasks_count : int) -> dict:
+    tasks = []
+    for index in range(tasks_count):
+        task = {'question': f'question {index}', 'tag': f'tag {index % 3}', 'options': [f'option {option}' for option in range(OPTIONS_COUNT)]}
+        if index % 2:
+            task.update(type=TaskType.MULTIPLE_CHOICE.value, answer=[0, index % OPTIONS_COUNT], points=2)
+        else:
+            task.update(type=TaskType.SINGLE_CHOICE.value, answer=index % OPTIONS_COUNT, points=1)
+        tasks.append(task)
+    return {'info': {'id': 'mmm_test_0', 'name': 'bench', 'description': 'bench test'}, 'tasks': tasks, 'pass_percents': 50}
+
+
+def former_validate(test_json : str) -> Test:
+    test = FormerTest.model_validate_json(test_json)
+    return Test(
+        info=test.info,
+        tasks=[SingleChoiceTask(question=task.question, tag=task.tag, options=task.options, type=task.type,
+                                answer=task.answer, points=task.points) if task.type == TaskType.SINGLE_CHOICE
+               else MultipleChoiceTask(question=task.question, tag=task.tag, options=task.options, type=task.type,
+                                       answer=task.answer, points=task.points) for task in test.tasks],
+        pass_percents=test.pass_percents
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=100)
+    parser.add_argument('--number', type=int, default=1000)
+    args = parser.parse_args()
+
+    test_json = json.dumps(test_dict(args.tasks))
+    test = Test.model_validate_json(test_json)
+    if former_validate(test_json) != test or json.loads(test.model_dump_json()) != json.loads(test_json):
+        raise Exception('the validated tests differ')
+    set_test = SetAnswerTest.model_validate_json(test_json)
+
+    rows = [
+        ['validate', 'former', seconds_per_call(lambda: former_validate(test_json), number=args.number)],
+        ['validate', 'union', seconds_per_call(lambda: Test.model_validate_json(test_json), number=args.number)],
+        ['model_dump_json', 'list[int] answers', seconds_per_call(test.model_dump_json, number=args.number)],
+        ['model_dump_json', 'set[int] answers', seconds_per_call(set_test.model_dump_json, number=args.number)],
+    ]
+    print(f'{args.tasks} tasks, {len(test_json) / 1024:.1f} KiB')
+    print_table(['', '', 'us'], [[operation, variant, f'{seconds * 1e6:.0f}'] for operation, variant, seconds in rows])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+# Test analytics over --attempts attempts in two instances of the same test: the vectorized
+# compute_test_analytics on the attempt tables against a per-attempt Python loop over the checked attempts.
+# The loop also serves as the reference, the run fails if both disagree.
+#
+#   python bench/test_analytics.py [--attempts 100000]
+
+import time
+import random
+import argparse
+
+from bench_utils import seconds_per_call, print_table
+from subject_storage import bench_test, PUBLISHED_AT, OPTIONS_COUNT, TASKS_COUNT
+
+from global_types.TaskTypes import TaskType
+from subject_service.AnswerKey import AnswerKey
+from subject_service.AttemptTable import AttemptTable, Usernames
+from subject_service.TestAnalytics import compute_test_analytics, HISTOGRAM_BINS, PERCENTILES, DISCRIMINATION_GROUP
+from subject_service.TestTypes import TestSolutionAttempt, TestAnalytics, TaskAnalytics
+
+
+def loop_analytics(test, attempts) -> TestAnalytics:
+    attempts_count = len(attempts)
+    max_points = [task.points for task in test.tasks]
+    histogram = [0] * HISTOGRAM_BINS
+    percents = []
+    totals = []
+    task_points = [0.0] * len(test.tasks)
+    option_picks = [[0] * len(task.options) for task in test.tasks]
+    for attempt in attempts:
+        percent = min(max(attempt.attempt_percents, 0), 100)
+        histogram[min(int(percent // (100 / HISTOGRAM_BINS)), HISTOGRAM_BINS - 1)] += 1
+        percents.append(attempt.attempt_percents)
+        totals.append(sum(attempt.task_points))
+        for task_index, task in enumerate(test.tasks):
+            task_points[task_index] += attempt.task_points[task_index]
+            answer = attempt.solution_attempt.answers[task_index]
+            for option in (answer if task.type == TaskType.MULTIPLE_CHOICE else [answer]):
+                option_picks[task_index][option] += 1
+
+    percents.sort()
+    percentiles = dict()
+    for percentile in PERCENTILES:
+        position = percentile / 100 * (attempts_count - 1)
+        lower = int(position)
+        upper = min(lower + 1, attempts_count - 1)
+        percentiles[str(percentile)] = percents[lower] + (percents[upper] - percents[lower]) * (position - lower)
+
+    group_size = max(1, int(round(attempts_count * DISCRIMINATION_GROUP)))
+    order = sorted(range(attempts_count), key=totals.__getitem__)
+    def group_points(rows):
+        points = [0.0] * len(test.tasks)
+        for row in rows:
+            for task_index, value in enumerate(attempts[row].task_points):
+                points[task_index] += value
+        return [value / len(rows) for value in points]
+    upper_points, lower_points = group_points(order[-group_size:]), group_points(order[:group_size])
+
+    tags = dict()
+    for task_index, task in enumerate(test.tasks):
+        achieved, possible = tags.get(task.tag, (0.0, 0.0))
+        tags[task.tag] = (achieved + task_points[task_index], possible + max_points[task_index] * attempts_count)
+    return TestAnalytics(
+        attempts_count=attempts_count,
+        histogram=histogram,
+        percentiles=percentiles,
+        tasks=[TaskAnalytics(
+                difficulty=task_points[task_index] / attempts_count / max_points[task_index],
+                discrimination=(upper_points[task_index] - lower_points[task_index]) / max_points[task_index],
+                option_picks=[picks / attempts_count * 100 for picks in option_picks[task_index]]
+            ) for task_index in range(len(test.tasks))],
+        tags={tag: achieved / possible * 100 for tag, (achieved, possible) in tags.items()}
+    )
+
+
+def check_equal(expected, actual, path='analytics') -> None:
+    if isinstance(expected, dict):
+        if expected.keys() != actual.keys():
+            raise Exception(f'{path}: {list(expected)} != {list(actual)}')
+        for key in expected:
+            check_equal(expected[key], actual[key], f'{path}.{key}')
+    elif isinstance(expected, list):
+        if len(expected) != len(actual):
+            raise Exception(f'{path}: {len(expected)} != {len(actual)} entries')
+        for index, (expected_value, actual_value) in enumerate(zip(expected, actual)):
+            check_equal(expected_value, actual_value, f'{path}[{index}]')
+    elif abs(expected - actual) > 1e-9 * max(1, abs(expected)):
+        raise Exception(f'{path}: {expected} != {actual}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--attempts', type=int, default=100000)
+    args = parser.parse_args()
+    random.seed(0)
+
+    test = bench_test()
+    answer_key = AnswerKey(test)
+    solution_attempts = [TestSolutionAttempt(solved_by=f'student_{index}', solved_at=PUBLISHED_AT, answers=[
+                             sorted(random.sample(range(OPTIONS_COUNT), random.randint(0, OPTIONS_COUNT))) if task_index % 2
+                             else random.randrange(OPTIONS_COUNT) for task_index in range(TASKS_COUNT)])
+                         for index in range(args.attempts)]
+    attempts = answer_key.check_many(solution_attempts)
+    usernames = Usernames()
+    half = len(attempts) // 2
+    tables = [AttemptTable(test, usernames, attempts[:half]), AttemptTable(test, usernames, attempts[half:])]
+
+    started = time.perf_counter()
+    expected = loop_analytics(test, attempts)
+    loop_seconds = time.perf_counter() - started
+    vectorized_seconds = seconds_per_call(lambda: compute_test_analytics(test, tables), number=1)
+    check_equal(expected.model_dump(), compute_test_analytics(test, tables).model_dump())
+    print_table(['', 'ms'], [['python loop', f'{loop_seconds * 1e3:.1f}'],
+                             ['vectorized', f'{vectorized_seconds * 1e3:.1f}'],
+                             ['speedup', f'{loop_seconds / vectorized_seconds:.1f}x']])
+
+
+if __name__ == '__main__':
+    main()
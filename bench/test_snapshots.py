@@ -0,0 +1,86 @@
+# Memory of the published test contents when one --tasks task test is published to --groups subjects
+# under --remarks remarks each, measured with tracemalloc.
+#
+# per instance: every instance with its own test, student view and answer key, like before TestSnapshots
+# snapshots:    the instances holding a reference into TestSnapshots, one snapshot per distinct content
+# Both start from the test json of every instance, like a load from the storage. A SubjectService worker
+# loading the same subjects from SQLite must end up with a single snapshot, or the run fails.
+#
+#   python bench/test_snapshots.py [--groups 12] [--remarks 2] [--tasks 40]
+
+import os
+import argparse
+import tempfile
+
+from bench_utils import print_table
+from subject_storage import PUBLISHED_AT, create_worker
+from attempt_memory import memory_test, traced_bytes
+
+from global_types.TestTypes import Test
+from subject_service.AnswerKey import AnswerKey
+from subject_service.TestTypes import TestInstance
+from subject_service.SubjectTypes import SubjectInfo, Subject
+from subject_service.SubjectStorage import SQLiteSubjectStorage
+from subject_service.TestSnapshots import TestSnapshots
+
+
+def per_instance(test_jsons : list[str]) -> list:
+    instances = []
+    for test_json in test_jsons:
+        test = Test.model_validate_json(test_json)
+        instances.append((test, test.model_copy(update={'tasks': [task.without_answer() for task in test.tasks]}), AnswerKey(test)))
+    return instances
+
+
+def with_snapshots(test_jsons : list[str]) -> tuple[TestSnapshots, list]:
+    snapshots = TestSnapshots()
+    instances = []
+    for test_json in test_jsons:
+        snapshot = snapshots.acquire(Test.model_validate_json(test_json))
+        if snapshot.answer_key is None:
+            snapshot.answer_key = AnswerKey(snapshot.test)
+        instances.append(snapshot)
+    return snapshots, instances
+
+
+def check_worker(test : Test, groups : int, remarks : int) -> None:
+    subjects = {f'mmm_subject_{group}': Subject(
+                    info=SubjectInfo(id=f'mmm_subject_{group}', name=f'group {group}', description='bench subject', owner='mmm', teachers=['mmm']),
+                    student_access_code='student', teacher_access_code='teacher', students=[],
+                    test_instances=[TestInstance(test=test, remark=f'remark {remark}', published_at=PUBLISHED_AT, published_by='mmm',
+                                                 solution_attempts=[]) for remark in range(remarks)])
+                for group in range(groups)}
+    path = os.path.join(tempfile.mkdtemp(), 'subjects.db')
+    SQLiteSubjectStorage(path).migrate(subjects, {'mmm': groups})
+    _, service = create_worker('test_snapshots', path)
+    snapshots = {id(snapshot) for instances in service.INSTANCE_SNAPSHOTS.values() for snapshot in instances.values()}
+    if len(service.TEST_SNAPSHOTS) != 1 or len(snapshots) != 1:
+        raise Exception(f'the worker keeps {len(service.TEST_SNAPSHOTS)} snapshots for one published test')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--groups', type=int, default=12)
+    parser.add_argument('--remarks', type=int, default=2)
+    parser.add_argument('--tasks', type=int, default=40)
+    args = parser.parse_args()
+
+    test = memory_test(args.tasks)
+    check_worker(test, args.groups, args.remarks)
+    instances_count = args.groups * args.remarks
+    test_jsons = [test.model_dump_json() for _ in range(instances_count)]
+    _, former_bytes = traced_bytes(lambda: per_instance(test_jsons))
+    (snapshots, _), snapshots_bytes = traced_bytes(lambda: with_snapshots(test_jsons))
+    if len(snapshots) != 1:
+        raise Exception(f'{len(snapshots)} snapshots for one published test')
+
+    print(f'{instances_count} instances ({args.groups} groups x {args.remarks} remarks) of a {args.tasks}-task test')
+    print_table(['', 'KiB', 'KiB per instance'], [
+        ['per instance', f'{former_bytes / 1024:.0f}', f'{former_bytes / 1024 / instances_count:.1f}'],
+        ['snapshots', f'{snapshots_bytes / 1024:.0f}', f'{snapshots_bytes / 1024 / instances_count:.1f}'],
+        ['saved', f'{(former_bytes - snapshots_bytes) / 1024:.0f}', f'{former_bytes / snapshots_bytes:.1f}x'],
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,30 @@
+import re
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
+from urllib.parse import quote, urlencode
 
 import requests as req
+from requests.adapters import HTTPAdapter
 
 from typing import Optional, Any
 
 from flask_cors import CORS
 from flask import Flask, Response, Request, request
-from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity
+from flask_jwt_extended import JWTManager, jwt_required, verify_jwt_in_request, create_access_token, get_jwt, get_jwt_identity
 
 from gateway_api_service.UserTypes import UserInfo, Role
+from gateway_api_service.ResponseCache import ResponseCache
+from gateway_api_service.TokenCache import TokenCache
+from global_types.WireFormat import LEGACY, negotiate, encode, decode, respond
+
+
+STREAM_CHUNK_SIZE = 64 * 1024
+HOP_BY_HOP_HEADERS = {'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+                      'te', 'trailers', 'transfer-encoding', 'upgrade'}
+# flask rule parameter, e.g. <subject_id> or <string:subject_id>
+RULE_PARAM_RE = re.compile(r'<(?:[^<>:]+:)?([^<>]+)>')
+ROLE_BITS = {Role.ADMIN: 1, Role.TEACHER: 2, Role.STUDENT: 4}
 
 
 class GatewayAPIService:
@@ -18,11 +33,24 @@ class GatewayAPIService:
         self.app = app
         self.redirect_url = redirect_url
         self.service_secrets = service_secrets
+        # upstream connection pools
+        self._init_sessions()
+        # cache for read-only endpoints
+        self.response_cache = ResponseCache(max_entries=int(self.app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 1024)),
+                                            max_bytes=int(self.app.config.get('RESPONSE_CACHE_MAX_BYTES', 16 * 1024 * 1024)))
+        self.response_cache_ttl = float(self.app.config.get('RESPONSE_CACHE_TTL', 30))
+        # already verified tokens
+        self.token_cache = TokenCache(max_entries=int(self.app.config.get('JWT_CACHE_MAX_ENTRIES', 10000)))
         # restrictions
         self.cors = CORS(self.app)
         self.jwt = JWTManager(app)
         # endpoints
         self._endpoint_counter = 1
+        self._endpoint_roots = dict()
+        self._batch_routes = dict()
+        self.batch_max_requests = int(self.app.config.get('BATCH_MAX_REQUESTS', 20))
+        self._batch_executor = ThreadPoolExecutor(max_workers=int(self.app.config.get('BATCH_MAX_WORKERS', 8)),
+                                                  thread_name_prefix='gateway-batch')
         self._register_routes()
         # init successfull
         self.app.logger.info("GatewayAPIService inited!")
@@ -46,7 +74,8 @@ class GatewayAPIService:
                               redirect_root='user_service',
                               secure=True,
                               allowed_roles=[Role.STUDENT, Role.TEACHER, Role.ADMIN],
-                              provide_username_arg=False)
+                              provide_username_arg=False,
+                              cached=True)
         
         self._create_endpoint(url='/frontend_api/get_all_users_info',
                               methods=['GET'],
@@ -62,7 +91,8 @@ class GatewayAPIService:
                               redirect_root='user_service',
                               secure=True,
                               allowed_roles=[Role.ADMIN],
-                              provide_username_arg=True)
+                              provide_username_arg=True,
+                              invalidates=[('/frontend_api/get_user_info/<username>', 'username')])
         
         self._create_endpoint(url='/service_api/get_user_info/<username>',
                               methods=['GET'],
@@ -97,7 +127,8 @@ class GatewayAPIService:
                               redirect_root='test_service',
                               secure=True,
                               allowed_roles=[Role.TEACHER],
-                              provide_username_arg=True)
+                              provide_username_arg=True,
+                              cached=True)
         
         self._create_endpoint(url='/frontend_api/get_test',
                               methods=['GET'],
@@ -129,7 +160,8 @@ class GatewayAPIService:
                               redirect_root='test_service',
                               secure=True,
                               allowed_roles=[Role.TEACHER],
-                              provide_username_arg=True)
+                              provide_username_arg=True,
+                              invalidates=[('/frontend_api/get_test_info/<test_id>', 'test_id')])
         
         self._create_endpoint(url='/frontend_api/delete_test/<test_id>',
                               methods=['DELETE'],
@@ -137,7 +169,8 @@ class GatewayAPIService:
                               redirect_root='test_service',
                               secure=True,
                               allowed_roles=[Role.TEACHER, Role.ADMIN],
-                              provide_username_arg=True)
+                              provide_username_arg=True,
+                              invalidates=[('/frontend_api/get_test_info/<test_id>', 'test_id')])
         
         ### subject service
 
@@ -155,7 +188,8 @@ class GatewayAPIService:
                               redirect_root='subject_service',
                               secure=True,
                               allowed_roles=[Role.TEACHER, Role.STUDENT, Role.ADMIN],
-                              provide_username_arg=False)
+                              provide_username_arg=False,
+                              cached=True)
         
         self._create_endpoint(url='/frontend_api/get_subject_info/<subject_id>',
                               methods=['GET'],
@@ -163,7 +197,8 @@ class GatewayAPIService:
                               redirect_root='subject_service',
                               secure=True,
                               allowed_roles=[Role.TEACHER, Role.STUDENT],
-                              provide_username_arg=False)
+                              provide_username_arg=False,
+                              cached=True)
         
         self._create_endpoint(url='/frontend_api/get_subjects_info_published/<test_id>',
                               methods=['GET'],
@@ -179,7 +214,9 @@ class GatewayAPIService:
                               redirect_root='subject_service',
                               secure=True,
                               allowed_roles=[Role.TEACHER],
-                              provide_username_arg=True)
+                              provide_username_arg=True,
+                              invalidates=[('/frontend_api/get_all_subjects_info', None),
+                                           ('/frontend_api/get_subject_info/<subject_id>', 'subject_id')])
         
         
         self._create_endpoint(url='/frontend_api/save_test_attempt/<subject_id>',
@@ -204,7 +241,8 @@ class GatewayAPIService:
                               redirect_root='subject_service',
                               secure=True,
                               allowed_roles=[Role.TEACHER],
-                              provide_username_arg=True)
+                              provide_username_arg=True,
+                              invalidates=[('/frontend_api/get_all_subjects_info', None)])
         
         self._create_endpoint(url='/frontend_api/get_subject/<subject_id>',
                               methods=['GET'],
@@ -220,7 +258,9 @@ class GatewayAPIService:
                               redirect_root='subject_service',
                               secure=True,
                               allowed_roles=[Role.TEACHER],
-                              provide_username_arg=True)
+                              provide_username_arg=True,
+                              invalidates=[('/frontend_api/get_all_subjects_info', None),
+                                           ('/frontend_api/get_subject_info/<subject_id>', 'subject_id')])
         
         self._create_endpoint(url='/frontend_api/delete_subject/<subject_id>',
                               methods=['DELETE'],
@@ -228,7 +268,9 @@ class GatewayAPIService:
                               redirect_root='subject_service',
                               secure=True,
                               allowed_roles=[Role.TEACHER, Role.ADMIN],
-                              provide_username_arg=True)
+                              provide_username_arg=True,
+                              invalidates=[('/frontend_api/get_all_subjects_info', None),
+                                           ('/frontend_api/get_subject_info/<subject_id>', 'subject_id')])
         
         self._create_endpoint(url='/frontend_api/delete_test_instance/<subject_id>',
                               methods=['DELETE'],
@@ -252,7 +294,9 @@ class GatewayAPIService:
                               redirect_root='subject_service',
                               secure=True,
                               allowed_roles=[Role.TEACHER],
-                              provide_username_arg=True)
+                              provide_username_arg=True,
+                              invalidates=[('/frontend_api/get_all_subjects_info', None),
+                                           ('/frontend_api/get_subject_info/<subject_id>', 'subject_id')])
         
         self._create_endpoint(url='/frontend_api/remove_student_from_subject/<subject_id>/<username>',
                               methods=['DELETE'],
@@ -286,11 +330,82 @@ class GatewayAPIService:
                               allowed_roles=[Role.TEACHER],
                               provide_username_arg=True)
         
+        self._create_endpoint(url='/frontend_api/get_test_analytics/<subject_id>',
+                              methods=['GET'],
+                              redirect_host_url=self.redirect_url['subject_service'],
+                              redirect_root='subject_service',
+                              secure=True,
+                              allowed_roles=[Role.TEACHER],
+                              provide_username_arg=True)
+        
+        self._create_endpoint(url='/frontend_api/regrade/<subject_id>',
+                              methods=['POST'],
+                              redirect_host_url=self.redirect_url['subject_service'],
+                              redirect_root='subject_service',
+                              secure=True,
+                              allowed_roles=[Role.TEACHER],
+                              provide_username_arg=True)
+        
+        self._create_endpoint(url='/frontend_api/get_regrade_status/<subject_id>',
+                              methods=['GET'],
+                              redirect_host_url=self.redirect_url['subject_service'],
+                              redirect_root='subject_service',
+                              secure=True,
+                              allowed_roles=[Role.TEACHER],
+                              provide_username_arg=True)
+        
+        self.app.route('/frontend_api/batch', methods=['POST'])(self._batch)
+
+        self.app.route('/service_api/get_upstream_metrics', methods=['GET'])(self._get_upstream_metrics)
+        self.app.route('/service_api/get_cache_metrics', methods=['GET'])(self._get_cache_metrics)
+
+        # resolve the request root of every rule once instead of parsing each request url
+        for rule in self.app.url_map.iter_rules():
+            self._endpoint_roots[rule.endpoint] = rule.rule.lstrip('/').split('/')[0]
+
         self.app.before_request(self._before_request)
 
+    def _init_sessions(self):
+        # one keep-alive session (with its own connection pool) per upstream service
+        pool_size = int(self.app.config.get('UPSTREAM_POOL_SIZE', 10))
+        keep_alive = bool(self.app.config.get('UPSTREAM_KEEP_ALIVE', True))
+        self.upstream_timeout = (float(self.app.config.get('UPSTREAM_CONNECT_TIMEOUT', 3.05)),
+                                 float(self.app.config.get('UPSTREAM_READ_TIMEOUT', 30)))
+        self.sessions = dict()
+        for service, service_url in self.redirect_url.items():
+            session = req.Session()
+            session.verify = False
+            if not keep_alive:
+                session.headers['Connection'] = 'close'
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False)
+            session.mount(service_url, adapter)
+            self.sessions[service] = session
+
+    def _upstream_request(self, service : str, method : str, url : str, **kwargs) -> req.Response:
+        return self.sessions[service].request(method, url, timeout=self.upstream_timeout, **kwargs)
+
+    def _get_pool_metrics(self, service : str) -> dict:
+        adapter = self.sessions[service].get_adapter(self.redirect_url[service])
+        pools = adapter.poolmanager.pools
+        requests_count = 0
+        new_connections = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_count += pool.num_requests
+            new_connections += pool.num_connections
+        return {
+            'requests': requests_count,
+            'new_connections': new_connections,
+            'pool_hits': requests_count - new_connections
+        }
+
     def _before_request(self):
         # check service_api secret
-        root = request.url.removeprefix(request.host_url).split('/')[0]
+        root = self._endpoint_roots.get(request.endpoint)
+        if root is None:
+            root = request.path.lstrip('/').split('/')[0]
         if root == 'service_api':
             if request.headers.get('ServiceSecret') != self.service_secrets['service_api']:
                 return Response(status=500, response=json.dumps(["Cannot access GatewayAPI", "only services may access GatewayAPI with root /service_api"]))
@@ -305,80 +420,189 @@ class GatewayAPIService:
                          secure : bool = False,
                          allowed_roles: list[Role] = [],
                          provide_username_arg: bool = False,
-                         retrieve_username_header: bool = False):
+                         retrieve_username_header: bool = False,
+                         cached: bool = False,
+                         invalidates: list[tuple[str, Optional[str]]] = []):
         
+        # compile the upstream url once, e.g. https://host/subject_service/get_subject/{subject_id}
+        caller_root = url.lstrip('/').split('/')[0]
+        upstream_url_template = redirect_host_url + '/' + redirect_root + RULE_PARAM_RE.sub(r'{\1}', url.removeprefix('/' + caller_root))
+        endpoint_name = f'endpoint_{self._endpoint_counter}'
+        # allowed roles as a bitset, checked against the cached role bit of the token
+        allowed_roles_mask = 0
+        for role in allowed_roles:
+            allowed_roles_mask |= ROLE_BITS[role]
+        # frontend routes may also be reached through /frontend_api/batch
+        if caller_root == 'frontend_api':
+            self._batch_routes[endpoint_name] = {
+                'upstream_url_template': upstream_url_template,
+                'redirect_root': redirect_root,
+                'secure': secure,
+                'allowed_roles_mask': allowed_roles_mask,
+                'provide_username_arg': provide_username_arg,
+                'invalidates': invalidates
+            }
+
         def redirect_wrapper(request : Request, username_arg : Optional[str] = None):
                 redirect_kwargs = {
                         'caller_request': request,
-                        'redirect_host_url': redirect_host_url,
+                        'upstream_url_template': upstream_url_template,
                         'redirect_root': redirect_root
                     }
                 if retrieve_username_header:
                     username_arg = request.headers['username']
                 if provide_username_arg:
                     redirect_kwargs['username_arg'] = username_arg
-                return self._redirect(**redirect_kwargs)
-    
+                proxy_kwargs = {
+                        'redirect_kwargs': redirect_kwargs,
+                        'cache_key': None,
+                        'invalidates': invalidates
+                    }
+                if cached and request.method == 'GET':
+                    proxy_kwargs['cache_key'] = (url,
+                                                 tuple(sorted((request.view_args or {}).items())),
+                                                 request.query_string,
+                                                 redirect_kwargs.get('username_arg'),
+                                                 request.headers.get('Accept'))
+                return self._proxy(**proxy_kwargs)
+
+        def authorized_username() -> Optional[str]:
+                role_bit, username = self._authenticate()
+                if role_bit & allowed_roles_mask:
+                    return username
+                return None
+
+        def forbidden_response() -> Response:
+                return Response(status='403', response=json.dumps(["Access forbidden", 'the user does not have rights for this operation']))
+
         if secure:
-            @jwt_required()
             def security_endpoint(**kwargs):
-                identity = get_jwt_identity()
-                user_role = Role(identity[0])
-                username = identity[1]
-                if user_role in allowed_roles:
-                    return redirect_wrapper(request, username_arg=username)
-                else:
-                    return Response(status='403', response=json.dumps(["Access forbidden", 'the user does not have rights for this operation']))  
+                username = authorized_username()
+                if username is None:
+                    return forbidden_response()
+                return redirect_wrapper(request, username_arg=username)
             endpoint = security_endpoint
         else:
             def redirect_endpoint(**kwargs):
                 return redirect_wrapper(request)
             endpoint = redirect_endpoint
 
-        self.app.route(url, methods=methods, endpoint=f'endpoint_{self._endpoint_counter}')(endpoint)
+        self.app.route(url, methods=methods, endpoint=endpoint_name)(endpoint)
         self._endpoint_counter += 1
     
 
+    def _authenticate(self) -> tuple[int, str]:
+        # the signature of a token is verified once, afterwards its identity comes from the cache
+        auth_header = request.headers.get('Authorization', '')
+        token = auth_header.removeprefix('Bearer ') if auth_header.startswith('Bearer ') else None
+        if token:
+            digest = TokenCache.digest(token)
+            identity = self.token_cache.get(digest)
+            if identity is not None:
+                return identity
+        verify_jwt_in_request()
+        user_role, username = get_jwt_identity()
+        identity = (ROLE_BITS[Role(user_role)], username)
+        if token:
+            self.token_cache.put(digest, identity, get_jwt()['exp'])
+        return identity
+
+    def _proxy(self, redirect_kwargs : dict, cache_key : Optional[tuple], invalidates : list):
+        cached_response = self._get_cached_response(cache_key)
+        if cached_response is not None:
+            return cached_response
+        response = self._redirect(**redirect_kwargs)
+        return self._after_redirect(response, redirect_kwargs['caller_request'], cache_key, invalidates)
+
+    def _get_cached_response(self, cache_key : Optional[tuple]) -> Optional[Response]:
+        if cache_key is None:
+            return None
+        entry = self.response_cache.get(cache_key)
+        if entry is None:
+            return None
+        return Response(response=entry.body, status=entry.status, headers=entry.headers)
+
+    def _after_redirect(self, response : Response, caller_request : Request, cache_key : Optional[tuple], invalidates : list) -> Response:
+        # only successful upstream responses are cached or invalidate cached ones
+        if response.status_code != 200:
+            return response
+        if cache_key is not None:
+            self.response_cache.put(cache_key,
+                                    status=response.status_code,
+                                    headers=list(response.headers.items()),
+                                    body=response.get_data(),
+                                    ttl=self.response_cache_ttl)
+        self._invalidate(invalidates, caller_request.view_args)
+        return response
+
+    def _invalidate(self, invalidates : list, view_args : Optional[dict]) -> None:
+        for route, param in invalidates:
+            params = {param: view_args[param]} if param is not None else {}
+            self.response_cache.invalidate(route, params)
+
+    def _build_redirect_url(self,
+                            upstream_url_template : str,
+                            view_args : Optional[dict],
+                            query : str,
+                            username_arg : Optional[str] = None) -> str:
+        # substitute the path parameters and append the username argument to the query
+        url = upstream_url_template.format(**{name: quote(str(value), safe='')
+                                              for name, value in (view_args or {}).items()})
+        if username_arg is not None:
+            username_query = urlencode({'username': username_arg})
+            query = query + '&' + username_query if query else username_query
+        if query:
+            url += '?' + query
+        return url
+
     def _redirect(self,
                   caller_request: Request,
-                  redirect_host_url : str,
+                  upstream_url_template : str,
                   redirect_root : str = "",
                   username_arg : Optional[str] = None):
         try:
-            caller_root = caller_request.url.removeprefix(caller_request.host_url).split('/')[0]
-            # build the redirect url with the username argument
-            url = redirect_host_url + '/'
-            if redirect_root:
-                url += redirect_root
-            url += caller_request.url.removeprefix(caller_request.host_url + caller_root)
-            if username_arg is not None:
-                if '?' in url:
-                    url += '&'
-                else:
-                    url += '?'
-                url += 'username=' + username_arg
+            url = self._build_redirect_url(upstream_url_template, caller_request.view_args, caller_request.query_string.decode(), username_arg)
+            headers = self._upstream_headers(caller_request, redirect_root)
             if not caller_request.form:
-                resp = req.request(caller_request.method, url, headers={'ServiceSecret': self.service_secrets[redirect_root]}, verify=False)
-                return Response(response=resp.text,
-                                status=resp.status_code)
+                resp = self._upstream_request(redirect_root, caller_request.method, url, headers=headers, stream=True)
             else:
-                resp = req.request(caller_request.method, url, headers={'ServiceSecret': self.service_secrets[redirect_root]}, data=caller_request.form, verify=False)
-                return Response(response=resp.text,
-                                status=resp.status_code)
+                resp = self._upstream_request(redirect_root, caller_request.method, url, headers=headers, data=caller_request.form, stream=True)
+            # forward the raw (still encoded) upstream bytes chunk by chunk
+            response = Response(response=resp.raw.stream(STREAM_CHUNK_SIZE, decode_content=False),
+                                status=resp.status_code,
+                                headers=self._passthrough_headers(resp.headers))
+            response.call_on_close(resp.close)
+            return response
         except Exception as e:
             self.app.logger.error(e)
             return Response(response=json.dumps(['Backend redirecting error', str(e)]), status=500)
 
+    def _upstream_headers(self, caller_request : Request, redirect_root : str) -> dict:
+        # the service negotiates the wire format with the caller, its Content-Type is passed back.
+        # Conditional requests reach the service, which answers 304 with its ETag.
+        headers = {'ServiceSecret': self.service_secrets[redirect_root]}
+        for name in ('Accept', 'If-None-Match'):
+            if name in caller_request.headers:
+                headers[name] = caller_request.headers[name]
+        return headers
+
+    def _passthrough_headers(self, upstream_headers) -> list:
+        return [(name, value) for name, value in upstream_headers.items() if name.lower() not in HOP_BY_HOP_HEADERS]
+
+    def _wire_format(self) -> str:
+        # bodies built by the gateway itself are never double encoded, json keeps the former mimetype
+        return negotiate(request.headers.get('Accept'), legacy_lists=True)
+
     ### Service Endpoints
 
     def _get_access_token(self):
         try: 
             ### get name and role from the UserService
             user_service_url = self.redirect_url['user_service']
-            response = req.post(user_service_url + '/user_service/validate_credentials',
-                                headers={'ServiceSecret': self.service_secrets['user_service']},
-                                data=request.form,
-                                verify=False)
+            response = self._upstream_request('user_service', 'POST',
+                                              user_service_url + '/user_service/validate_credentials',
+                                              headers={'ServiceSecret': self.service_secrets['user_service']},
+                                              data=request.form)
             if response.status_code != 200:
                 raise Exception(response.text)
         except Exception as e:
@@ -389,7 +613,8 @@ class GatewayAPIService:
             # create userInfo object for the frontend
             user_info.token = create_access_token(identity=(user_info.role, user_info.username),
                                                   expires_delta=timedelta(minutes=15))
-            return Response(response=user_info.model_dump_json(), status=200)
+            wire_format = self._wire_format()
+            return respond(encode(user_info, wire_format), wire_format)
         except Exception as e:
             self.app.logger.error(e)
             return Response(response=json.dumps(['Login error', str(e)]), status=500)
@@ -399,7 +624,77 @@ class GatewayAPIService:
         try: 
             new_token = create_access_token(identity=get_jwt_identity(),
                                                   expires_delta=timedelta(minutes=25))
-            return Response(response=json.dumps(new_token))
+            wire_format = self._wire_format()
+            return respond(encode(new_token, wire_format), wire_format)
         except Exception as e:
             self.app.logger.error(e)
             return Response(response=json.dumps(['Token refresh error', str(e)]), status=500)
+
+    def _batch(self):
+        role_bit, username = self._authenticate()
+        try:
+            sub_requests = json.loads(request.form['requests'])
+            if len(sub_requests) > self.batch_max_requests:
+                raise Exception(f'at most {self.batch_max_requests} requests per batch are allowed')
+            url_adapter = self.app.url_map.bind(request.host)
+            # the sub-requests run outside of the request context, the caller's Accept goes along
+            accept = request.headers.get('Accept')
+            wire_format = self._wire_format()
+            futures = [self._batch_executor.submit(self._batch_sub_request, url_adapter, role_bit, username, accept, wire_format, sub_request)
+                       for sub_request in sub_requests]
+            return respond(encode([future.result() for future in futures], wire_format), wire_format)
+        except Exception as e:
+            self.app.logger.error(e)
+            return Response(response=json.dumps(['Batch error', str(e)]), status=500)
+
+    def _batch_sub_request(self, url_adapter, role_bit : int, username : str, accept : Optional[str], wire_format : str, sub_request : dict) -> dict:
+        # sub_request: {"method": "GET", "url": "/frontend_api/...", "form": {...}}
+        try:
+            method = sub_request.get('method', 'GET').upper()
+            path, _, query = sub_request['url'].partition('?')
+            endpoint_name, view_args = url_adapter.match(path, method=method)
+            route = self._batch_routes.get(endpoint_name)
+            if route is None:
+                raise Exception('this route cannot be batched')
+            if route['secure'] and not role_bit & route['allowed_roles_mask']:
+                return self._batch_response(403, json.dumps(["Access forbidden", 'the user does not have rights for this operation']).encode(),
+                                            None, wire_format)
+            url = self._build_redirect_url(route['upstream_url_template'],
+                                           view_args,
+                                           query,
+                                           username if route['provide_username_arg'] else None)
+            headers = {'ServiceSecret': self.service_secrets[route['redirect_root']]}
+            if accept is not None:
+                headers['Accept'] = accept
+            resp = self._upstream_request(route['redirect_root'], method, url, headers=headers, data=sub_request.get('form') or None)
+            if resp.status_code == 200:
+                self._invalidate(route['invalidates'], view_args)
+            return self._batch_response(resp.status_code, resp.content, resp.headers.get('Content-Type'), wire_format)
+        except Exception as e:
+            self.app.logger.error(e)
+            return self._batch_response(500, json.dumps(['Backend redirecting error', str(e)]).encode(), None, wire_format)
+
+    def _batch_response(self, status : int, body : bytes, content_type : Optional[str], wire_format : str) -> dict:
+        # legacy batches carry every body as text, json and msgpack batches the decoded value
+        if wire_format == LEGACY:
+            return {'status': status, 'response': body.decode()}
+        return {'status': status, 'response': decode(body, content_type)}
+
+    def _get_upstream_metrics(self):
+        try:
+            wire_format = self._wire_format()
+            return respond(encode({service: self._get_pool_metrics(service) for service in self.sessions}, wire_format), wire_format)
+        except Exception as e:
+            self.app.logger.error(e)
+            return Response(response=json.dumps(['Cannot retrieve upstream metrics', str(e)]), status=500)
+
+    def _get_cache_metrics(self):
+        try:
+            wire_format = self._wire_format()
+            return respond(encode({
+                    'responses': self.response_cache.metrics(),
+                    'tokens': self.token_cache.metrics()
+                }, wire_format), wire_format)
+        except Exception as e:
+            self.app.logger.error(e)
+            return Response(response=json.dumps(['Cannot retrieve cache metrics', str(e)]), status=500)
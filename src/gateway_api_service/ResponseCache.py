@@ -0,0 +1,86 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+class CachedResponse:
+    __slots__ = ('status', 'headers', 'body', 'expires_at')
+
+    def __init__(self, status : int, headers : list, body : bytes, expires_at : float):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    # LRU cache of proxied responses with a per-entry ttl and a cap on the stored body bytes
+
+    def __init__(self, max_entries : int = 1024, max_bytes : int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        # counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key : tuple) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key : tuple, status : int, headers : list, body : bytes, ttl : float) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CachedResponse(status, headers, body, time.monotonic() + ttl)
+            self._size += len(body)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def invalidate(self, route : str, params : dict) -> None:
+        # drop the entries of the route whose path params match all given params
+        with self._lock:
+            for key in list(self._entries.keys()):
+                key_route, key_params = key[0], dict(key[1])
+                if key_route != route:
+                    continue
+                if all(key_params.get(name) == value for name, value in params.items()):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+    def _remove(self, key : tuple) -> None:
+        entry = self._entries.pop(key)
+        self._size -= len(entry.body)
@@ -0,0 +1,51 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+class TokenCache:
+    # bounded LRU of already verified jwt tokens, each entry lives until the token expires
+
+    def __init__(self, max_entries : int = 10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # counters
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(token : str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, digest : bytes) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            identity, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return identity
+
+    def put(self, digest : bytes, identity : tuple, expires_at : float) -> None:
+        with self._lock:
+            self._entries[digest] = (identity, expires_at)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -38,5 +38,15 @@ service_secrets = {
 
 app = Flask('GatewayAPIService')
 app.config["JWT_SECRET_KEY"] = os.getenv('JWT_SECRET_KEY')
+app.config["UPSTREAM_POOL_SIZE"] = int(os.getenv('UPSTREAM_POOL_SIZE', 10))
+app.config["UPSTREAM_KEEP_ALIVE"] = os.getenv('UPSTREAM_KEEP_ALIVE', 'true').lower() == 'true'
+app.config["UPSTREAM_CONNECT_TIMEOUT"] = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', 3.05))
+app.config["UPSTREAM_READ_TIMEOUT"] = float(os.getenv('UPSTREAM_READ_TIMEOUT', 30))
+app.config["JWT_CACHE_MAX_ENTRIES"] = int(os.getenv('JWT_CACHE_MAX_ENTRIES', 10000))
+app.config["BATCH_MAX_REQUESTS"] = int(os.getenv('BATCH_MAX_REQUESTS', 20))
+app.config["BATCH_MAX_WORKERS"] = int(os.getenv('BATCH_MAX_WORKERS', 8))
+app.config["RESPONSE_CACHE_TTL"] = float(os.getenv('RESPONSE_CACHE_TTL', 30))
+app.config["RESPONSE_CACHE_MAX_ENTRIES"] = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1024))
+app.config["RESPONSE_CACHE_MAX_BYTES"] = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 16 * 1024 * 1024))
 
 gateway_api_service = GatewayAPIService(app, redirect_url, service_secrets)
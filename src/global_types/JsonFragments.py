@@ -0,0 +1,60 @@
+import json
+import threading
+from typing import Hashable, Iterable
+
+import msgpack
+from pydantic import BaseModel
+
+from global_types.WireFormat import LEGACY, JSON, MSGPACK
+
+
+class JsonFragments:
+    # serialized models per entity key, list responses are joined from the cached bytes.
+    # An entry is only used while it belongs to the same model object, mutations in place
+    # have to be announced with invalidate.
+
+    def __init__(self):
+        # key: (model, {wire format: encoded bytes}), LEGACY holds the bytes of a legacy list item
+        self._entries = dict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def fragment(self, key : Hashable, model : BaseModel, wire_format : str = JSON) -> bytes:
+        return self._encoded(key, model, MSGPACK if wire_format == MSGPACK else JSON)
+
+    def join(self, items : Iterable[tuple[Hashable, BaseModel]], wire_format : str) -> bytes:
+        encoded = [self._encoded(key, model, wire_format) for key, model in items]
+        if wire_format == MSGPACK:
+            return msgpack.Packer().pack_array_header(len(encoded)) + b''.join(encoded)
+        return b'[' + b', '.join(encoded) + b']'
+
+    def invalidate(self, key : Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generation += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def _encoded(self, key : Hashable, model : BaseModel, wire_format : str) -> bytes:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is model and wire_format in entry[1]:
+                return entry[1][wire_format]
+            generation = self._generation
+        if wire_format == MSGPACK:
+            encoded = msgpack.packb(model.model_dump(mode='json'))
+        elif wire_format == LEGACY:
+            encoded = json.dumps(model.model_dump_json()).encode()
+        else:
+            encoded = model.model_dump_json().encode()
+        with self._lock:
+            # an invalidation during the serialization may have made the bytes stale
+            if self._generation == generation:
+                entry = self._entries.get(key)
+                if entry is None or entry[0] is not model:
+                    entry = self._entries[key] = (model, dict())
+                entry[1][wire_format] = encoded
+        return encoded
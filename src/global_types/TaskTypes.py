@@ -0,0 +1,63 @@
+from enum import Enum
+
+from pydantic import BaseModel, Field
+from typing import Annotated, Any, Literal, Union
+
+
+class TaskType(str, Enum):
+    SINGLE_CHOICE = 'single-choice',
+    MULTIPLE_CHOICE = 'multiple-choice'
+
+
+class Task(BaseModel):
+    question: str
+    tag: str
+    options: list
+    type: TaskType
+    answer: Any
+    points: int
+
+    def check_answer(self, answer: Any) -> float:
+        raise Exception('Specified only for the derived classes!')
+
+    def without_answer(self) -> 'Task':
+        raise Exception('Specified only for the derived classes!')
+
+
+class SingleChoiceTask(Task):
+    options: list[str]
+    type: Literal[TaskType.SINGLE_CHOICE]
+    answer: int
+
+    # method override
+    def check_answer(self, answer : int) -> float:
+        if self.answer == answer:
+            return self.points
+        return 0
+
+    # method override
+    def without_answer(self) -> 'SingleChoiceTask':
+        return self.model_copy(update={'answer': -1})
+
+
+class MultipleChoiceTask(Task):
+    options: list[str]
+    type: Literal[TaskType.MULTIPLE_CHOICE]
+    answer: list[int]
+
+    # method override
+    def check_answer(self, answer : list[int]) -> float:
+        if len(self.options) == 0:
+            return self.points
+        # the order and repeats of the options do not matter for grading
+        wrong_answers =  len(set(self.answer).symmetric_difference(set(answer)))
+        correct_answers = len(self.options) - wrong_answers
+        return (correct_answers / len(self.options)) * self.points
+
+    # method override
+    def without_answer(self) -> 'MultipleChoiceTask':
+        return self.model_copy(update={'answer': []})
+
+
+# validation picks the concrete class by the type field
+AnyTask = Annotated[Union[SingleChoiceTask, MultipleChoiceTask], Field(discriminator='type')]
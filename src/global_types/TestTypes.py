@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+
+from global_types.TaskTypes import AnyTask
+
+
+class TestInfo(BaseModel):
+    id: str
+    name: str
+    description: str
+
+
+class Test(BaseModel):
+    info: TestInfo
+    tasks: list[AnyTask]
+    pass_percents: float
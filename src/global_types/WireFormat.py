@@ -0,0 +1,89 @@
+import json
+from typing import Any, Optional
+
+import msgpack
+from flask import Response
+from pydantic import BaseModel, TypeAdapter
+
+
+# json, list items are json encoded strings: ["{...}", "{...}"]
+LEGACY = 'legacy'
+# single-level json
+JSON = 'json'
+MSGPACK = 'msgpack'
+
+MIMETYPES = {JSON: 'application/json', MSGPACK: 'application/msgpack'}
+MSGPACK_MIMETYPES = {'application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack'}
+WILDCARD_MIMETYPES = {'*/*', 'application/*'}
+
+
+def negotiate(accept : Optional[str], legacy_lists : bool) -> str:
+    # the best ranked of msgpack and json among the accepted media types. Clients that accept
+    # anything (browsers, axios) keep the service default unless they rank msgpack first.
+    default = LEGACY if legacy_lists else JSON
+    wire_format, best_quality = default, 0.0
+    wildcard = False
+    for media_range in (accept or '').split(','):
+        mimetype, *params = [part.strip() for part in media_range.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        mimetype = mimetype.lower()
+        if quality <= 0:
+            continue
+        if mimetype in WILDCARD_MIMETYPES:
+            wildcard = True
+        elif mimetype in MSGPACK_MIMETYPES and quality > best_quality:
+            wire_format, best_quality = MSGPACK, quality
+        elif mimetype == MIMETYPES[JSON] and quality > best_quality:
+            wire_format, best_quality = JSON, quality
+    if wire_format == JSON and wildcard:
+        return default
+    return wire_format
+
+
+def encode(value : Any, wire_format : str) -> bytes:
+    # a model or plain python value, list items are never double encoded here
+    if wire_format == MSGPACK:
+        return msgpack.packb(value.model_dump(mode='json') if isinstance(value, BaseModel) else value)
+    if isinstance(value, BaseModel):
+        return value.model_dump_json().encode()
+    return json.dumps(value).encode()
+
+
+def encode_list(models : list[BaseModel], wire_format : str, adapter : Optional[TypeAdapter] = None) -> bytes:
+    # with the TypeAdapter of the list type the whole list is serialized in one call
+    if wire_format == MSGPACK:
+        if adapter is not None:
+            return msgpack.packb(adapter.dump_python(models, mode='json'))
+        return msgpack.packb([model.model_dump(mode='json') for model in models])
+    if wire_format == LEGACY:
+        return json.dumps([model.model_dump_json() for model in models]).encode()
+    if adapter is not None:
+        return adapter.dump_json(models)
+    return b'[' + b', '.join(model.model_dump_json().encode() for model in models) + b']'
+
+
+def encode_map(fields : dict[str, bytes], wire_format : str) -> bytes:
+    # a map of already encoded values, e.g. joined fragments, without decoding them again
+    if wire_format == MSGPACK:
+        return msgpack.Packer().pack_map_header(len(fields)) + b''.join(msgpack.packb(key) + value for key, value in fields.items())
+    return b'{' + b', '.join(json.dumps(key).encode() + b': ' + value for key, value in fields.items()) + b'}'
+
+
+def decode(body : bytes, content_type : Optional[str]) -> Any:
+    if (content_type or '').split(';')[0].strip().lower() in MSGPACK_MIMETYPES:
+        return msgpack.unpackb(body)
+    return json.loads(body)
+
+
+def respond(body : bytes, wire_format : str, status : int = 200) -> Response:
+    # legacy responses keep the default mimetype
+    response = Response(response=body, status=status, mimetype=MIMETYPES.get(wire_format))
+    response.vary.add('Accept')
+    return response
@@ -0,0 +1,92 @@
+from typing import Any, Optional
+
+from global_types.TaskTypes import TaskType
+from global_types.TestTypes import Test
+from subject_service.TestTypes import TestSolutionAttempt, CheckedAttempt
+
+
+SINGLE_CHOICE = 0
+MULTIPLE_CHOICE = 1
+
+
+def option_index(option : Any, options_count : int) -> Optional[int]:
+    # the option of the task an answer value stands for, integral floats compare equal to their int when graded
+    if isinstance(option, float) and option.is_integer() or isinstance(option, int):
+        if 0 <= option < options_count:
+            return int(option)
+    return None
+
+
+def picked_options(answer : Any, multiple_choice : bool, options_count : int) -> set[int]:
+    # the options of the task an answer picks, each counted once, values outside of the task are left out
+    picked = answer if multiple_choice else [answer]
+    if not isinstance(picked, list):
+        return set()
+    options = {option_index(option, options_count) for option in picked}
+    options.discard(None)
+    return options
+
+
+class AnswerKey:
+    # Test compiled once into plain ints and bitmasks, grades attempts with the
+    # same results as SingleChoiceTask / MultipleChoiceTask.check_answer
+
+    def __init__(self, test : Test):
+        self.pass_percents = test.pass_percents
+        self.overall_points = 0
+        # per task: (kind, answer or answer bitmask, answers outside of the bitmask, options count, points)
+        self.tasks = []
+        for task in test.tasks:
+            if task.type == TaskType.SINGLE_CHOICE:
+                self.tasks.append((SINGLE_CHOICE, task.answer, None, len(task.options), task.points))
+            else:
+                answer_mask, answer_rest = self._pack(task.answer, len(task.options))
+                self.tasks.append((MULTIPLE_CHOICE, answer_mask, answer_rest, len(task.options), task.points))
+            self.overall_points += task.points
+
+    def grade(self, answers : list[Any]) -> list[float]:
+        if len(answers) > len(self.tasks):
+            raise Exception('the attempt has more answers than the test has tasks')
+        task_points = []
+        for (kind, key, key_rest, options_count, points), answer in zip(self.tasks, answers):
+            if kind == SINGLE_CHOICE:
+                task_points.append(float(points) if key == answer else 0.0)
+            elif options_count == 0:
+                task_points.append(float(points))
+            else:
+                answer_mask, answer_rest = self._pack(set(answer), options_count)
+                wrong_answers = (key ^ answer_mask).bit_count() + len(key_rest.symmetric_difference(answer_rest))
+                task_points.append((options_count - wrong_answers) / options_count * points)
+        return task_points
+
+    def check(self, solution_attempt : TestSolutionAttempt) -> CheckedAttempt:
+        task_points = self.grade(solution_attempt.answers)
+        attempt_points = sum(task_points)
+        try:
+            attempt_percents = attempt_points / self.overall_points * 100
+        except ZeroDivisionError:
+            attempt_percents = 100
+        # the values are built with the field types already, so the model needs no validation
+        return CheckedAttempt.model_construct(
+            solution_attempt=solution_attempt,
+            task_points=task_points,
+            attempt_points=float(attempt_points),
+            overall_points=self.overall_points,
+            attempt_percents=float(attempt_percents),
+            passed=(attempt_percents >= self.pass_percents)
+        )
+
+    def check_many(self, solution_attempts : list[TestSolutionAttempt]) -> list[CheckedAttempt]:
+        return [self.check(solution_attempt) for solution_attempt in solution_attempts]
+
+    def _pack(self, options : set, options_count : int) -> tuple[int, set]:
+        # options inside of the task as a bitmask, anything else is kept aside for the set comparison
+        mask = 0
+        rest = set()
+        for option in options:
+            index = option_index(option, options_count)
+            if index is None:
+                rest.add(option)
+            else:
+                mask |= 1 << index
+        return mask, rest
@@ -0,0 +1,171 @@
+import threading
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, Optional
+
+from global_types.TaskTypes import TaskType
+from global_types.TestTypes import Test
+from subject_service.TestTypes import TestSolutionAttempt, CheckedAttempt
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+# multiple choice answers are packed as a bitmask of the options 0..62
+MASK_BITS = 63
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class Usernames:
+    # username <-> int id, shared by all attempt tables of the service
+
+    def __init__(self):
+        self._ids = dict()
+        self._names = []
+        self._lock = threading.Lock()
+
+    def id(self, username : str) -> int:
+        username_id = self._ids.get(username)
+        if username_id is None:
+            with self._lock:
+                username_id = self._ids.get(username)
+                if username_id is None:
+                    username_id = self._ids[username] = len(self._names)
+                    self._names.append(username)
+        return username_id
+
+    def find(self, username : str) -> Optional[int]:
+        return self._ids.get(username)
+
+    def name(self, username_id : int) -> str:
+        return self._names[username_id]
+
+
+class AttemptTable:
+    # column storage of the checked attempts of one TestInstance, one row per attempt.
+    # Answers and task points take one slot per task and row; rows whose answers do not fit
+    # the task layout keep the original values in `irregular` and zeros in the slots.
+    # Rows are only appended, callers serialize the appends (SubjectService.INSTANCE_LOCKS).
+
+    def __init__(self, test : Test, usernames : Usernames, attempts : Iterable[CheckedAttempt] = ()):
+        self.usernames = usernames
+        self.multiple_choice = [task.type == TaskType.MULTIPLE_CHOICE for task in test.tasks]
+        self.tasks_count = len(test.tasks)
+        self.students = array('I')
+        self.solved_at = array('q')  # microseconds since the epoch
+        self.answers = array('q')  # single choice: the option, multiple choice: bitmask of the options
+        self.task_points = array('d')
+        self.attempt_points = array('d')
+        self.overall_points = array('q')
+        self.attempt_percents = array('d')
+        self.passed = bytearray()
+        # row: (answers, task_points)
+        self.irregular = dict()
+        # student id: first row, students with more than one row are listed in repeated_students
+        self._student_rows = dict()
+        self._repeated_students = set()
+        for attempt in attempts:
+            self.append(attempt)
+
+    def __len__(self) -> int:
+        return len(self.students)
+
+    def __contains__(self, username : str) -> bool:
+        student = self.usernames.find(username)
+        return student is not None and student in self._student_rows
+
+    def append(self, attempt : CheckedAttempt) -> int:
+        row = len(self.students)
+        student = self.usernames.id(attempt.solution_attempt.solved_by)
+        packed_answers = self._pack_answers(attempt.solution_attempt.answers)
+        if packed_answers is None or len(attempt.task_points) != self.tasks_count:
+            self.irregular[row] = (attempt.solution_attempt.answers, attempt.task_points)
+            self.answers.extend([0] * self.tasks_count)
+            self.task_points.extend([0.0] * self.tasks_count)
+        else:
+            self.answers.extend(packed_answers)
+            self.task_points.extend(attempt.task_points)
+        solved_at = attempt.solution_attempt.solved_at
+        if solved_at.tzinfo is None:
+            solved_at = solved_at.replace(tzinfo=timezone.utc)
+        self.solved_at.append((solved_at - EPOCH) // MICROSECOND)
+        self.attempt_points.append(attempt.attempt_points)
+        self.overall_points.append(attempt.overall_points)
+        self.attempt_percents.append(attempt.attempt_percents)
+        self.passed.append(bool(attempt.passed))
+        # the student id column last, so a concurrent reader never sees a half written row
+        self.students.append(student)
+        if student in self._student_rows:
+            self._repeated_students.add(student)
+        else:
+            self._student_rows[student] = row
+        return row
+
+    def rows_of(self, username : str) -> list[int]:
+        student = self.usernames.find(username)
+        if student is None or student not in self._student_rows:
+            return []
+        if student not in self._repeated_students:
+            return [self._student_rows[student]]
+        return [row for row, row_student in enumerate(self.students) if row_student == student]
+
+    def solution_attempt(self, row : int) -> TestSolutionAttempt:
+        return TestSolutionAttempt.model_construct(
+            solved_by=self.usernames.name(self.students[row]),
+            solved_at=EPOCH + self.solved_at[row] * MICROSECOND,
+            answers=self._row_answers(row)
+        )
+
+    def attempt(self, row : int) -> CheckedAttempt:
+        # the api model of the row, the values already have the field types
+        if row in self.irregular:
+            task_points = list(self.irregular[row][1])
+        else:
+            task_points = self.task_points[row * self.tasks_count:(row + 1) * self.tasks_count].tolist()
+        return CheckedAttempt.model_construct(
+            solution_attempt=self.solution_attempt(row),
+            task_points=task_points,
+            attempt_points=self.attempt_points[row],
+            overall_points=self.overall_points[row],
+            attempt_percents=self.attempt_percents[row],
+            passed=bool(self.passed[row])
+        )
+
+    def attempts(self, rows : Optional[Iterable[int]] = None) -> list[CheckedAttempt]:
+        if rows is None:
+            rows = range(len(self.students))
+        return [self.attempt(row) for row in rows]
+
+    def _row_answers(self, row : int) -> list[Any]:
+        if row in self.irregular:
+            return list(self.irregular[row][0])
+        answers = []
+        for task_index, packed in enumerate(self.answers[row * self.tasks_count:(row + 1) * self.tasks_count]):
+            if self.multiple_choice[task_index]:
+                answers.append([option for option in range(MASK_BITS) if packed >> option & 1])
+            else:
+                answers.append(packed)
+        return answers
+
+    def _pack_answers(self, answers : list[Any]) -> Optional[list[int]]:
+        # None if the answers cannot be restored exactly from the packed slots
+        if len(answers) != self.tasks_count:
+            return None
+        packed_answers = []
+        for multiple_choice, answer in zip(self.multiple_choice, answers):
+            if multiple_choice:
+                if type(answer) is not list:
+                    return None
+                mask = 0
+                previous = -1
+                for option in answer:
+                    # only ascending unique options are restored in the same order
+                    if type(option) is not int or not previous < option < MASK_BITS:
+                        return None
+                    mask |= 1 << option
+                    previous = option
+                packed_answers.append(mask)
+            else:
+                if type(answer) is not int or not INT64_MIN <= answer <= INT64_MAX:
+                    return None
+                packed_answers.append(answer)
+        return packed_answers
@@ -1,22 +1,51 @@
+import copy
 import json
 from datetime import datetime, timezone
 from typing import Optional
+import uuid
 import random
 import string
+import threading
+import time
+from collections import OrderedDict
 
 import requests as req
+from requests.adapters import HTTPAdapter
 
 from flask_cors import CORS
 from flask import Flask, Response, request
 
-from subject_service.TaskTypes import TaskType, SingleChoiceTask, MultipleChoiceTask
 # from global_types.UserTypes import UserInfo, Role
-from subject_service.TestTypes import Test, TestInfo, TestInstance, TestSolutionAttempt, CheckedAttempt, TestSummary
+from global_types.TestTypes import Test, TestInfo
+from subject_service.TestTypes import TestInstance, TestSolutionAttempt, CheckedAttempt, RegradeStatus, CHECKED_ATTEMPT_LIST
 from subject_service.SubjectTypes import SubjectInfo, Subject
+from subject_service.AnswerKey import AnswerKey
+from subject_service.TestAggregate import TestAggregate
+from subject_service.AttemptTable import AttemptTable, Usernames
+from subject_service.TestSnapshots import TestSnapshot, TestSnapshots
+from subject_service.TestAnalytics import compute_test_analytics
+from global_types.JsonFragments import JsonFragments
+from global_types.WireFormat import MSGPACK, MIMETYPES, negotiate, encode, encode_list, decode, respond
+from subject_service.SubjectStorage import SubjectStorage, MemorySubjectStorage, SQLiteSubjectStorage
 
 
 
+# attempts scored per step of a regrade (and per progress update)
+REGRADE_BATCH_SIZE = 1000
+# tests kept with their ETag, so a repeated publish only revalidates them
+FETCHED_TESTS_SIZE = 64
+# (connect, read) timeouts of the calls to other services
+UPSTREAM_TIMEOUT = (3.05, 30)
+# seconds the gateway route is used after the direct TestService channel failed
+DIRECT_CHANNEL_RETRY_SECONDS = 30
+
+
 class SubjectService:
+    # swapped together when the whole state is loaded again from the storage
+    STATE_ATTRIBUTES = ('_storage_version', '_storage_change', 'SUBJECTS_DATABASE', 'ID_DATABASE', 'subject_info_json',
+                        'SUBJECT_TEACHERS', 'SUBJECT_STUDENTS', 'TEACHER_SUBJECTS', 'STUDENT_SUBJECTS', 'TEST_INSTANCES',
+                        'PUBLISHED_TESTS', 'ATTEMPT_TABLES', 'INSTANCE_LOCKS', 'TEST_SNAPSHOTS', 'INSTANCE_SNAPSHOTS',
+                        'TEST_AGGREGATES')
 
     def __init__(self, app : Flask, service_api_url : str):
         self.app = app
@@ -25,7 +54,25 @@ class SubjectService:
         self.cors = CORS(self.app)
         # endpoints
         self._register_routes()
-        # init database
+        # the regrade statuses live in the storage, so every worker answers the status requests
+        self.regrade_background_threshold = int(self.app.config.get('REGRADE_BACKGROUND_THRESHOLD', 500))
+        # seconds a regrade status is kept after its last update
+        self.regrade_status_ttl = int(self.app.config.get('REGRADE_STATUS_TTL', 3600))
+        # response encoding
+        self.legacy_json_lists = self.app.config.get('LEGACY_JSON_LISTS', True)
+        # student ids of the attempt tables
+        self.usernames = Usernames()
+        # test_id: (etag, Test) of the last fetched versions
+        self.fetched_tests = OrderedDict()
+        self._fetched_tests_lock = threading.Lock()
+        # direct channel to the TestService (None: only the gateway route), both share the connection pool
+        self.test_service_url = self.app.config.get('TEST_SERVICE_URL')
+        self._direct_channel_retry_at = 0.0
+        self.session = req.Session()
+        self.session.verify = False
+        self.session.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=10))
+        # init database, the changes of other workers are applied one sync at a time
+        self._sync_lock = threading.Lock()
         self._init_database()
         # admins list
         self.admins = ['admin']
@@ -55,6 +102,9 @@ class SubjectService:
         self.app.route('/subject_service/get_task_results/<subject_id>', methods=['GET'])(self._get_task_results)
         self.app.route('/subject_service/get_test_summary/<subject_id>', methods=['GET'])(self._get_test_summary)
         self.app.route('/subject_service/get_student_results/<subject_id>', methods=['GET'])(self._get_student_results)
+        self.app.route('/subject_service/get_test_analytics/<subject_id>', methods=['GET'])(self._get_test_analytics)
+        self.app.route('/subject_service/regrade/<subject_id>', methods=['POST'])(self._regrade)
+        self.app.route('/subject_service/get_regrade_status/<subject_id>', methods=['GET'])(self._get_regrade_status)
 
         self.app.before_request(self._before_request)
 
@@ -62,41 +112,279 @@ class SubjectService:
         # check service secret
         if request.headers.get('ServiceSecret') != self.app.config["SERVICE_SECRET"]:
             return Response(status=500, response=json.dumps(["Cannot access SubjectService", "only GatewayAPI may access SubjectService"]))
+        # pick up the changes other workers committed to the storage
+        self._sync_database()
 
     def _init_database(self):
-        # Data-structures that simulate a service database
+        # In-memory working set, every mutation is written through to the storage
         self.SUBJECTS_DATABASE = dict()
         self.ID_DATABASE = dict()
-        # fill database with some entities for testing
-        self._prefill_database() 
+        self.storage = self._create_storage()
+        if self.storage.is_empty():
+            # fill database with some entities for testing
+            self._prefill_database()
+            try:
+                self._storage_version = self.storage.data_version()
+                self._storage_change = self.storage.last_change()
+                self.storage.migrate(self.SUBJECTS_DATABASE, self.ID_DATABASE)
+                self._rebuild_indexes()
+                return
+            except Exception:
+                # another worker has migrated the data in the meantime
+                pass
+        self._load_database()
+
+    def _create_storage(self) -> SubjectStorage:
+        storage = self.app.config.get('SUBJECT_STORAGE', 'memory')
+        if storage == 'memory':
+            return MemorySubjectStorage()
+        if storage == 'sqlite':
+            return SQLiteSubjectStorage(self.app.config.get('SUBJECT_DATABASE_PATH', 'data/subjects.db'))
+        raise Exception(f'unknown subject storage: {storage}')
+
+    def _sync_database(self):
+        # the data version only changes on commits of other workers, then their logged changes are applied
+        if self.storage.data_version() == self._storage_version:
+            return
+        with self._sync_lock:
+            storage_version = self.storage.data_version()
+            if storage_version == self._storage_version:
+                return
+            self._storage_version = storage_version
+            changes = self.storage.changes_since(self._storage_change)
+            if changes is None:
+                # this worker fell behind the change log
+                self._load_database()
+                return
+            self._storage_change, changed = changes
+            reloaded_subjects = set()
+            for subject_id, test_id, remark, solved_by in changed:
+                if subject_id in reloaded_subjects:
+                    # the reload has read the later changes of the subject as well
+                    continue
+                if test_id is None:
+                    self._reload_subject(subject_id)
+                    reloaded_subjects.add(subject_id)
+                else:
+                    self._reload_attempt(subject_id, test_id, remark, solved_by)
+
+    def _reload_subject(self, subject_id : str) -> None:
+        subject = self.storage.load_subject(subject_id)
+        if subject is not None:
+            self._reindex_subject(subject_id, subject)
+        elif subject_id in self.SUBJECTS_DATABASE:
+            del self.SUBJECTS_DATABASE[subject_id]
+            self._unindex_subject(subject_id)
+
+    def _reload_attempt(self, subject_id : str, test_id : str, remark : str, solved_by : str) -> None:
+        attempt_table = self.ATTEMPT_TABLES.get(subject_id, dict()).get((test_id, remark))
+        if attempt_table is None or solved_by in attempt_table:
+            return
+        attempt = self.storage.load_attempt(subject_id, test_id, remark, solved_by)
+        with self.INSTANCE_LOCKS[subject_id][(test_id, remark)]:
+            if attempt is not None and solved_by not in attempt_table:
+                self._index_attempt(subject_id, (test_id, remark), attempt)
+
+    def _load_database(self):
+        # the new state is built off to the side, the request threads keep reading the current one meanwhile
+        state = copy.copy(self)
+        state._storage_version = self.storage.data_version()
+        state._storage_change = self.storage.last_change()
+        state.SUBJECTS_DATABASE, state.ID_DATABASE = self.storage.load()
+        state._rebuild_indexes()
+        # the attempts are streamed straight into the attempt tables
+        for subject_id, test_id, remark, attempt in self.storage.load_attempts():
+            if (test_id, remark) in state.ATTEMPT_TABLES.get(subject_id, dict()):
+                state._index_attempt(subject_id, (test_id, remark), attempt)
+        # swapped in one step, a request sees either the former or the new state
+        vars(self).update({name: getattr(state, name) for name in self.STATE_ATTRIBUTES})
+
+    ### indexes
+    def _rebuild_indexes(self):
+        # subject_id: serialized SubjectInfo
+        self.subject_info_json = JsonFragments()
+        # subject_id: {username}
+        self.SUBJECT_TEACHERS = dict()
+        self.SUBJECT_STUDENTS = dict()
+        # username: {subject_id: None} (dict keeps the subscription order)
+        self.TEACHER_SUBJECTS = dict()
+        self.STUDENT_SUBJECTS = dict()
+        # subject_id: {(test_id, remark): TestInstance}
+        self.TEST_INSTANCES = dict()
+        # test_id: {subject_id: number of instances}
+        self.PUBLISHED_TESTS = dict()
+        # subject_id: {(test_id, remark): AttemptTable}, the attempts of the instances live only here
+        self.ATTEMPT_TABLES = dict()
+        # subject_id: {(test_id, remark): Lock}, guards the check-and-append of the attempts of one instance,
+        # kept over reloads so a request holding a lock keeps excluding the others
+        former_locks = getattr(self, 'INSTANCE_LOCKS', dict())
+        self.INSTANCE_LOCKS = {subject_id: former_locks[subject_id] for subject_id in self.SUBJECTS_DATABASE if subject_id in former_locks}
+        # published test contents by hash, shared by the instances (with the student view and the answer key)
+        self.TEST_SNAPSHOTS = TestSnapshots()
+        # subject_id: {(test_id, remark): TestSnapshot}
+        self.INSTANCE_SNAPSHOTS = dict()
+        # subject_id: {(test_id, remark): TestAggregate}
+        self.TEST_AGGREGATES = dict()
+        for subject_id, subject in self.SUBJECTS_DATABASE.items():
+            self._index_subject(subject_id, subject)
+
+    def _index_subject(self, subject_id : str, subject : Subject) -> None:
+        # the entries of the subject are built before they are set, a reader never sees a half indexed subject
+        test_instances, instance_snapshots, attempt_tables, aggregates = dict(), dict(), dict(), dict()
+        former_locks, instance_locks = self.INSTANCE_LOCKS.get(subject_id, dict()), dict()
+        for test_instance in subject.test_instances:
+            instance_key = (test_instance.test.info.id, test_instance.remark)
+            test_instances[instance_key] = test_instance
+            instance_locks[instance_key] = former_locks.get(instance_key) or threading.Lock()
+            instance_snapshots[instance_key], attempt_tables[instance_key], aggregates[instance_key] = self._build_test_instance(test_instance)
+        self.SUBJECT_TEACHERS[subject_id] = set(subject.info.teachers)
+        self.SUBJECT_STUDENTS[subject_id] = set(subject.students)
+        self.INSTANCE_SNAPSHOTS[subject_id] = instance_snapshots
+        self.ATTEMPT_TABLES[subject_id] = attempt_tables
+        self.INSTANCE_LOCKS[subject_id] = instance_locks
+        self.TEST_AGGREGATES[subject_id] = aggregates
+        self.TEST_INSTANCES[subject_id] = test_instances
+        for teacher in subject.info.teachers:
+            self.TEACHER_SUBJECTS.setdefault(teacher, dict())[subject_id] = None
+        for student in subject.students:
+            self.STUDENT_SUBJECTS.setdefault(student, dict())[subject_id] = None
+        for test_id, _ in test_instances:
+            self._count_published(test_id, subject_id, 1)
+        self.subject_info_json.invalidate(subject_id)
+
+    def _reindex_subject(self, subject_id : str, subject : Subject) -> None:
+        # the new content is indexed before the former one is dropped, so the subject never disappears
+        former_teachers = self.SUBJECT_TEACHERS.get(subject_id, set())
+        former_students = self.SUBJECT_STUDENTS.get(subject_id, set())
+        former_snapshots = self.INSTANCE_SNAPSHOTS.get(subject_id, dict())
+        self._index_subject(subject_id, subject)
+        self.SUBJECTS_DATABASE[subject_id] = subject
+        for teacher in former_teachers - self.SUBJECT_TEACHERS[subject_id]:
+            self.TEACHER_SUBJECTS[teacher].pop(subject_id, None)
+        for student in former_students - self.SUBJECT_STUDENTS[subject_id]:
+            self.STUDENT_SUBJECTS[student].pop(subject_id, None)
+        for (test_id, _), snapshot in former_snapshots.items():
+            self._count_published(test_id, subject_id, -1)
+            self.TEST_SNAPSHOTS.release(snapshot)
+
+    def _unindex_subject(self, subject_id : str) -> None:
+        self.subject_info_json.invalidate(subject_id)
+        for teacher in self.SUBJECT_TEACHERS.pop(subject_id, set()):
+            self.TEACHER_SUBJECTS[teacher].pop(subject_id, None)
+        for student in self.SUBJECT_STUDENTS.pop(subject_id, set()):
+            self.STUDENT_SUBJECTS[student].pop(subject_id, None)
+        for test_id, remark in list(self.TEST_INSTANCES.get(subject_id, dict())):
+            self._unindex_test_instance(subject_id, test_id, remark)
+        self.TEST_INSTANCES.pop(subject_id, None)
+        self.ATTEMPT_TABLES.pop(subject_id, None)
+        self.INSTANCE_LOCKS.pop(subject_id, None)
+        self.INSTANCE_SNAPSHOTS.pop(subject_id, None)
+        self.TEST_AGGREGATES.pop(subject_id, None)
+
+    def _build_test_instance(self, test_instance : TestInstance) -> tuple[TestSnapshot, AttemptTable, TestAggregate]:
+        # instances with the same test content share one test object
+        snapshot = self.TEST_SNAPSHOTS.acquire(test_instance.test)
+        test_instance.test = snapshot.test
+        attempt_table = AttemptTable(snapshot.test, self.usernames)
+        aggregate = TestAggregate(snapshot.test)
+        # the attempts move into the table, the model keeps an empty list
+        for attempt in test_instance.solution_attempts:
+            attempt_table.append(attempt)
+            aggregate.add_attempt(attempt)
+        test_instance.solution_attempts = []
+        return snapshot, attempt_table, aggregate
+
+    def _index_test_instance(self, subject_id : str, test_instance : TestInstance) -> None:
+        test_id = test_instance.test.info.id
+        instance_key = (test_id, test_instance.remark)
+        snapshot, attempt_table, aggregate = self._build_test_instance(test_instance)
+        self.INSTANCE_SNAPSHOTS[subject_id][instance_key] = snapshot
+        self.ATTEMPT_TABLES[subject_id][instance_key] = attempt_table
+        self.INSTANCE_LOCKS[subject_id].setdefault(instance_key, threading.Lock())
+        self.TEST_AGGREGATES[subject_id][instance_key] = aggregate
+        self.TEST_INSTANCES[subject_id][instance_key] = test_instance
+        self._count_published(test_id, subject_id, 1)
+
+    def _unindex_test_instance(self, subject_id : str, test_id : str, remark : str) -> None:
+        if self.TEST_INSTANCES[subject_id].pop((test_id, remark), None) is None:
+            return
+        del self.ATTEMPT_TABLES[subject_id][(test_id, remark)]
+        self.INSTANCE_LOCKS[subject_id].pop((test_id, remark), None)
+        self.TEST_SNAPSHOTS.release(self.INSTANCE_SNAPSHOTS[subject_id].pop((test_id, remark)))
+        del self.TEST_AGGREGATES[subject_id][(test_id, remark)]
+        self._count_published(test_id, subject_id, -1)
+
+    def _count_published(self, test_id : str, subject_id : str, count : int) -> None:
+        published_on = self.PUBLISHED_TESTS.setdefault(test_id, dict())
+        published_on[subject_id] = published_on.get(subject_id, 0) + count
+        if published_on[subject_id] == 0:
+            del published_on[subject_id]
+        if not published_on:
+            del self.PUBLISHED_TESTS[test_id]
+
+    def _index_attempt(self, subject_id : str, instance_key : tuple[str, str], attempt : CheckedAttempt) -> None:
+        self.ATTEMPT_TABLES[subject_id][instance_key].append(attempt)
+        self.TEST_AGGREGATES[subject_id][instance_key].add_attempt(attempt)
+
+    def _index_member(self, subject_id : str, username : str, role : str) -> None:
+        if role == 'teacher':
+            self.subject_info_json.invalidate(subject_id)
+            self.SUBJECT_TEACHERS[subject_id].add(username)
+            self.TEACHER_SUBJECTS.setdefault(username, dict())[subject_id] = None
+        else:
+            self.SUBJECT_STUDENTS[subject_id].add(username)
+            self.STUDENT_SUBJECTS.setdefault(username, dict())[subject_id] = None
+
+    def _unindex_member(self, subject_id : str, username : str, role : str) -> None:
+        if role == 'teacher':
+            self.subject_info_json.invalidate(subject_id)
+            self.SUBJECT_TEACHERS[subject_id].discard(username)
+            self.TEACHER_SUBJECTS.get(username, dict()).pop(subject_id, None)
+        else:
+            self.SUBJECT_STUDENTS[subject_id].discard(username)
+            self.STUDENT_SUBJECTS.get(username, dict()).pop(subject_id, None)
 
     ### helper methods
     def _generate_subject_id(self, username):
-        if username not in self.ID_DATABASE:
-            self.ID_DATABASE[username] = 0
-        new_id = self.ID_DATABASE[username] = self.ID_DATABASE[username] + 1
+        new_id = self.ID_DATABASE[username] = self.storage.next_id_counter(username, self.ID_DATABASE.get(username, 0))
         return f'{username}_subject_{new_id}'
     
     def _check_subject_teacher(self, username : str, subject_id : str) -> None:
         if subject_id not in self.SUBJECTS_DATABASE:
                 raise Exception("no such subject")     
-        if username not in self.SUBJECTS_DATABASE[subject_id].info.teachers:
+        if username not in self.SUBJECT_TEACHERS[subject_id]:
             raise Exception('To perform this operation you have to be a subject teacher or owner')
         
     def _check_subject_student(self, username : str, subject_id : str) -> None:
         if subject_id not in self.SUBJECTS_DATABASE:
                 raise Exception("no such subject")     
-        if username not in self.SUBJECTS_DATABASE[subject_id].students:
+        if username not in self.SUBJECT_STUDENTS[subject_id]:
             raise Exception('To perform this operation you have to be a subject student')
         
     def _check_subject_participant(self, username : str, subject_id : str) -> None:
         if subject_id not in self.SUBJECTS_DATABASE:
                 raise Exception("no such subject")     
-        if username not in self.SUBJECTS_DATABASE[subject_id].info.teachers and username not in self.SUBJECTS_DATABASE[subject_id].students:
+        if username not in self.SUBJECT_TEACHERS[subject_id] and username not in self.SUBJECT_STUDENTS[subject_id]:
             raise Exception('To perform this operation you have to be a subject teacher or student')
     
+    def _get_test_instance(self, subject_id : str, test_id : str, remark : str) -> TestInstance:
+        if subject_id not in self.TEST_INSTANCES:
+            raise Exception("no such subject")
+        test_instance = self.TEST_INSTANCES[subject_id].get((test_id, remark))
+        if test_instance is None:
+            raise Exception('no such test instance in the subject')
+        return test_instance
+
+    def _get_answer_key(self, subject_id : str, test_instance : TestInstance) -> AnswerKey:
+        snapshot = self.INSTANCE_SNAPSHOTS[subject_id][(test_instance.test.info.id, test_instance.remark)]
+        if snapshot.answer_key is None:
+            snapshot.answer_key = AnswerKey(snapshot.test)
+        return snapshot.answer_key
+
     def _cut_for_student(self, student : string, subject : Subject) -> Subject:
-        student_subject = Subject(
+        # the view is only assembled from validated parts of the indexes, so the models need no validation
+        subject_id = subject.info.id
+        student_subject = Subject.model_construct(
             info=subject.info,
             teacher_access_code='',
             student_access_code='',
@@ -104,107 +392,87 @@ class SubjectService:
             test_instances=[]
         )
         for original_instance in subject.test_instances:
-            student_attempts = []
-            for original_attempt in original_instance.solution_attempts:
-                if original_attempt.solution_attempt.solved_by == student:
-                    student_attempts.append(original_attempt)
-            student_subject.test_instances.append(TestInstance(
-                test=self._cut_test_answers(original_instance.test),
+            instance_key = (original_instance.test.info.id, original_instance.remark)
+            attempt_table = self.ATTEMPT_TABLES[subject_id][instance_key]
+            student_subject.test_instances.append(TestInstance.model_construct(
+                test=self.INSTANCE_SNAPSHOTS[subject_id][instance_key].student_view,
                 remark=original_instance.remark,
                 published_at=original_instance.published_at,
                 published_by=original_instance.published_by,
-                solution_attempts=student_attempts
+                solution_attempts=attempt_table.attempts(attempt_table.rows_of(student))
             ))
         return student_subject
-    
-    def _cut_test_answers(self, test : Test) -> Test:
-        new_tasks = []
-        for task in test.tasks:
-            if task.type == TaskType.SINGLE_CHOICE:
-                new_tasks.append(SingleChoiceTask(
-                    question=task.question,
-                    tag=task.tag,
-                    options=task.options,
-                    type=task.type,
-                    answer=-1,
-                    points=task.points
-                ))
-            if task.type == TaskType.MULTIPLE_CHOICE:
-                new_tasks.append(MultipleChoiceTask(
-                    question=task.question,
-                    tag=task.tag,
-                    options=task.options,
-                    type=task.type,
-                    answer=[],
-                    points=task.points
-                ))
-        return Test(
-            info=test.info,
-            tasks=new_tasks,
-            pass_percents=test.pass_percents
+
+    def _with_attempts(self, subject : Subject) -> Subject:
+        # the api model of a stored subject, its attempts are materialized from the tables
+        subject_id = subject.info.id
+        return Subject.model_construct(
+            info=subject.info,
+            teacher_access_code=subject.teacher_access_code,
+            student_access_code=subject.student_access_code,
+            students=subject.students,
+            test_instances=[self._instance_with_attempts(subject_id, test_instance) for test_instance in subject.test_instances]
         )
+
+    def _instance_with_attempts(self, subject_id : str, test_instance : TestInstance) -> TestInstance:
+        return test_instance.model_copy(update={
+            'solution_attempts': self.ATTEMPT_TABLES[subject_id][(test_instance.test.info.id, test_instance.remark)].attempts()
+        })
     
-    def _specify_test_tasks(self, test : Test) -> Test:
-        return Test(
-            info=test.info,
-            tasks=[SingleChoiceTask(
-                question=task.question,
-                tag=task.tag,
-                options=task.options,
-                type=task.type,
-                answer=task.answer,
-                points=task.points
-            ) if task.type == TaskType.SINGLE_CHOICE
-              else MultipleChoiceTask(
-                question=task.question,
-                tag=task.tag,
-                options=task.options,
-                type=task.type,
-                answer=task.answer,
-                points=task.points
-              ) for task in test.tasks ],
-            pass_percents=test.pass_percents
-        )
+    def _fetch_test(self, test_id : str, username : str) -> Test:
+        # the TestService checks the ownership first and answers 304 while the cached version is current
+        with self._fetched_tests_lock:
+            fetched = self.fetched_tests.get(test_id)
+        headers = {'Accept': MIMETYPES[MSGPACK]}
+        if fetched is not None:
+            headers['If-None-Match'] = fetched[0]
+        test_response = self._request_test(test_id, username, headers)
+        if test_response.status_code == 304 and fetched is not None:
+            return fetched[1]
+        if test_response.status_code != 200:
+            raise Exception('cannot retrieve the publisher info')
+        test = Test.model_validate(decode(test_response.content, test_response.headers.get('Content-Type')))
+        etag = test_response.headers.get('ETag')
+        if etag is not None:
+            with self._fetched_tests_lock:
+                self.fetched_tests[test_id] = (etag, test)
+                self.fetched_tests.move_to_end(test_id)
+                while len(self.fetched_tests) > FETCHED_TESTS_SIZE:
+                    self.fetched_tests.popitem(last=False)
+        return test
+
+    def _request_test(self, test_id : str, username : str, headers : dict) -> req.Response:
+        # straight to the TestService when it is configured and reachable, otherwise through the gateway
+        if self.test_service_url is not None and time.monotonic() >= self._direct_channel_retry_at:
+            try:
+                return self.session.get(f'{self.test_service_url}/test_service/get_test/{test_id}',
+                                        params={'username': username},
+                                        headers={**headers, 'ServiceSecret': self.app.config['TEST_SERVICE_SECRET']},
+                                        timeout=UPSTREAM_TIMEOUT)
+            except req.RequestException as e:
+                self.app.logger.warning(f'TestService not reachable, using the gateway: {e}')
+                self._direct_channel_retry_at = time.monotonic() + DIRECT_CHANNEL_RETRY_SECONDS
+        return self.session.get(f'{self.service_api_url}/service_api/get_test/{test_id}',
+                                headers={**headers, 'username': username, 'ServiceSecret': self.app.config['SERVICE_API_SECRET']},
+                                timeout=UPSTREAM_TIMEOUT)
+
+    def _wire_format(self) -> str:
+        return negotiate(request.headers.get('Accept'), self.legacy_json_lists)
 
-            
     def _generate_string(self, size=6, chars=string.ascii_uppercase + string.digits):
         return ''.join(random.choice(chars) for _ in range(size))
 
-    def _check_attempt(self, solution_attempt : TestSolutionAttempt, test : Test):
-        test = self._specify_test_tasks(test)
-        self.app.logger.debug(solution_attempt.answers)
-        task_points = []
-        self.app.logger.debug(test.tasks)
-        for index, answer in enumerate(solution_attempt.answers):
-            task_points.append(test.tasks[index].check_answer(answer))
-        self.app.logger.debug(task_points)
-        attempt_points = sum(task_points)
-        overall_points = sum([task.points for task in test.tasks])
-        try:
-            attempt_percents = attempt_points / overall_points * 100
-        except Exception:
-            attempt_percents = 100
-        passed = (attempt_percents >= test.pass_percents)
-        return CheckedAttempt(
-            solution_attempt=solution_attempt,
-            task_points=task_points,
-            attempt_points=attempt_points,
-            overall_points=overall_points,
-            attempt_percents=attempt_percents,
-            passed=passed
-        )
-
     ### Subject service endpoints
 
     def _get_subjects_info_published(self, test_id: str):
         try:
             username = request.args['username']
             result_subjects= []
-            for subject in self.SUBJECTS_DATABASE.values():
-                test_is_published = test_id in [test_instance.test.info.id for test_instance in subject.test_instances]
-                if test_is_published and (username in subject.info.teachers):
-                    result_subjects.append(subject.info)
-            return Response(response=json.dumps([subject_info.model_dump_json() for subject_info in result_subjects]))
+            for subject_id in self.PUBLISHED_TESTS.get(test_id, dict()):
+                if username in self.SUBJECT_TEACHERS[subject_id]:
+                    result_subjects.append((subject_id, self.SUBJECTS_DATABASE[subject_id].info))
+            wire_format = self._wire_format()
+            return respond(self.subject_info_json.join(result_subjects, wire_format), wire_format)
         except Exception as e:
             self.app.logger.error(e)
             return Response(status=500, response=json.dumps(["Cannot retrieve the subjects the test is published on", str(e)]))
@@ -213,17 +481,22 @@ class SubjectService:
         username = request.args['username']
         try:                
             result_subjects= []
-            for subject in self.SUBJECTS_DATABASE.values():
-                if username in subject.info.teachers or username in subject.students:
-                    result_subjects.append(subject.info)
-            return Response(response=json.dumps([subject_info.model_dump_json() for subject_info in result_subjects]))
+            for subject_id in self.TEACHER_SUBJECTS.get(username, dict()):
+                result_subjects.append((subject_id, self.SUBJECTS_DATABASE[subject_id].info))
+            for subject_id in self.STUDENT_SUBJECTS.get(username, dict()):
+                if subject_id not in self.TEACHER_SUBJECTS.get(username, dict()):
+                    result_subjects.append((subject_id, self.SUBJECTS_DATABASE[subject_id].info))
+            wire_format = self._wire_format()
+            return respond(self.subject_info_json.join(result_subjects, wire_format), wire_format)
         except Exception as e:
             self.app.logger.error(e)
             return Response(status=500, response=json.dumps(["Cannot retrieve my subjects info", str(e)]))
         
     def _get_all_subjects_info(self):
         try:  
-            return Response(response=json.dumps([subject.info.model_dump_json() for subject in self.SUBJECTS_DATABASE.values()]))
+            wire_format = self._wire_format()
+            return respond(self.subject_info_json.join(
+                ((subject_id, subject.info) for subject_id, subject in self.SUBJECTS_DATABASE.items()), wire_format), wire_format)
         except Exception as e:
             self.app.logger.error(e)
             return Response(status=500, response=json.dumps(["Cannot retrieve all subjects info", str(e)]))
@@ -233,7 +506,8 @@ class SubjectService:
             if subject_id not in self.SUBJECTS_DATABASE:
                 raise Exception("no such subject")                
             subject = self.SUBJECTS_DATABASE[subject_id]
-            return Response(response=subject.info.model_dump_json())
+            wire_format = self._wire_format()
+            return respond(self.subject_info_json.fragment(subject_id, subject.info, wire_format), wire_format)
         except Exception as e:
             self.app.logger.error(e)
             return Response(status=500, response=json.dumps(["Cannot retrieve the subject info", str(e)]))
@@ -244,26 +518,26 @@ class SubjectService:
             self._check_subject_teacher(username, subject_id)
             remark = json.loads(request.form['remark'])
             #
-            test_response = req.get(f'{self.service_api_url}/service_api/get_test/{test_id}',
-                                    headers = {'username': username, 'ServiceSecret': self.app.config['SERVICE_API_SECRET']},
-                                    verify=False)
-            if test_response.status_code != 200:
-                raise Exception('cannot retrieve the publisher info')
-            test = Test.model_validate_json(test_response.text)
+            test = self._fetch_test(test_id, username)
+            # compile the answer key once, this also rejects tests with invalid answers
+            answer_key = AnswerKey(test)
             #
-            for test_instance in self.SUBJECTS_DATABASE[subject_id].test_instances:
-                if test_instance.test.info.id == test_id and test_instance.remark == remark:
-                    raise Exception('test instance with this test_id and remark already exists.')
+            if (test_id, remark) in self.TEST_INSTANCES[subject_id]:
+                raise Exception('test instance with this test_id and remark already exists.')
             #
             if subject_id not in self.SUBJECTS_DATABASE:
                 raise Exception("no such subject")     
-            self.SUBJECTS_DATABASE[subject_id].test_instances.append(TestInstance(
+            test_instance = TestInstance(
                 test=test,
                 remark=remark,
                 published_at=datetime.utcnow().replace(tzinfo=timezone.utc),
                 published_by=username,
                 solution_attempts=[]
-            ))
+            )
+            self.storage.add_test_instance(subject_id, test_instance)
+            self.SUBJECTS_DATABASE[subject_id].test_instances.append(test_instance)
+            self._index_test_instance(subject_id, test_instance)
+            self.INSTANCE_SNAPSHOTS[subject_id][(test_id, remark)].answer_key = answer_key
             return Response(status=200)
         except Exception as e:
             self.app.logger.error(e)
@@ -286,8 +560,11 @@ class SubjectService:
                 students = [],  
             )
             # save the empty subject
+            self.storage.save_subject(empty_subject)
             self.SUBJECTS_DATABASE[empty_subject.info.id] = empty_subject
-            return Response(response=empty_subject.model_dump_json())
+            self._index_subject(empty_subject.info.id, empty_subject)
+            wire_format = self._wire_format()
+            return respond(encode(empty_subject, wire_format), wire_format)
         except Exception as e:
             self.app.logger.error(e)
             return Response(status=500, response=json.dumps(["Cannot create an empty subject", str(e)]))
@@ -297,10 +574,14 @@ class SubjectService:
             username = request.args['username']
             self._check_subject_teacher(username, subject_id)
             subject = Subject.model_validate_json(request.form['subject'])
+            # the storage keys the subject by its body, the access was checked for the url
+            if subject.info.id != subject_id:
+                raise Exception('the subject id does not match')
             # save the empty subject
             if subject_id not in self.SUBJECTS_DATABASE:
                 raise Exception("no such subject")     
-            self.SUBJECTS_DATABASE[subject_id] = subject
+            self.storage.save_subject(subject)
+            self._reindex_subject(subject_id, subject)
             return Response(status=200)
         except Exception as e:
             self.app.logger.error(e)
@@ -313,7 +594,9 @@ class SubjectService:
                 self._check_subject_teacher(username, subject_id)
             if subject_id not in self.SUBJECTS_DATABASE:
                 raise Exception("no such subject")     
+            self.storage.delete_subject(subject_id)
             del self.SUBJECTS_DATABASE[subject_id]
+            self._unindex_subject(subject_id)
             return Response(status=200)
         except Exception as e:
             self.app.logger.error(e)
@@ -327,12 +610,14 @@ class SubjectService:
 
             if subject_id not in self.SUBJECTS_DATABASE:
                 raise Exception("no such subject")     
-            subject = Subject.model_validate(self.SUBJECTS_DATABASE[subject_id])
+            # stored subjects are validated on ingress, so they are serialized as they are
+            subject = self.SUBJECTS_DATABASE[subject_id]
+            wire_format = self._wire_format()
     
-            if username not in subject.info.teachers:
-                return Response(response=self._cut_for_student(username, subject).model_dump_json())
+            if username not in self.SUBJECT_TEACHERS[subject_id]:
+                return respond(encode(self._cut_for_student(username, subject), wire_format), wire_format)
 
-            return Response(response=subject.model_dump_json())
+            return respond(encode(self._with_attempts(subject), wire_format), wire_format)
         except Exception as e:
             self.app.logger.error(e)
             return Response(status=500, response=json.dumps(["Cannot retrieve the subject", str(e)]))
@@ -347,14 +632,10 @@ class SubjectService:
             test_id = request.args['test_id']
             remark = request.args['remark']
 
-            delete_instance = None
-            for test_instance in self.SUBJECTS_DATABASE[subject_id].test_instances:
-                if test_instance.test.info.id == test_id and test_instance.remark == remark:
-                    delete_instance = test_instance
-                    break
-            if delete_instance is None:
-                raise Exception('no such test instance in the subject')
+            delete_instance = self._get_test_instance(subject_id, test_id, remark)
+            self.storage.delete_test_instance(subject_id, test_id, remark)
             self.SUBJECTS_DATABASE[subject_id].test_instances.remove(delete_instance)
+            self._unindex_test_instance(subject_id, test_id, remark)
             return Response(status=200)
         except Exception as e:
             self.app.logger.error(e)
@@ -365,8 +646,10 @@ class SubjectService:
             username = request.args['username']
             access_code = json.loads(request.form['access_code'])
             if self.SUBJECTS_DATABASE[subject_id].teacher_access_code == access_code:
-                if username not in self.SUBJECTS_DATABASE[subject_id].info.teachers:
+                if username not in self.SUBJECT_TEACHERS[subject_id]:
+                    self.storage.add_member(subject_id, username, 'teacher')
                     self.SUBJECTS_DATABASE[subject_id].info.teachers.append(username)
+                    self._index_member(subject_id, username, 'teacher')
                 else:
                     raise Exception('you are already a teacher in the subject')
             else:
@@ -381,8 +664,10 @@ class SubjectService:
             username = request.args['username']
             access_code = json.loads(request.form['access_code'])
             if self.SUBJECTS_DATABASE[subject_id].student_access_code == access_code:
-                if username not in self.SUBJECTS_DATABASE[subject_id].students:
+                if username not in self.SUBJECT_STUDENTS[subject_id]:
+                    self.storage.add_member(subject_id, username, 'student')
                     self.SUBJECTS_DATABASE[subject_id].students.append(username)
+                    self._index_member(subject_id, username, 'student')
                 else:
                     raise Exception('you are already a student in the subject')
             else:
@@ -396,11 +681,13 @@ class SubjectService:
         try:
             modifier_username = request.args['username']
             self._check_subject_teacher(modifier_username, subject_id)
-            if username not in self.SUBJECTS_DATABASE[subject_id].info.teachers:
+            if username not in self.SUBJECT_TEACHERS[subject_id]:
                 raise Exception('no such teacher in the subject')
             if username == self.SUBJECTS_DATABASE[subject_id].info.owner:
                 raise Exception('you can not remove the subject owner.')
+            self.storage.remove_member(subject_id, username, 'teacher')
             self.SUBJECTS_DATABASE[subject_id].info.teachers.remove(username)
+            self._unindex_member(subject_id, username, 'teacher')
             return Response(status=200)
         except Exception as e:
             self.app.logger.error(e)
@@ -410,9 +697,11 @@ class SubjectService:
         try:
             modifier_username = request.args['username']
             self._check_subject_teacher(modifier_username, subject_id)
-            if username not in self.SUBJECTS_DATABASE[subject_id].students:
+            if username not in self.SUBJECT_STUDENTS[subject_id]:
                 raise Exception('no such student in the subject')
+            self.storage.remove_member(subject_id, username, 'student')
             self.SUBJECTS_DATABASE[subject_id].students.remove(username)
+            self._unindex_member(subject_id, username, 'student')
             return Response(status=200)
         except Exception as e:
             self.app.logger.error(e)
@@ -430,16 +719,19 @@ class SubjectService:
                 solved_at=datetime.utcnow().replace(tzinfo=timezone.utc),
                 answers=answers
             )
-            for test_instance in self.SUBJECTS_DATABASE[subject_id].test_instances:
-                if test_instance.test.info.id == test_id and test_instance.remark == remark:
-                    for attempt in test_instance.solution_attempts:
-                        if attempt.solution_attempt.solved_by == solver:
-                            raise Exception('this student has already submitted the test')
-                    checked_attempt = self._check_attempt(solution_attempt, test_instance.test)
-                    test_instance.solution_attempts.append(checked_attempt)
-                    self.app.logger.debug(test_instance.solution_attempts)
-                    return Response(status=200, response=checked_attempt.model_dump_json())
-            raise Exception('no such test instance in the subject')
+            test_instance = self._get_test_instance(subject_id, test_id, remark)
+            # check, grade and append atomically, so neither a concurrent request of the same
+            # student nor a regrade of the instance can interleave, other instances are not blocked
+            with self.INSTANCE_LOCKS[subject_id][(test_id, remark)]:
+                if solver in self.ATTEMPT_TABLES[subject_id][(test_id, remark)]:
+                    raise Exception('this student has already submitted the test')
+                checked_attempt = self._get_answer_key(subject_id, test_instance).check(solution_attempt)
+                # the storage rejects a duplicate submitted through another worker
+                self.storage.add_attempt(subject_id, test_id, remark, checked_attempt)
+                self._index_attempt(subject_id, (test_id, remark), checked_attempt)
+            self.app.logger.debug(checked_attempt)
+            wire_format = self._wire_format()
+            return respond(encode(checked_attempt, wire_format), wire_format)
         except Exception as e:
             self.app.logger.error(e)
             return Response(status=500, response=json.dumps(["Cannot save the test attempt", str(e)]))
@@ -450,35 +742,10 @@ class SubjectService:
             self._check_subject_teacher(username, subject_id)
             test_id = request.args['test_id']
             remark = request.args['remark']
-            for test_instance in self.SUBJECTS_DATABASE[subject_id].test_instances:
-                if test_instance.test.info.id == test_id and test_instance.remark == remark:
-                    # picked answers for each task
-                    picked = [[] for _ in range(len(test_instance.test.tasks))]
-                    for attempt in test_instance.solution_attempts:
-                        for index, answer in enumerate(attempt.solution_attempt.answers):
-                            picked[index].append(answer)
-                    # task results
-                    attempts_amount = len(test_instance.solution_attempts)
-                    task_results = []
-                    for task_index, task in enumerate(test_instance.test.tasks):
-                        task_results.append([])
-                        if task.type == TaskType.SINGLE_CHOICE:
-                            for option_index in range(len(task.options)):
-                                if attempts_amount > 0:
-                                    task_results[-1].append(picked[task_index].count(option_index) / attempts_amount * 100)
-                                else:
-                                    task_results[-1].append(0)
-                        elif task.type == TaskType.MULTIPLE_CHOICE:
-                            multiple_picked_options = []
-                            for multiple_answer in picked[task_index]:
-                                multiple_picked_options += multiple_answer
-                            for option_index in range(len(task.options)):
-                                if attempts_amount > 0:
-                                    task_results[-1].append(multiple_picked_options.count(option_index) / attempts_amount * 100)
-                                else:
-                                    task_results[-1].append(0)
-                    return Response(status=200, response=json.dumps(task_results))
-            raise Exception('no such test instance in the subject')
+            self._get_test_instance(subject_id, test_id, remark)
+            task_results = self.TEST_AGGREGATES[subject_id][(test_id, remark)].task_results()
+            wire_format = self._wire_format()
+            return respond(encode(task_results, wire_format), wire_format)
         except Exception as e:
             self.app.logger.error(e)
             return Response(status=500, response=json.dumps(["Cannot get the task results", str(e)]))
@@ -489,19 +756,10 @@ class SubjectService:
             self._check_subject_teacher(username, subject_id)
             test_id = request.args['test_id']
             remark = request.args['remark']
-            for test_instance in self.SUBJECTS_DATABASE[subject_id].test_instances:
-                if test_instance.test.info.id == test_id and test_instance.remark == remark:
-                    try:
-                        average_score = sum([attempt.attempt_percents for attempt in test_instance.solution_attempts]) / len(test_instance.solution_attempts)
-                    except:
-                        average_score = 0
-                    summary = TestSummary(
-                        passed=len([attempt for attempt in test_instance.solution_attempts if attempt.passed]),
-                        attempts_count=len(test_instance.solution_attempts),
-                        average=average_score
-                    )
-                    return Response(status=200, response=summary.model_dump_json())
-            raise Exception('no such test instance in the subject')
+            self._get_test_instance(subject_id, test_id, remark)
+            summary = self.TEST_AGGREGATES[subject_id][(test_id, remark)].summary()
+            wire_format = self._wire_format()
+            return respond(encode(summary, wire_format), wire_format)
         except Exception as e:
             self.app.logger.error(e)
             return Response(status=500, response=json.dumps(["Cannot retrieve the test summary", str(e)]))
@@ -512,14 +770,152 @@ class SubjectService:
             self._check_subject_teacher(username, subject_id)
             test_id = request.args['test_id']
             remark = request.args['remark']
-            for test_instance in self.SUBJECTS_DATABASE[subject_id].test_instances:
-                if test_instance.test.info.id == test_id and test_instance.remark == remark:
-                    return Response(status=200, response=json.dumps([CheckedAttempt.model_dump_json(attempt) for attempt in test_instance.solution_attempts]))
-            raise Exception('no such test instance in the subject')
+            self._get_test_instance(subject_id, test_id, remark)
+            attempts = self.ATTEMPT_TABLES[subject_id][(test_id, remark)].attempts()
+            wire_format = self._wire_format()
+            return respond(encode_list(attempts, wire_format, CHECKED_ATTEMPT_LIST), wire_format)
         except Exception as e:
             self.app.logger.error(e)
             return Response(status=500, response=json.dumps(["Cannot retrieve the student result", str(e)]))
 
+    def _get_test_analytics(self, subject_id : str):
+        try:
+            username = request.args['username']
+            self._check_subject_teacher(username, subject_id)
+            test_id = request.args['test_id']
+            remark = request.args.get('remark')
+            if remark is not None:
+                test_instances = [self._get_test_instance(subject_id, test_id, remark)]
+            else:
+                # all instances of the test that share the task layout of the latest published one
+                test_instances = [test_instance for (instance_test_id, _), test_instance in self.TEST_INSTANCES[subject_id].items()
+                                  if instance_test_id == test_id]
+                if not test_instances:
+                    raise Exception('the test is not published on the subject')
+                latest_instance = max(test_instances, key=lambda test_instance: test_instance.published_at)
+                test_instances = [test_instance for test_instance in test_instances
+                                  if self._same_task_layout(test_instance.test, latest_instance.test)]
+            test = max(test_instances, key=lambda test_instance: test_instance.published_at).test
+            tables = [self.ATTEMPT_TABLES[subject_id][(test_instance.test.info.id, test_instance.remark)] for test_instance in test_instances]
+            wire_format = self._wire_format()
+            return respond(encode(compute_test_analytics(test, tables), wire_format), wire_format)
+        except Exception as e:
+            self.app.logger.error(e)
+            return Response(status=500, response=json.dumps(["Cannot retrieve the test analytics", str(e)]))
+
+    def _regrade(self, subject_id : str):
+        try:
+            username = request.args['username']
+            self._check_subject_teacher(username, subject_id)
+            test_id = json.loads(request.form['test_id'])
+            remark = json.loads(request.form['remark'])
+            corrected_test = Test.model_validate_json(request.form['test'])
+            test_instance = self._get_test_instance(subject_id, test_id, remark)
+            self._check_regrade_test(test_instance.test, corrected_test)
+            answer_key = AnswerKey(corrected_test)
+            wire_format = self._wire_format()
+            status = RegradeStatus(
+                id=uuid.uuid4().hex,
+                subject_id=subject_id,
+                test_id=test_id,
+                remark=remark,
+                state='running',
+                done=0,
+                total=len(self.ATTEMPT_TABLES[subject_id][(test_id, remark)])
+            )
+            self.storage.prune_regrade_statuses(time.time() - self.regrade_status_ttl)
+            self._save_regrade_status(status)
+            if status.total > self.regrade_background_threshold:
+                threading.Thread(target=self._run_regrade,
+                                 args=(status, test_instance, corrected_test, answer_key),
+                                 name=f'regrade-{status.id}',
+                                 daemon=True).start()
+                return respond(encode(status, wire_format), wire_format, status=202)
+            self._run_regrade(status, test_instance, corrected_test, answer_key)
+            if status.state == 'failed':
+                raise Exception(status.error)
+            return respond(encode(status, wire_format), wire_format)
+        except Exception as e:
+            self.app.logger.error(e)
+            return Response(status=500, response=json.dumps(["Cannot regrade the test instance", str(e)]))
+
+    def _get_regrade_status(self, subject_id : str):
+        try:
+            username = request.args['username']
+            self._check_subject_teacher(username, subject_id)
+            wire_format = self._wire_format()
+            status = self.storage.load_regrade_status(request.args['regrade_id'])
+            if status is None or status.subject_id != subject_id:
+                raise Exception('no such regrade in the subject')
+            return respond(encode(status, wire_format), wire_format)
+        except Exception as e:
+            self.app.logger.error(e)
+            return Response(status=500, response=json.dumps(["Cannot retrieve the regrade status", str(e)]))
+
+    def _same_task_layout(self, test : Test, other_test : Test) -> bool:
+        # the answers of both fit the same columns: the same task types with the same number of options
+        return len(test.tasks) == len(other_test.tasks) and all(
+            task.type == other_task.type and len(task.options) == len(other_task.options)
+            for task, other_task in zip(test.tasks, other_test.tasks))
+
+    def _check_regrade_test(self, published_test : Test, corrected_test : Test) -> None:
+        # only the answer key may change, the stored answers have to keep fitting the tasks
+        if corrected_test.info.id != published_test.info.id:
+            raise Exception('the corrected test has another id')
+        if len(corrected_test.tasks) != len(published_test.tasks):
+            raise Exception('the corrected test has another number of tasks')
+        for published_task, corrected_task in zip(published_test.tasks, corrected_test.tasks):
+            if published_task.type != corrected_task.type or len(published_task.options) != len(corrected_task.options):
+                raise Exception('the corrected test has other task types or options')
+
+    def _run_regrade(self, status : RegradeStatus, test_instance : TestInstance, corrected_test : Test, answer_key : AnswerKey) -> None:
+        try:
+            instance_key = (status.test_id, status.remark)
+            attempt_table = self.ATTEMPT_TABLES[status.subject_id][instance_key]
+            # score the attempts known so far in batches, without blocking new submissions
+            known_rows = len(attempt_table)
+            regraded_attempts = []
+            for start in range(0, known_rows, REGRADE_BATCH_SIZE):
+                rows = range(start, min(start + REGRADE_BATCH_SIZE, known_rows))
+                regraded_attempts += answer_key.check_many([attempt_table.solution_attempt(row) for row in rows])
+                status.done = len(regraded_attempts)
+                self._save_regrade_status(status)
+            with self.INSTANCE_LOCKS[status.subject_id][instance_key]:
+                if self.TEST_INSTANCES.get(status.subject_id, dict()).get(instance_key) is not test_instance:
+                    raise Exception('the test instance was changed or removed during the regrade')
+                # attempts submitted while the batches ran
+                late_rows = range(known_rows, len(attempt_table))
+                regraded_attempts += answer_key.check_many([attempt_table.solution_attempt(row) for row in late_rows])
+                self.storage.replace_test_instance(status.subject_id, test_instance.model_copy(update={
+                    'test': corrected_test,
+                    'solution_attempts': regraded_attempts
+                }))
+                # swap the instance content and its statistics at once
+                snapshot = self.TEST_SNAPSHOTS.acquire(corrected_test)
+                snapshot.answer_key = answer_key
+                self.TEST_SNAPSHOTS.release(self.INSTANCE_SNAPSHOTS[status.subject_id][instance_key])
+                self.INSTANCE_SNAPSHOTS[status.subject_id][instance_key] = snapshot
+                test_instance.test = snapshot.test
+                aggregate = TestAggregate(snapshot.test)
+                for attempt in regraded_attempts:
+                    aggregate.add_attempt(attempt)
+                self.ATTEMPT_TABLES[status.subject_id][instance_key] = AttemptTable(snapshot.test, self.usernames, regraded_attempts)
+                self.TEST_AGGREGATES[status.subject_id][instance_key] = aggregate
+                status.done = status.total = len(regraded_attempts)
+                status.state = 'done'
+        except Exception as e:
+            self.app.logger.error(e)
+            status.state = 'failed'
+            status.error = str(e)
+        self._save_regrade_status(status)
+
+    def _save_regrade_status(self, status : RegradeStatus) -> None:
+        try:
+            self.storage.save_regrade_status(status, time.time())
+        except Exception as e:
+            # the regrade itself is stored, only its progress report is lost
+            self.app.logger.error(e)
+
     # prefill database
 
     def _prefill_database(self):
@@ -0,0 +1,484 @@
+import os
+import json
+import uuid
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Iterator, Optional
+
+from global_types.TestTypes import Test
+from subject_service.TestTypes import TestInstance, TestSolutionAttempt, CheckedAttempt, RegradeStatus
+from subject_service.SubjectTypes import SubjectInfo, Subject
+
+
+# changes kept in the log for the workers that have not applied them yet
+CHANGE_LOG_SIZE = 10000
+
+
+class SubjectStorage:
+    # Persistence backend of the SubjectService. The service keeps working on its in-memory
+    # SUBJECTS_DATABASE and writes every mutation through to the storage.
+
+    def is_empty(self) -> bool:
+        raise Exception('Specified only for the derived classes!')
+
+    def load(self) -> tuple[dict, dict]:
+        # subjects with the test instances, the attempts come separately from load_attempts
+        raise Exception('Specified only for the derived classes!')
+
+    def load_attempts(self) -> Iterator[tuple[str, str, str, CheckedAttempt]]:
+        # (subject_id, test_id, remark, attempt) one by one, in the order they were added
+        raise Exception('Specified only for the derived classes!')
+
+    def load_subject(self, subject_id : str) -> Optional[Subject]:
+        # one subject with the attempts in its test instances, None when it was deleted
+        raise Exception('Specified only for the derived classes!')
+
+    def load_attempt(self, subject_id : str, test_id : str, remark : str, solved_by : str) -> Optional[CheckedAttempt]:
+        raise Exception('Specified only for the derived classes!')
+
+    def data_version(self) -> int:
+        raise Exception('Specified only for the derived classes!')
+
+    def last_change(self) -> int:
+        # position in the change log, read before a full load
+        raise Exception('Specified only for the derived classes!')
+
+    def changes_since(self, position : int) -> Optional[tuple[int, list[tuple]]]:
+        # (new position, [(subject_id, test_id, remark, solved_by)]) committed by the other workers,
+        # test_id is None when the whole subject changed. None when the log no longer reaches back to the position.
+        raise Exception('Specified only for the derived classes!')
+
+    def migrate(self, subjects : dict, id_counters : dict) -> None:
+        raise Exception('Specified only for the derived classes!')
+
+    def next_id_counter(self, username : str, counter : int) -> int:
+        # the next subject number of the user, unique across the workers
+        raise Exception('Specified only for the derived classes!')
+
+    def save_subject(self, subject : Subject) -> None:
+        raise Exception('Specified only for the derived classes!')
+
+    def delete_subject(self, subject_id : str) -> None:
+        raise Exception('Specified only for the derived classes!')
+
+    def add_member(self, subject_id : str, username : str, role : str) -> None:
+        raise Exception('Specified only for the derived classes!')
+
+    def remove_member(self, subject_id : str, username : str, role : str) -> None:
+        raise Exception('Specified only for the derived classes!')
+
+    def add_test_instance(self, subject_id : str, test_instance : TestInstance) -> None:
+        raise Exception('Specified only for the derived classes!')
+
+    def delete_test_instance(self, subject_id : str, test_id : str, remark : str) -> None:
+        raise Exception('Specified only for the derived classes!')
+
+    def replace_test_instance(self, subject_id : str, test_instance : TestInstance) -> None:
+        raise Exception('Specified only for the derived classes!')
+
+    def add_attempt(self, subject_id : str, test_id : str, remark : str, attempt : CheckedAttempt) -> None:
+        raise Exception('Specified only for the derived classes!')
+
+    def save_regrade_status(self, status : RegradeStatus, updated_at : float) -> None:
+        # the progress of a regrade, readable by every worker
+        raise Exception('Specified only for the derived classes!')
+
+    def load_regrade_status(self, regrade_id : str) -> Optional[RegradeStatus]:
+        raise Exception('Specified only for the derived classes!')
+
+    def prune_regrade_statuses(self, updated_before : float) -> None:
+        # a running regrade updates its status after every batch, an older one is finished or its worker stopped
+        raise Exception('Specified only for the derived classes!')
+
+
+class MemorySubjectStorage(SubjectStorage):
+    # no persistence, the data lives only in the service memory (prefilled on every start)
+
+    def __init__(self):
+        # regrade_id: (RegradeStatus, updated_at)
+        self.regrade_statuses = dict()
+        self._lock = threading.Lock()
+
+    def is_empty(self) -> bool:
+        return True
+
+    def load(self) -> tuple[dict, dict]:
+        return dict(), dict()
+
+    def load_attempts(self) -> Iterator[tuple[str, str, str, CheckedAttempt]]:
+        return iter(())
+
+    def load_subject(self, subject_id : str) -> Optional[Subject]:
+        return None
+
+    def load_attempt(self, subject_id : str, test_id : str, remark : str, solved_by : str) -> Optional[CheckedAttempt]:
+        return None
+
+    def data_version(self) -> int:
+        return 0
+
+    def last_change(self) -> int:
+        return 0
+
+    def changes_since(self, position : int) -> Optional[tuple[int, list[tuple]]]:
+        return position, []
+
+    def migrate(self, subjects : dict, id_counters : dict) -> None:
+        pass
+
+    def next_id_counter(self, username : str, counter : int) -> int:
+        return counter + 1
+
+    def save_subject(self, subject : Subject) -> None:
+        pass
+
+    def delete_subject(self, subject_id : str) -> None:
+        pass
+
+    def add_member(self, subject_id : str, username : str, role : str) -> None:
+        pass
+
+    def remove_member(self, subject_id : str, username : str, role : str) -> None:
+        pass
+
+    def add_test_instance(self, subject_id : str, test_instance : TestInstance) -> None:
+        pass
+
+    def delete_test_instance(self, subject_id : str, test_id : str, remark : str) -> None:
+        pass
+
+    def replace_test_instance(self, subject_id : str, test_instance : TestInstance) -> None:
+        pass
+
+    def add_attempt(self, subject_id : str, test_id : str, remark : str, attempt : CheckedAttempt) -> None:
+        pass
+
+    def save_regrade_status(self, status : RegradeStatus, updated_at : float) -> None:
+        # a copy, like a stored row it does not follow the later changes of the job
+        self.regrade_statuses[status.id] = (status.model_copy(), updated_at)
+
+    def load_regrade_status(self, regrade_id : str) -> Optional[RegradeStatus]:
+        entry = self.regrade_statuses.get(regrade_id)
+        return entry[0].model_copy() if entry is not None else None
+
+    def prune_regrade_statuses(self, updated_before : float) -> None:
+        with self._lock:
+            for regrade_id, (_, updated_at) in list(self.regrade_statuses.items()):
+                if updated_at < updated_before:
+                    self.regrade_statuses.pop(regrade_id, None)
+
+
+class SQLiteSubjectStorage(SubjectStorage):
+    # embedded SQLite database with normalized tables, shared by all workers of the service.
+    # Every write also logs the changed subject (or attempt), so the other workers apply only the changes.
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS subjects (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            description TEXT NOT NULL,
+            owner TEXT NOT NULL,
+            student_access_code TEXT NOT NULL,
+            teacher_access_code TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS subject_members (
+            subject_id TEXT NOT NULL REFERENCES subjects(id) ON DELETE CASCADE,
+            username TEXT NOT NULL,
+            role TEXT NOT NULL,
+            PRIMARY KEY (subject_id, role, username)
+        );
+        CREATE INDEX IF NOT EXISTS subject_members_username ON subject_members (username);
+        CREATE TABLE IF NOT EXISTS test_instances (
+            subject_id TEXT NOT NULL REFERENCES subjects(id) ON DELETE CASCADE,
+            test_id TEXT NOT NULL,
+            remark TEXT NOT NULL,
+            test TEXT NOT NULL,
+            published_at TEXT NOT NULL,
+            published_by TEXT NOT NULL,
+            PRIMARY KEY (subject_id, test_id, remark)
+        );
+        CREATE TABLE IF NOT EXISTS checked_attempts (
+            subject_id TEXT NOT NULL,
+            test_id TEXT NOT NULL,
+            remark TEXT NOT NULL,
+            solved_by TEXT NOT NULL,
+            solved_at TEXT NOT NULL,
+            answers TEXT NOT NULL,
+            task_points TEXT NOT NULL,
+            attempt_points REAL NOT NULL,
+            overall_points INTEGER NOT NULL,
+            attempt_percents REAL NOT NULL,
+            passed INTEGER NOT NULL,
+            UNIQUE (subject_id, test_id, remark, solved_by),
+            FOREIGN KEY (subject_id, test_id, remark)
+                REFERENCES test_instances(subject_id, test_id, remark) ON DELETE CASCADE
+        );
+        CREATE INDEX IF NOT EXISTS checked_attempts_solved_by ON checked_attempts (solved_by);
+        CREATE TABLE IF NOT EXISTS subject_id_counters (
+            username TEXT PRIMARY KEY,
+            counter INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS subject_changes (
+            position INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin TEXT NOT NULL,
+            subject_id TEXT NOT NULL,
+            test_id TEXT,
+            remark TEXT,
+            solved_by TEXT
+        );
+        CREATE TABLE IF NOT EXISTS regrade_statuses (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    """
+    ATTEMPT_SELECT = ('SELECT subject_id, test_id, remark, solved_by, solved_at, answers, task_points, attempt_points, '
+                      'overall_points, attempt_percents, passed FROM checked_attempts')
+
+    def __init__(self, path : str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # the changes of this worker are not applied again
+        self.origin = uuid.uuid4().hex
+        # one connection per process: PRAGMA data_version then only changes on commits of other workers
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.RLock()
+        with self._lock:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute('PRAGMA foreign_keys=ON')
+            self._connection.executescript(self.SCHEMA)
+
+    def _transaction(self, statements : list[tuple[str, tuple]], query : Optional[tuple[str, tuple]] = None) -> Optional[tuple]:
+        # the optional query reads its row inside of the same transaction
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                for sql, params in statements:
+                    cursor.execute(sql, params)
+                row = cursor.execute(*query).fetchone() if query is not None else None
+                cursor.execute('COMMIT')
+                return row
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+
+    def _snapshot(self, read):
+        # several selects that see the same committed state
+        with self._lock:
+            self._connection.execute('BEGIN')
+            try:
+                return read()
+            finally:
+                self._connection.execute('COMMIT')
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM subjects').fetchone()[0] == 0 \
+                and self._connection.execute('SELECT COUNT(*) FROM subject_id_counters').fetchone()[0] == 0
+
+    def data_version(self) -> int:
+        with self._lock:
+            return self._connection.execute('PRAGMA data_version').fetchone()[0]
+
+    def last_change(self) -> int:
+        with self._lock:
+            return self._connection.execute('SELECT COALESCE(MAX(position), 0) FROM subject_changes').fetchone()[0]
+
+    def changes_since(self, position : int) -> Optional[tuple[int, list[tuple]]]:
+        def read():
+            first, last = self._connection.execute('SELECT MIN(position), COALESCE(MAX(position), 0) FROM subject_changes').fetchone()
+            if first is not None and first > position + 1:
+                return None
+            return last, self._connection.execute(
+                'SELECT subject_id, test_id, remark, solved_by FROM subject_changes WHERE position > ? AND origin != ? ORDER BY position',
+                (position, self.origin)).fetchall()
+        return self._snapshot(read)
+
+    def load(self) -> tuple[dict, dict]:
+        with self._lock:
+            subjects = self._load_subjects()
+            id_counters = dict(self._connection.execute('SELECT username, counter FROM subject_id_counters'))
+            return subjects, id_counters
+
+    def load_subject(self, subject_id : str) -> Optional[Subject]:
+        def read():
+            subject = self._load_subjects(subject_id).get(subject_id)
+            if subject is not None:
+                test_instances = {(test_instance.test.info.id, test_instance.remark): test_instance
+                                  for test_instance in subject.test_instances}
+                for row in self._connection.execute(self.ATTEMPT_SELECT + ' WHERE subject_id = ? ORDER BY rowid', (subject_id,)):
+                    test_instances[(row[1], row[2])].solution_attempts.append(self._attempt_of(row))
+            return subject
+        return self._snapshot(read)
+
+    def _load_subjects(self, only_subject_id : Optional[str] = None) -> dict:
+        subject_filter, member_filter, params = ('', '', ()) if only_subject_id is None \
+            else (' WHERE id = ?', ' WHERE subject_id = ?', (only_subject_id,))
+        subjects = dict()
+        for row in self._connection.execute('SELECT id, name, description, owner, student_access_code, teacher_access_code FROM subjects'
+                                            + subject_filter + ' ORDER BY rowid', params):
+            subjects[row[0]] = Subject.model_construct(
+                info=SubjectInfo.model_construct(id=row[0], name=row[1], description=row[2], owner=row[3], teachers=[]),
+                student_access_code=row[4],
+                teacher_access_code=row[5],
+                students=[],
+                test_instances=[]
+            )
+        for subject_id, username, role in self._connection.execute('SELECT subject_id, username, role FROM subject_members'
+                                                                   + member_filter + ' ORDER BY rowid', params):
+            if role == 'teacher':
+                subjects[subject_id].info.teachers.append(username)
+            else:
+                subjects[subject_id].students.append(username)
+        # test json: Test, a test published on several instances is parsed once
+        tests = dict()
+        for subject_id, remark, test, published_at, published_by in self._connection.execute(
+                'SELECT subject_id, remark, test, published_at, published_by FROM test_instances' + member_filter + ' ORDER BY rowid', params):
+            if test not in tests:
+                tests[test] = Test.model_validate_json(test)
+            subjects[subject_id].test_instances.append(TestInstance.model_construct(
+                test=tests[test],
+                remark=remark,
+                published_at=datetime.fromisoformat(published_at),
+                published_by=published_by,
+                solution_attempts=[]
+            ))
+        return subjects
+
+    def load_attempts(self) -> Iterator[tuple[str, str, str, CheckedAttempt]]:
+        # one attempt object at a time, the caller packs it before the next row is read
+        with self._lock:
+            for row in self._connection.execute(self.ATTEMPT_SELECT + ' ORDER BY rowid'):
+                yield row[0], row[1], row[2], self._attempt_of(row)
+
+    def load_attempt(self, subject_id : str, test_id : str, remark : str, solved_by : str) -> Optional[CheckedAttempt]:
+        with self._lock:
+            row = self._connection.execute(self.ATTEMPT_SELECT + ' WHERE subject_id = ? AND test_id = ? AND remark = ? AND solved_by = ?',
+                                           (subject_id, test_id, remark, solved_by)).fetchone()
+        return self._attempt_of(row) if row is not None else None
+
+    def _attempt_of(self, row : tuple) -> CheckedAttempt:
+        return CheckedAttempt.model_construct(
+            solution_attempt=TestSolutionAttempt.model_construct(
+                solved_by=row[3],
+                solved_at=datetime.fromisoformat(row[4]),
+                answers=json.loads(row[5])
+            ),
+            task_points=json.loads(row[6]),
+            attempt_points=row[7],
+            overall_points=row[8],
+            attempt_percents=row[9],
+            passed=bool(row[10])
+        )
+
+    def migrate(self, subjects : dict, id_counters : dict) -> None:
+        # import the dict based data (e.g. the prefilled database) into an empty storage
+        statements = []
+        for subject in subjects.values():
+            statements += self._subject_statements(subject)
+        for username, counter in id_counters.items():
+            statements.append(('INSERT INTO subject_id_counters (username, counter) VALUES (?, ?) '
+                               'ON CONFLICT (username) DO UPDATE SET counter = excluded.counter', (username, counter)))
+        self._transaction(statements)
+
+    def next_id_counter(self, username : str, counter : int) -> int:
+        # the counter of another worker may be ahead of the one passed
+        return self._transaction([('INSERT INTO subject_id_counters (username, counter) VALUES (?, ? + 1) '
+                                   'ON CONFLICT (username) DO UPDATE SET counter = MAX(counter, excluded.counter - 1) + 1',
+                                   (username, counter))],
+                                 query=('SELECT counter FROM subject_id_counters WHERE username = ?', (username,)))[0]
+
+    def save_subject(self, subject : Subject) -> None:
+        self._transaction([('DELETE FROM subjects WHERE id = ?', (subject.info.id,))] + self._subject_statements(subject)
+                          + self._change_statements(subject.info.id))
+
+    def delete_subject(self, subject_id : str) -> None:
+        self._transaction([('DELETE FROM subjects WHERE id = ?', (subject_id,))] + self._change_statements(subject_id))
+
+    def add_member(self, subject_id : str, username : str, role : str) -> None:
+        self._transaction([('INSERT INTO subject_members (subject_id, username, role) VALUES (?, ?, ?)',
+                            (subject_id, username, role))] + self._change_statements(subject_id))
+
+    def remove_member(self, subject_id : str, username : str, role : str) -> None:
+        self._transaction([('DELETE FROM subject_members WHERE subject_id = ? AND username = ? AND role = ?',
+                            (subject_id, username, role))] + self._change_statements(subject_id))
+
+    def add_test_instance(self, subject_id : str, test_instance : TestInstance) -> None:
+        self._transaction(self._test_instance_statements(subject_id, test_instance) + self._change_statements(subject_id))
+
+    def delete_test_instance(self, subject_id : str, test_id : str, remark : str) -> None:
+        self._transaction([('DELETE FROM test_instances WHERE subject_id = ? AND test_id = ? AND remark = ?',
+                            (subject_id, test_id, remark))] + self._change_statements(subject_id))
+
+    def replace_test_instance(self, subject_id : str, test_instance : TestInstance) -> None:
+        self._transaction([('DELETE FROM test_instances WHERE subject_id = ? AND test_id = ? AND remark = ?',
+                            (subject_id, test_instance.test.info.id, test_instance.remark))]
+                          + self._test_instance_statements(subject_id, test_instance)
+                          + self._change_statements(subject_id))
+
+    def add_attempt(self, subject_id : str, test_id : str, remark : str, attempt : CheckedAttempt) -> None:
+        self._transaction([self._attempt_statement(subject_id, test_id, remark, attempt)]
+                          + self._change_statements(subject_id, test_id, remark, attempt.solution_attempt.solved_by))
+
+    def save_regrade_status(self, status : RegradeStatus, updated_at : float) -> None:
+        # not logged as a change, the statuses are read from the storage on every request
+        self._transaction([('INSERT INTO regrade_statuses (id, status, updated_at) VALUES (?, ?, ?) '
+                            'ON CONFLICT (id) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at',
+                            (status.id, status.model_dump_json(), updated_at))])
+
+    def load_regrade_status(self, regrade_id : str) -> Optional[RegradeStatus]:
+        with self._lock:
+            row = self._connection.execute('SELECT status FROM regrade_statuses WHERE id = ?', (regrade_id,)).fetchone()
+        return RegradeStatus.model_validate_json(row[0]) if row is not None else None
+
+    def prune_regrade_statuses(self, updated_before : float) -> None:
+        self._transaction([('DELETE FROM regrade_statuses WHERE updated_at < ?', (updated_before,))])
+
+    # statements
+
+    def _change_statements(self, subject_id : str, test_id : Optional[str] = None, remark : Optional[str] = None,
+                           solved_by : Optional[str] = None) -> list[tuple[str, tuple]]:
+        return [('INSERT INTO subject_changes (origin, subject_id, test_id, remark, solved_by) VALUES (?, ?, ?, ?, ?)',
+                 (self.origin, subject_id, test_id, remark, solved_by)),
+                ('DELETE FROM subject_changes WHERE position <= last_insert_rowid() - ?', (CHANGE_LOG_SIZE,))]
+
+    def _subject_statements(self, subject : Subject) -> list[tuple[str, tuple]]:
+        statements = [('INSERT INTO subjects (id, name, description, owner, student_access_code, teacher_access_code) '
+                       'VALUES (?, ?, ?, ?, ?, ?)',
+                       (subject.info.id, subject.info.name, subject.info.description, subject.info.owner,
+                        subject.student_access_code, subject.teacher_access_code))]
+        for teacher in subject.info.teachers:
+            statements.append(('INSERT OR IGNORE INTO subject_members (subject_id, username, role) VALUES (?, ?, ?)',
+                               (subject.info.id, teacher, 'teacher')))
+        for student in subject.students:
+            statements.append(('INSERT OR IGNORE INTO subject_members (subject_id, username, role) VALUES (?, ?, ?)',
+                               (subject.info.id, student, 'student')))
+        for test_instance in subject.test_instances:
+            statements += self._test_instance_statements(subject.info.id, test_instance)
+        return statements
+
+    def _test_instance_statements(self, subject_id : str, test_instance : TestInstance) -> list[tuple[str, tuple]]:
+        test_id = test_instance.test.info.id
+        statements = [('INSERT INTO test_instances (subject_id, test_id, remark, test, published_at, published_by) '
+                       'VALUES (?, ?, ?, ?, ?, ?)',
+                       (subject_id, test_id, test_instance.remark, test_instance.test.model_dump_json(),
+                        test_instance.published_at.isoformat(), test_instance.published_by))]
+        for attempt in test_instance.solution_attempts:
+            statements.append(self._attempt_statement(subject_id, test_id, test_instance.remark, attempt))
+        return statements
+
+    def _attempt_statement(self, subject_id : str, test_id : str, remark : str, attempt : CheckedAttempt) -> tuple[str, tuple]:
+        return ('INSERT INTO checked_attempts (subject_id, test_id, remark, solved_by, solved_at, answers, task_points, '
+                'attempt_points, overall_points, attempt_percents, passed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (subject_id, test_id, remark,
+                 attempt.solution_attempt.solved_by,
+                 attempt.solution_attempt.solved_at.isoformat(),
+                 json.dumps(attempt.solution_attempt.answers),
+                 json.dumps(attempt.task_points),
+                 attempt.attempt_points,
+                 attempt.overall_points,
+                 attempt.attempt_percents,
+                 int(attempt.passed)))
@@ -0,0 +1,38 @@
+from global_types.TaskTypes import TaskType
+from global_types.TestTypes import Test
+from subject_service.AnswerKey import picked_options
+from subject_service.TestTypes import CheckedAttempt, TestSummary
+
+
+class TestAggregate:
+    # running statistics of one TestInstance, updated in O(tasks) per checked attempt
+
+    def __init__(self, test : Test):
+        self.multiple_choice = [task.type == TaskType.MULTIPLE_CHOICE for task in test.tasks]
+        self.attempts_count = 0
+        self.passed_count = 0
+        self.percents_sum = 0
+        # task_index: [number of picks per option]
+        self.option_picks = [[0] * len(task.options) for task in test.tasks]
+
+    def add_attempt(self, attempt : CheckedAttempt) -> None:
+        self.attempts_count += 1
+        self.passed_count += int(attempt.passed)
+        self.percents_sum += attempt.attempt_percents
+        for task_index, answer in enumerate(attempt.solution_attempt.answers[:len(self.multiple_choice)]):
+            picks = self.option_picks[task_index]
+            for option in picked_options(answer, self.multiple_choice[task_index], len(picks)):
+                picks[option] += 1
+
+    def summary(self) -> TestSummary:
+        return TestSummary(
+            passed=self.passed_count,
+            attempts_count=self.attempts_count,
+            average=self.percents_sum / self.attempts_count if self.attempts_count > 0 else 0
+        )
+
+    def task_results(self) -> list[list[float]]:
+        # percentage of the attempts that picked each option of each task
+        if self.attempts_count == 0:
+            return [[0] * len(picks) for picks in self.option_picks]
+        return [[count / self.attempts_count * 100 for count in picks] for picks in self.option_picks]
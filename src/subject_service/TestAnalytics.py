@@ -0,0 +1,114 @@
+import numpy as np
+
+from global_types.TaskTypes import TaskType
+from global_types.TestTypes import Test
+from subject_service.TestTypes import TaskAnalytics, TestAnalytics
+from subject_service.AnswerKey import picked_options
+from subject_service.AttemptTable import AttemptTable, MASK_BITS
+
+
+HISTOGRAM_BINS = 10
+PERCENTILES = [10, 25, 50, 75, 90]
+# share of the best / worst attempts compared by the discrimination index
+DISCRIMINATION_GROUP = 0.27
+
+
+def pack_points(test : Test, tables : list[AttemptTable], rows_counts : list[int]) -> np.ndarray:
+    # attempts x tasks matrix of the achieved points, straight from the point columns
+    tasks_count = len(test.tasks)
+    matrices = []
+    for table, rows in zip(tables, rows_counts):
+        # slicing copies the column, a buffer exported from the table itself would block its appends
+        points = np.frombuffer(table.task_points[:rows * table.tasks_count], dtype=np.float64)
+        points = points.reshape(rows, table.tasks_count)[:, :tasks_count].copy()
+        for row, (_, task_points) in list(table.irregular.items()):
+            if row < rows:
+                task_points = task_points[:tasks_count]
+                points[row, :len(task_points)] = task_points
+        matrices.append(points)
+    if not matrices:
+        return np.zeros((0, tasks_count), dtype=np.float64)
+    return np.vstack(matrices)
+
+
+def pack_option_picks(test : Test, tables : list[AttemptTable], rows_counts : list[int]) -> list[np.ndarray]:
+    # for each task an attempts x options bitmap of the picked options
+    bitmaps = [[] for _ in test.tasks]
+    for table, rows in zip(tables, rows_counts):
+        answers = np.frombuffer(table.answers[:rows * table.tasks_count], dtype=np.int64).reshape(rows, table.tasks_count)
+        irregular = list(table.irregular.items())
+        for task_index, task in enumerate(test.tasks):
+            options = np.arange(len(task.options))
+            if task.type == TaskType.MULTIPLE_CHOICE:
+                # bit i of the mask: option i picked, options past the mask are never packed
+                shifts = np.minimum(options, MASK_BITS)
+                bitmap = (answers[:, task_index, None] >> shifts & 1).astype(np.bool_) & (options < MASK_BITS)
+            else:
+                bitmap = answers[:, task_index, None] == options
+            for row, (row_answers, _) in irregular:
+                if row < rows:
+                    bitmap[row] = _irregular_picks(task, row_answers[task_index] if task_index < len(row_answers) else None)
+            bitmaps[task_index].append(bitmap)
+    return [np.vstack(task_bitmaps) if task_bitmaps else np.zeros((0, len(task.options)), dtype=np.bool_)
+            for task, task_bitmaps in zip(test.tasks, bitmaps)]
+
+
+def _irregular_picks(task, answer) -> np.ndarray:
+    picks = np.zeros(len(task.options), dtype=np.bool_)
+    picks[list(picked_options(answer, task.type == TaskType.MULTIPLE_CHOICE, len(picks)))] = True
+    return picks
+
+
+def compute_test_analytics(test : Test, tables : list[AttemptTable]) -> TestAnalytics:
+    # the tables may grow meanwhile, so only the rows present now are analysed
+    rows_counts = [len(table) for table in tables]
+    attempts_count = sum(rows_counts)
+    max_points = np.array([task.points for task in test.tasks], dtype=np.float64)
+    points = pack_points(test, tables, rows_counts)
+    percents = np.concatenate([np.frombuffer(table.attempt_percents[:rows], dtype=np.float64)
+                               for table, rows in zip(tables, rows_counts)] + [np.zeros(0)])
+    bitmaps = pack_option_picks(test, tables, rows_counts)
+
+    if attempts_count == 0:
+        return TestAnalytics(
+            attempts_count=0,
+            histogram=[0] * HISTOGRAM_BINS,
+            percentiles={str(percentile): 0 for percentile in PERCENTILES},
+            tasks=[TaskAnalytics(difficulty=0, discrimination=0, option_picks=[0] * len(task.options)) for task in test.tasks],
+            tags={task.tag: 0 for task in test.tasks}
+        )
+
+    histogram, _ = np.histogram(np.clip(percents, 0, 100), bins=HISTOGRAM_BINS, range=(0, 100))
+    percentile_values = np.percentile(percents, PERCENTILES)
+
+    # difficulty: mean share of the task points the students achieved
+    mean_points = points.mean(axis=0)
+    difficulty = np.divide(mean_points, max_points, out=np.zeros_like(mean_points), where=max_points > 0)
+
+    # discrimination: difference of the difficulty between the best and the worst group of attempts
+    group_size = max(1, int(round(attempts_count * DISCRIMINATION_GROUP)))
+    order = np.argsort(points.sum(axis=1), kind='stable')
+    upper_points = points[order[-group_size:]].mean(axis=0)
+    lower_points = points[order[:group_size]].mean(axis=0)
+    discrimination = np.divide(upper_points - lower_points, max_points, out=np.zeros_like(mean_points), where=max_points > 0)
+
+    # achieved share of the points per task tag
+    tags = dict()
+    task_tags = np.array([task.tag for task in test.tasks], dtype=object)
+    achieved_per_task = points.sum(axis=0)
+    for tag in dict.fromkeys(task.tag for task in test.tasks):
+        mask = task_tags == tag
+        tag_max_points = max_points[mask].sum() * attempts_count
+        tags[tag] = float(achieved_per_task[mask].sum() / tag_max_points * 100) if tag_max_points > 0 else 0
+
+    return TestAnalytics(
+        attempts_count=attempts_count,
+        histogram=histogram.tolist(),
+        percentiles={str(percentile): float(value) for percentile, value in zip(PERCENTILES, percentile_values)},
+        tasks=[TaskAnalytics(
+                difficulty=float(difficulty[task_index]),
+                discrimination=float(discrimination[task_index]),
+                option_picks=(bitmaps[task_index].mean(axis=0) * 100).tolist()
+            ) for task_index in range(len(test.tasks))],
+        tags=tags
+    )
@@ -0,0 +1,47 @@
+import hashlib
+import threading
+from typing import Optional
+
+from global_types.TestTypes import Test
+from subject_service.AnswerKey import AnswerKey
+
+
+class TestSnapshot:
+    # one published test content, shared by all test instances that published the same content
+    __slots__ = ('hash', 'test', 'student_view', 'answer_key', 'references')
+
+    def __init__(self, content_hash : str, test : Test):
+        self.hash = content_hash
+        self.test = test
+        # the test without the answers, what the students get to see
+        self.student_view = test.model_copy(update={'tasks': [task.without_answer() for task in test.tasks]})
+        # compiled on publish or on first use
+        self.answer_key : Optional[AnswerKey] = None
+        self.references = 0
+
+
+class TestSnapshots:
+    # content addressed store of the published tests, the instances hold a reference to a snapshot
+
+    def __init__(self):
+        # sha256 of the test json: TestSnapshot
+        self._snapshots = dict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    def acquire(self, test : Test) -> TestSnapshot:
+        content_hash = hashlib.sha256(test.model_dump_json().encode()).hexdigest()
+        with self._lock:
+            snapshot = self._snapshots.get(content_hash)
+            if snapshot is None:
+                snapshot = self._snapshots[content_hash] = TestSnapshot(content_hash, test)
+            snapshot.references += 1
+            return snapshot
+
+    def release(self, snapshot : TestSnapshot) -> None:
+        with self._lock:
+            snapshot.references -= 1
+            if snapshot.references == 0:
+                del self._snapshots[snapshot.hash]
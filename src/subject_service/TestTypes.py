@@ -1,21 +1,9 @@
 from datetime import datetime
 
-from typing import Any
-from pydantic import BaseModel
+from typing import Any, Optional
+from pydantic import BaseModel, TypeAdapter
 
-from subject_service.TaskTypes import Task
-
-
-class TestInfo(BaseModel):
-    id: str
-    name: str
-    description: str
-
-
-class Test(BaseModel):
-    info: TestInfo
-    tasks: list[Task]
-    pass_percents: float
+from global_types.TestTypes import Test
 
 
 class TestSolutionAttempt(BaseModel):
@@ -43,4 +31,28 @@ class TestSummary(BaseModel):
     attempts_count: int
     average: float
 
+class TaskAnalytics(BaseModel):
+    difficulty: float  # mean share of the task points
+    discrimination: float  # difficulty of the best minus the worst attempts
+    option_picks: list[float]  # percent of the attempts that picked each option
+
+class TestAnalytics(BaseModel):
+    attempts_count: int
+    histogram: list[int]  # attempt percents in bins of 10 percent
+    percentiles: dict[str, float]
+    tasks: list[TaskAnalytics]
+    tags: dict[str, float]  # achieved percent of the points per task tag
+
+class RegradeStatus(BaseModel):
+    id: str
+    subject_id: str
+    test_id: str
+    remark: str
+    state: str  # running | done | failed
+    done: int
+    total: int
+    error: Optional[str] = None
+
 
+# built once, serializer of the attempt lists of the results endpoints
+CHECKED_ATTEMPT_LIST = TypeAdapter(list[CheckedAttempt])
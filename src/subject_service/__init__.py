@@ -13,10 +13,24 @@ if service_api_host == None:
     service_api_host = 'gateway_api'
 service_api_url = f'https://{service_api_host}:{service_api_port}'
 
+# direct channel to the TestService, without TEST_SERVICE_PORT the tests are fetched through the gateway
+test_service_host = os.getenv('TEST_SERVICE_HOST')
+test_service_port = os.getenv('TEST_SERVICE_PORT')
+if test_service_host == None:
+    test_service_host = 'test_service'
+test_service_url = f'https://{test_service_host}:{test_service_port}' if test_service_port else None
+
 
 app = Flask('SubjectService')
 app.config["SERVICE_SECRET"] = os.getenv('SERVICE_SECRET')
+app.config["LEGACY_JSON_LISTS"] = os.getenv('LEGACY_JSON_LISTS', 'true').lower() == 'true'
 app.config["SERVICE_API_SECRET"] = os.getenv('SERVICE_API_SECRET')
+app.config["TEST_SERVICE_URL"] = test_service_url
+app.config["TEST_SERVICE_SECRET"] = os.getenv('TEST_SERVICE_SECRET')
+app.config["SUBJECT_STORAGE"] = os.getenv('SUBJECT_STORAGE', 'memory')
+app.config["SUBJECT_DATABASE_PATH"] = os.getenv('SUBJECT_DATABASE_PATH', 'data/subjects.db')
+app.config["REGRADE_BACKGROUND_THRESHOLD"] = int(os.getenv('REGRADE_BACKGROUND_THRESHOLD', 500))
+app.config["REGRADE_STATUS_TTL"] = int(os.getenv('REGRADE_STATUS_TTL', 3600))
 subject_service = SubjectService(app, service_api_url)
 
 
@@ -4,8 +4,12 @@ from typing import Optional
 from flask_cors import CORS
 from flask import Flask, Response, request
 
-from test_service.TaskTypes import TaskType, SingleChoiceTask, MultipleChoiceTask
-from test_service.TestTypes import Test, TestInfo
+from global_types.TaskTypes import TaskType, SingleChoiceTask, MultipleChoiceTask
+from global_types.TestTypes import Test, TestInfo
+from test_service.TestTypes import StoredTest
+from test_service.TestStorage import TestStorage, MemoryTestStorage, SQLiteTestStorage
+from global_types.JsonFragments import JsonFragments
+from global_types.WireFormat import MSGPACK, negotiate, encode, encode_map, respond
 
 
 class TestService:
@@ -15,6 +19,10 @@ class TestService:
         self.service_api_url = service_api_url
         # restrictions
         self.cors = CORS(self.app)
+        # response encoding
+        self.legacy_json_lists = self.app.config.get('LEGACY_JSON_LISTS', True)
+        # test_id: serialized TestInfo
+        self.test_info_json = JsonFragments()
         # endpoints
         self._register_routes()
         # init database
@@ -39,47 +47,108 @@ class TestService:
         # check service secret
         if request.headers.get('ServiceSecret') != self.app.config["SERVICE_SECRET"]:
             return Response(status=500, response=json.dumps(["Cannot access TestService", "only GatewayAPI may access TestService"]))
+        # pick up the changes other workers committed to the storage
+        self._sync_database()
 
     def _init_database(self):
-        # Data-structures that simulate a service database
+        # In-memory test infos with their versions, every mutation is written through to the storage
         self.TESTS_DATABASE = dict()
         self.ID_DATABASE = dict()
-        # fill database with some entities for testing
-        self._prefill_database() 
+        self.storage = self._create_storage()
+        if self.storage.is_empty():
+            # fill database with some entities for testing
+            self._prefill_database()
+            try:
+                self.storage.migrate(self.TESTS_DATABASE, self.ID_DATABASE)
+            except Exception:
+                # another worker has migrated the data in the meantime
+                pass
+        self._storage_version = self.storage.data_version()
+        self._load_database()
+
+    def _create_storage(self) -> TestStorage:
+        storage = self.app.config.get('TEST_STORAGE', 'memory')
+        if storage == 'memory':
+            return MemoryTestStorage()
+        if storage == 'sqlite':
+            return SQLiteTestStorage(self.app.config.get('TEST_DATABASE_PATH', 'data/tests.db'))
+        raise Exception(f'unknown test storage: {storage}')
+
+    def _sync_database(self):
+        storage_version = self.storage.data_version()
+        if storage_version != self._storage_version:
+            self._storage_version = storage_version
+            self._load_database()
+
+    def _load_database(self):
+        self.TESTS_DATABASE, self.ID_DATABASE = self.storage.load()
+        self._rebuild_indexes()
+
+    ### indexes
+    def _rebuild_indexes(self):
+        # test_id: owner
+        self.TEST_OWNERS = dict()
+        # test_id: (owner, TestInfo) of all tests in one flat dict, in the order they were created
+        self.ALL_TESTS_INFO = dict()
+        for owner, owner_tests in self.TESTS_DATABASE.items():
+            for test_id, stored_test in owner_tests.items():
+                self.TEST_OWNERS[test_id] = owner
+                self.ALL_TESTS_INFO[test_id] = (owner, stored_test.info)
+
+    def _index_test(self, owner : str, test_id : str, stored_test : StoredTest):
+        if owner not in self.TESTS_DATABASE:
+            self.TESTS_DATABASE[owner] = {}
+        self.TESTS_DATABASE[owner][test_id] = stored_test
+        self.TEST_OWNERS[test_id] = owner
+        self.ALL_TESTS_INFO[test_id] = (owner, stored_test.info)
+        self.test_info_json.invalidate(test_id)
+
+    def _unindex_test(self, test_id : str):
+        owner = self.TEST_OWNERS.pop(test_id)
+        del self.ALL_TESTS_INFO[test_id]
+        del self.TESTS_DATABASE[owner][test_id]
+        self.test_info_json.invalidate(test_id)
 
     
 
     # helper methods
     def _generate_test_id(self, username):
-        if username not in self.ID_DATABASE:
-            self.ID_DATABASE[username] = 0
-        new_id = self.ID_DATABASE[username] = self.ID_DATABASE[username] + 1
+        new_id = self.ID_DATABASE[username] = self.storage.next_id_counter(username, self.ID_DATABASE.get(username, 0))
         return f'{username}_test_{new_id}'
     
+    def _wire_format(self) -> str:
+        return negotiate(request.headers.get('Accept'), self.legacy_json_lists)
+
+    def _etag(self, stored_test : StoredTest) -> str:
+        # the versions start at 1 again with a new storage (the memory storage on every start), the hash tells the contents apart
+        return f'{stored_test.version}-{stored_test.hash}'
+
+    def _respond_test(self, test : Test, stored_test : StoredTest) -> Response:
+        wire_format = self._wire_format()
+        response = respond(encode(test, wire_format), wire_format)
+        response.set_etag(self._etag(stored_test))
+        return response
+
     ### Test service endpoints
 
     def _get_my_tests_info(self):
         try:
             username = request.args['username']
-            test_dict = self.TESTS_DATABASE.get(username)
-            if test_dict is None:
-                return Response(response=json.dumps([]))
-            return Response(response=json.dumps([test.info.model_dump_json() for test in test_dict.values()]))
+            wire_format = self._wire_format()
+            test_dict = self.TESTS_DATABASE.get(username, dict())
+            return respond(self.test_info_json.join(((test_id, test.info) for test_id, test in test_dict.items()), wire_format), wire_format)
         except Exception as e:
             self.app.logger.error(e)
             return Response(status=500, response=json.dumps(["Cannot retrieve my tests info", str(e)]))
         
     def _get_all_tests_info(self):
         try:
-            tests_info = []
-            tests_teachers = []
-            for teacher, teacher_tests in self.TESTS_DATABASE.items():
-                tests_info += [test.info for test in teacher_tests.values()]
-                tests_teachers += [teacher for _ in teacher_tests.values()]
-            return Response(response=json.dumps({
-                    'tests_info': [info.model_dump_json() for info in tests_info],
-                    'tests_teachers': tests_teachers
-                }))
+            wire_format = self._wire_format()
+            all_tests_info = list(self.ALL_TESTS_INFO.items())
+            tests_info = [(test_id, test_info) for test_id, (_, test_info) in all_tests_info]
+            tests_teachers = [owner for _, (owner, _) in all_tests_info]
+            return respond(encode_map({'tests_info': self.test_info_json.join(tests_info, wire_format),
+                                       'tests_teachers': encode(tests_teachers, wire_format)}, wire_format), wire_format)
         except Exception as e:
             self.app.logger.error(e)
             return Response(status=500, response=json.dumps(["Cannot retrieve all tests info", str(e)]))
@@ -94,7 +163,8 @@ class TestService:
             if test_id not in self.TESTS_DATABASE[username]:
                 raise Exception('you do not have this test')
             test_info = self.TESTS_DATABASE[username][test_id].info
-            return Response(response=test_info.model_dump_json())
+            wire_format = self._wire_format()
+            return respond(self.test_info_json.fragment(test_id, test_info, wire_format), wire_format)
         except Exception as e:
             self.app.logger.error(e)
             return Response(status=500, response=json.dumps(["Cannot retrieve the test info", str(e)]))
@@ -111,11 +181,10 @@ class TestService:
                 tasks = [],
                 pass_percents = 50
             )
-            # save the empty test
-            if username not in self.TESTS_DATABASE:
-                self.TESTS_DATABASE[username] = {}
-            self.TESTS_DATABASE[username][empty_test.info.id] = empty_test
-            return Response(response=empty_test.model_dump_json())
+            # save the empty test, a taken id fails instead of overwriting the test of another worker
+            stored_test = self.storage.create_test(username, empty_test.info.id, empty_test)
+            self._index_test(username, empty_test.info.id, stored_test)
+            return self._respond_test(empty_test, stored_test)
         except Exception as e:
             self.app.logger.error(e)
             return Response(status=500, response=json.dumps(["Cannot create an empty test", str(e)]))
@@ -125,8 +194,25 @@ class TestService:
             username = request.args['username']
             if username not in self.TESTS_DATABASE:
                 raise Exception('you do not have any tests')
-            test = Test.model_validate(self.TESTS_DATABASE[username][test_id])
-            return Response(response=test.model_dump_json())
+            stored_test = self.TESTS_DATABASE[username][test_id]
+            etag = self._etag(stored_test)
+            # the caller still has this version, the tasks are not even loaded
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+            wire_format = self._wire_format()
+            if wire_format == MSGPACK:
+                test = self.storage.load_test(test_id)
+                body = encode(test, wire_format) if test is not None else None
+            else:
+                # stored tests are validated on save, their json is answered as it is
+                body = self.storage.load_test_json(test_id)
+            if body is None:
+                raise Exception('the test was deleted')
+            response = respond(body, wire_format)
+            response.set_etag(etag)
+            return response
         except Exception as e:
             self.app.logger.error(e)
             return Response(status=500, response=json.dumps(["Cannot retrieve the test", str(e)]))
@@ -139,7 +225,9 @@ class TestService:
                 self.TESTS_DATABASE[username] = {}
             if test_id not in self.TESTS_DATABASE[username]:
                 raise Exception('you do not have this test')
-            self.TESTS_DATABASE[username][test_id] = test
+            if test.info.id != test_id:
+                raise Exception('the test id does not match')
+            self._index_test(username, test_id, self.storage.save_test(username, test_id, test))
             return Response(status=200)
         except Exception as e:
             self.app.logger.error(e)
@@ -149,17 +237,18 @@ class TestService:
         try:
             username = request.args['username']
             if username in self.admins:
-                for teacher, teacher_tests in self.TESTS_DATABASE.items():
-                    if test_id in teacher_tests:
-                        del self.TESTS_DATABASE[teacher][test_id]
-                        return Response(status=200)
-                raise Exception('test not found')
+                if test_id not in self.TEST_OWNERS:
+                    raise Exception('test not found')
+                self.storage.delete_test(test_id)
+                self._unindex_test(test_id)
+                return Response(status=200)
             # delete the test
             if username not in self.TESTS_DATABASE:
                 self.TESTS_DATABASE[username] = {}
             if test_id not in self.TESTS_DATABASE[username]:
                 raise Exception('you do not have this test')
-            del self.TESTS_DATABASE[username][test_id]
+            self.storage.delete_test(test_id)
+            self._unindex_test(test_id)
             return Response(status=200)
         except Exception as e:
             self.app.logger.error(e)
@@ -0,0 +1,248 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from typing import Optional
+
+from global_types.TestTypes import Test, TestInfo
+from test_service.TestTypes import StoredTest
+
+
+def content_hash_of(test_json : str) -> str:
+    return hashlib.sha256(test_json.encode()).hexdigest()
+
+
+class TestStorage:
+    # Persistence backend of the TestService. The service keeps the test infos with their
+    # versions in memory, the task bodies are only read from the storage on demand.
+
+    def is_empty(self) -> bool:
+        raise Exception('Specified only for the derived classes!')
+
+    def load(self) -> tuple[dict, dict]:
+        # ({owner: {test_id: StoredTest}}, id counters) without the task bodies
+        raise Exception('Specified only for the derived classes!')
+
+    def load_test(self, test_id : str) -> Optional[Test]:
+        raise Exception('Specified only for the derived classes!')
+
+    def load_test_json(self, test_id : str) -> Optional[bytes]:
+        # the stored serialization of the test, answered as it is without a parse
+        raise Exception('Specified only for the derived classes!')
+
+    def data_version(self) -> int:
+        raise Exception('Specified only for the derived classes!')
+
+    def migrate(self, tests : dict, id_counters : dict) -> None:
+        raise Exception('Specified only for the derived classes!')
+
+    def next_id_counter(self, username : str, counter : int) -> int:
+        # the next test number of the user, unique across the workers
+        raise Exception('Specified only for the derived classes!')
+
+    def create_test(self, owner : str, test_id : str, test : Test) -> StoredTest:
+        # a new test, fails when the id is taken instead of overwriting that test
+        raise Exception('Specified only for the derived classes!')
+
+    def save_test(self, owner : str, test_id : str, test : Test) -> StoredTest:
+        # the version is only increased when the content changes, so unchanged saves keep the etag
+        raise Exception('Specified only for the derived classes!')
+
+    def delete_test(self, test_id : str) -> None:
+        raise Exception('Specified only for the derived classes!')
+
+
+class MemoryTestStorage(TestStorage):
+    # no persistence, the tests live in the service process only (prefilled on every start)
+
+    def __init__(self):
+        # test_id: (owner, StoredTest, Test, test json)
+        self._tests = dict()
+        self._id_counters = dict()
+        self._lock = threading.Lock()
+
+    def is_empty(self) -> bool:
+        return not self._tests and not self._id_counters
+
+    def load(self) -> tuple[dict, dict]:
+        with self._lock:
+            tests = dict()
+            for test_id, (owner, stored_test, _, _) in self._tests.items():
+                tests.setdefault(owner, dict())[test_id] = stored_test
+            return tests, dict(self._id_counters)
+
+    def load_test(self, test_id : str) -> Optional[Test]:
+        entry = self._tests.get(test_id)
+        return entry[2] if entry is not None else None
+
+    def load_test_json(self, test_id : str) -> Optional[bytes]:
+        entry = self._tests.get(test_id)
+        return entry[3] if entry is not None else None
+
+    def data_version(self) -> int:
+        return 0
+
+    def migrate(self, tests : dict, id_counters : dict) -> None:
+        for owner, owner_tests in tests.items():
+            for test_id, test in owner_tests.items():
+                self.save_test(owner, test_id, test)
+        self._id_counters.update(id_counters)
+
+    def next_id_counter(self, username : str, counter : int) -> int:
+        with self._lock:
+            counter = self._id_counters[username] = max(self._id_counters.get(username, 0), counter) + 1
+            return counter
+
+    def create_test(self, owner : str, test_id : str, test : Test) -> StoredTest:
+        test_json = test.model_dump_json()
+        with self._lock:
+            if test_id in self._tests:
+                raise Exception('a test with this id already exists')
+            stored_test = StoredTest.model_construct(info=test.info, version=1, hash=content_hash_of(test_json))
+            self._tests[test_id] = (owner, stored_test, test, test_json.encode())
+            return stored_test
+
+    def save_test(self, owner : str, test_id : str, test : Test) -> StoredTest:
+        test_json = test.model_dump_json()
+        content_hash = content_hash_of(test_json)
+        with self._lock:
+            version = 1
+            entry = self._tests.get(test_id)
+            if entry is not None:
+                version = entry[1].version if entry[1].hash == content_hash else entry[1].version + 1
+            stored_test = StoredTest.model_construct(info=test.info, version=version, hash=content_hash)
+            self._tests[test_id] = (owner, stored_test, test, test_json.encode())
+            return stored_test
+
+    def delete_test(self, test_id : str) -> None:
+        with self._lock:
+            self._tests.pop(test_id, None)
+
+
+class SQLiteTestStorage(TestStorage):
+    # embedded SQLite database, the infos table is read without touching the task bodies
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS test_infos (
+            id TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            name TEXT NOT NULL,
+            description TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            hash TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS test_infos_owner ON test_infos (owner);
+        CREATE TABLE IF NOT EXISTS test_bodies (
+            id TEXT PRIMARY KEY REFERENCES test_infos(id) ON DELETE CASCADE,
+            test TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS test_id_counters (
+            username TEXT PRIMARY KEY,
+            counter INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path : str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # one connection per process: PRAGMA data_version then only changes on commits of other workers
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.RLock()
+        with self._lock:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute('PRAGMA foreign_keys=ON')
+            self._connection.executescript(self.SCHEMA)
+
+    def _transaction(self, statements : list[tuple[str, tuple]], query : Optional[tuple[str, tuple]] = None) -> Optional[tuple]:
+        # the optional query reads its row inside of the same transaction
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                for sql, params in statements:
+                    cursor.execute(sql, params)
+                row = cursor.execute(*query).fetchone() if query is not None else None
+                cursor.execute('COMMIT')
+                return row
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM test_infos').fetchone()[0] == 0 \
+                and self._connection.execute('SELECT COUNT(*) FROM test_id_counters').fetchone()[0] == 0
+
+    def data_version(self) -> int:
+        with self._lock:
+            return self._connection.execute('PRAGMA data_version').fetchone()[0]
+
+    def load(self) -> tuple[dict, dict]:
+        # the rows were written from validated models
+        with self._lock:
+            tests = dict()
+            for test_id, owner, name, description, version, content_hash in self._connection.execute(
+                    'SELECT id, owner, name, description, version, hash FROM test_infos ORDER BY rowid'):
+                tests.setdefault(owner, dict())[test_id] = StoredTest.model_construct(
+                    info=TestInfo.model_construct(id=test_id, name=name, description=description),
+                    version=version,
+                    hash=content_hash
+                )
+            id_counters = dict(self._connection.execute('SELECT username, counter FROM test_id_counters'))
+            return tests, id_counters
+
+    def load_test(self, test_id : str) -> Optional[Test]:
+        with self._lock:
+            row = self._connection.execute('SELECT test FROM test_bodies WHERE id = ?', (test_id,)).fetchone()
+        return Test.model_validate_json(row[0]) if row is not None else None
+
+    def load_test_json(self, test_id : str) -> Optional[bytes]:
+        with self._lock:
+            row = self._connection.execute('SELECT test FROM test_bodies WHERE id = ?', (test_id,)).fetchone()
+        return row[0].encode() if row is not None else None
+
+    def migrate(self, tests : dict, id_counters : dict) -> None:
+        # import the dict based data (e.g. the prefilled database) into an empty storage
+        statements = []
+        for owner, owner_tests in tests.items():
+            for test_id, test in owner_tests.items():
+                statements += self._test_statements(owner, test_id, test)
+        for username, counter in id_counters.items():
+            statements.append(('INSERT INTO test_id_counters (username, counter) VALUES (?, ?) '
+                               'ON CONFLICT (username) DO UPDATE SET counter = excluded.counter', (username, counter)))
+        self._transaction(statements)
+
+    def next_id_counter(self, username : str, counter : int) -> int:
+        # the counter of another worker may be ahead of the one passed
+        return self._transaction([('INSERT INTO test_id_counters (username, counter) VALUES (?, ? + 1) '
+                                   'ON CONFLICT (username) DO UPDATE SET counter = MAX(counter, excluded.counter - 1) + 1',
+                                   (username, counter))],
+                                 query=('SELECT counter FROM test_id_counters WHERE username = ?', (username,)))[0]
+
+    def create_test(self, owner : str, test_id : str, test : Test) -> StoredTest:
+        test_json = test.model_dump_json()
+        content_hash = content_hash_of(test_json)
+        self._transaction([('INSERT INTO test_infos (id, owner, name, description, version, hash) VALUES (?, ?, ?, ?, 1, ?)',
+                            (test_id, owner, test.info.name, test.info.description, content_hash)),
+                           ('INSERT INTO test_bodies (id, test) VALUES (?, ?)', (test_id, test_json))])
+        return StoredTest.model_construct(info=test.info, version=1, hash=content_hash)
+
+    def save_test(self, owner : str, test_id : str, test : Test) -> StoredTest:
+        version, content_hash = self._transaction(self._test_statements(owner, test_id, test),
+                                                  query=('SELECT version, hash FROM test_infos WHERE id = ?', (test_id,)))
+        return StoredTest.model_construct(info=test.info, version=version, hash=content_hash)
+
+    def delete_test(self, test_id : str) -> None:
+        self._transaction([('DELETE FROM test_infos WHERE id = ?', (test_id,))])
+
+    # statements
+
+    def _test_statements(self, owner : str, test_id : str, test : Test) -> list[tuple[str, tuple]]:
+        test_json = test.model_dump_json()
+        return [('INSERT INTO test_infos (id, owner, name, description, version, hash) VALUES (?, ?, ?, ?, 1, ?) '
+                 'ON CONFLICT (id) DO UPDATE SET name = excluded.name, description = excluded.description, '
+                 'version = version + 1, hash = excluded.hash WHERE hash != excluded.hash',
+                 (test_id, owner, test.info.name, test.info.description, content_hash_of(test_json))),
+                ('INSERT INTO test_bodies (id, test) VALUES (?, ?) ON CONFLICT (id) DO UPDATE SET test = excluded.test',
+                 (test_id, test_json))]
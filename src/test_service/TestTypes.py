@@ -1,22 +1,10 @@
-from datetime import datetime
-
-from typing import Any
 from pydantic import BaseModel
 
-from test_service.TaskTypes import Task
-
+from global_types.TestTypes import TestInfo
 
-class TestInfo(BaseModel):
-    id: str
-    name: str
-    description: str
 
-
-class Test(BaseModel):
+class StoredTest(BaseModel):
+    # what the service keeps in memory of a test, the tasks stay in the storage
     info: TestInfo
-    tasks: list[Task]
-    pass_percents: float
-
-
-
-
+    version: int  # increased on every save that changes the content
+    hash: str  # sha256 of the test json
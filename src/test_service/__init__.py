@@ -16,6 +16,9 @@ service_api_url = f'https://{service_api_host}:{service_api_port}'
 
 app = Flask('TestService')
 app.config["SERVICE_SECRET"] = os.getenv('SERVICE_SECRET')
+app.config["LEGACY_JSON_LISTS"] = os.getenv('LEGACY_JSON_LISTS', 'true').lower() == 'true'
+app.config["TEST_STORAGE"] = os.getenv('TEST_STORAGE', 'memory')
+app.config["TEST_DATABASE_PATH"] = os.getenv('TEST_DATABASE_PATH', 'data/tests.db')
 test_service = TestService(app, service_api_url)
 
 
@@ -4,6 +4,8 @@ from flask import Flask, Response, request
 from flask_cors import CORS
 
 from user_service.UserTypes import User, UserInfo, Credentials, Role 
+from global_types.JsonFragments import JsonFragments
+from global_types.WireFormat import negotiate, encode, respond
 
 
 
@@ -14,6 +16,10 @@ class UserService:
         self.service_api_url = service_api_url
         # restrictions
         self.cors = CORS(self.app)
+        # response encoding
+        self.legacy_json_lists = self.app.config.get('LEGACY_JSON_LISTS', True)
+        # username: serialized UserInfo
+        self.user_info_json = JsonFragments()
         # endpoints
         self._register_routes()
         # init database
@@ -44,6 +50,9 @@ class UserService:
         self._prefill_database() 
     
 
+    def _wire_format(self) -> str:
+        return negotiate(request.headers.get('Accept'), self.legacy_json_lists)
+
     # service endpoints
 
     def _get_user_info(self, username: str):
@@ -51,7 +60,8 @@ class UserService:
             if username not in self.USERS:
                 raise Exception('no such User')
             userInfo = self.USERS[username].info
-            return Response(response=userInfo.model_dump_json())
+            wire_format = self._wire_format()
+            return respond(self.user_info_json.fragment(username, userInfo, wire_format), wire_format)
         except Exception as e:
             self.app.logger.error(e)
             return Response(status=500, response=json.dumps(["Cannot get the user info", str(e)]))
@@ -63,7 +73,8 @@ class UserService:
                 raise Exception('only admin can manage users!')
             users_info = [user.info for user in self.USERS.values() if user.info.username not in self.admins]
             users_info.sort(key=lambda info: info.username)
-            return Response(response=json.dumps([info.model_dump_json() for info in users_info]))
+            wire_format = self._wire_format()
+            return respond(self.user_info_json.join(((info.username, info) for info in users_info), wire_format), wire_format)
         except Exception as e:
             self.app.logger.error(e)
             return Response(status=500, response=json.dumps(["Cannot get all users info", str(e)]))
@@ -78,6 +89,7 @@ class UserService:
             if username in self.admins:
                 raise Exception('impossible to delete admin!')
             del self.USERS[username]
+            self.user_info_json.invalidate(username)
             return Response(status=200)
         except Exception as e:
             self.app.logger.error(e)
@@ -93,7 +105,8 @@ class UserService:
             if username not in self.USERS or self.USERS[username].credentials.password != password:
                 raise Exception ("wrong username or password")
             
-            return Response(response=self.USERS[username].info.model_dump_json())
+            wire_format = self._wire_format()
+            return respond(encode(self.USERS[username].info, wire_format), wire_format)
         except Exception as e:
             self.app.logger.error(e)
             return Response(status=500, response=json.dumps(["Cannot log in", str(e)]))
@@ -108,6 +121,7 @@ class UserService:
             if not new_user.credentials.username or not new_user.credentials.password:
                 raise Exception('username and password cannot be empty')
             self.USERS[new_user.info.username] = new_user
+            self.user_info_json.invalidate(new_user.info.username)
             return Response(status=200)
         except Exception as e:
             self.app.logger.error(e)
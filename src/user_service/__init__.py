@@ -16,6 +16,7 @@ service_api_url = f'https://{service_api_host}:{service_api_port}'
 
 app = Flask('UserService')
 app.config["SERVICE_SECRET"] = os.getenv('SERVICE_SECRET')
+app.config["LEGACY_JSON_LISTS"] = os.getenv('LEGACY_JSON_LISTS', 'true').lower() == 'true'
 user_service = UserService(app, service_api_url)
 
 
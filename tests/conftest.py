@@ -0,0 +1,24 @@
+import os
+import sys
+import threading
+
+import pytest
+from flask import Flask
+from werkzeug.serving import make_server
+
+# the services are imported like in their containers, e.g. subject_service.AnswerKey
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')))
+
+
+@pytest.fixture
+def serve():
+    # the services over plain http in this process, like between the containers without tls
+    servers = []
+    def start(app : Flask) -> str:
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_port}'
+    yield start
+    for server in servers:
+        server.shutdown()
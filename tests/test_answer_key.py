@@ -0,0 +1,79 @@
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+from global_types.TaskTypes import TaskType
+from global_types.TestTypes import Test, TestInfo
+from subject_service.AnswerKey import AnswerKey
+from subject_service.TestTypes import TestSolutionAttempt, CheckedAttempt
+
+
+# answers as they arrive from the form: valid options, options outside of the task and values of other types
+SINGLE_CHOICE_ANSWERS = [0, 1, 2, 1.0, 2.5, -1, 7, 'a', None, True, False]
+MULTIPLE_CHOICE_ANSWERS = [0, 1, 2, 3, 1.0, 2.5, -1, 9, 70, 'x', True]
+
+
+def random_test(generator : random.Random) -> Test:
+    tasks = []
+    for _ in range(generator.randint(0, 8)):
+        options = [f'option {option}' for option in range(generator.choice([0, 1, 2, 4, 5, 70]))]
+        if generator.random() < 0.5:
+            tasks.append({'question': 'question', 'tag': 'tag', 'options': options, 'type': TaskType.SINGLE_CHOICE,
+                          'answer': generator.randint(-1, len(options)), 'points': generator.randint(0, 20)})
+        else:
+            answer = generator.sample(range(-1, len(options) + 2), generator.randint(0, min(4, len(options) + 3)))
+            tasks.append({'question': 'question', 'tag': 'tag', 'options': options, 'type': TaskType.MULTIPLE_CHOICE,
+                          'answer': answer, 'points': generator.randint(0, 20)})
+    return Test(info=TestInfo(id='mmm_test_0', name='test', description='test'), tasks=tasks,
+                pass_percents=generator.choice([0, 33.3, 50, 100]))
+
+
+def random_answers(generator : random.Random, test : Test) -> list:
+    answers = []
+    for task in test.tasks[:generator.randint(0, len(test.tasks))]:
+        if task.type == TaskType.SINGLE_CHOICE:
+            answers.append(generator.choice(SINGLE_CHOICE_ANSWERS))
+        else:
+            answers.append(generator.sample(MULTIPLE_CHOICE_ANSWERS, generator.randint(0, 5)))
+    return answers
+
+
+def check_with_tasks(test : Test, solution_attempt : TestSolutionAttempt) -> CheckedAttempt:
+    # the former grading of SubjectService: check_answer of every task
+    task_points = [test.tasks[index].check_answer(answer) for index, answer in enumerate(solution_attempt.answers)]
+    attempt_points = sum(task_points)
+    overall_points = sum([task.points for task in test.tasks])
+    try:
+        attempt_percents = attempt_points / overall_points * 100
+    except Exception:
+        attempt_percents = 100
+    return CheckedAttempt(
+        solution_attempt=solution_attempt,
+        task_points=task_points,
+        attempt_points=attempt_points,
+        overall_points=overall_points,
+        attempt_percents=attempt_percents,
+        passed=(attempt_percents >= test.pass_percents)
+    )
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_answer_key_grades_like_check_answer(seed):
+    generator = random.Random(seed)
+    for _ in range(200):
+        test = random_test(generator)
+        answer_key = AnswerKey(test)
+        solution_attempts = [TestSolutionAttempt(solved_by=f'student_{index}', solved_at=datetime.now(timezone.utc),
+                                                 answers=random_answers(generator, test)) for index in range(5)]
+        expected = [check_with_tasks(test, solution_attempt) for solution_attempt in solution_attempts]
+        assert [answer_key.check(solution_attempt) for solution_attempt in solution_attempts] == expected
+        assert answer_key.check_many(solution_attempts) == expected
+
+
+def test_answer_key_rejects_more_answers_than_tasks():
+    test = random_test(random.Random(0))
+    solution_attempt = TestSolutionAttempt(solved_by='student', solved_at=datetime.now(timezone.utc),
+                                           answers=[0] * (len(test.tasks) + 1))
+    with pytest.raises(Exception):
+        AnswerKey(test).check(solution_attempt)
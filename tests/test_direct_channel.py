@@ -0,0 +1,86 @@
+import json
+
+import pytest
+from flask import Flask
+
+from test_service.TestService import TestService
+from gateway_api_service.GatewayAPIService import GatewayAPIService
+from subject_service.SubjectService import SubjectService
+
+
+SECRETS = {'user_service': 'user_service_secret', 'test_service': 'test_service_secret',
+           'subject_service': 'subject_service_secret', 'service_api': 'service_api_secret'}
+# nothing listens there, a call fails at once
+CLOSED_URL = 'http://127.0.0.1:9'
+
+
+@pytest.fixture
+def test_service_url(serve):
+    app = Flask('TestService')
+    app.config['SERVICE_SECRET'] = SECRETS['test_service']
+    TestService(app, CLOSED_URL)
+    return serve(app)
+
+
+@pytest.fixture
+def gateway_url(serve, test_service_url):
+    app = Flask('GatewayAPIService')
+    app.config['JWT_SECRET_KEY'] = 'test-jwt-secret-key-of-32-bytes!'
+    GatewayAPIService(app, {'user_service': CLOSED_URL, 'test_service': test_service_url, 'subject_service': CLOSED_URL}, SECRETS)
+    return serve(app)
+
+
+def create_subject_service(service_api_url : str, test_service_url : str) -> tuple[Flask, SubjectService]:
+    app = Flask('SubjectService')
+    app.config.update(SERVICE_SECRET=SECRETS['subject_service'], SERVICE_API_SECRET=SECRETS['service_api'],
+                      TEST_SERVICE_URL=test_service_url, TEST_SERVICE_SECRET=SECRETS['test_service'])
+    return app, SubjectService(app, service_api_url)
+
+
+def publish(app : Flask, username : str, remark : str):
+    return app.test_client().post(f'/subject_service/publish_test/mmm_subject_0/mmm_test_0?username={username}',
+                                  data={'remark': json.dumps(remark)}, headers={'ServiceSecret': SECRETS['subject_service']})
+
+
+def record_status_codes(subject_service : SubjectService) -> list[int]:
+    status_codes = []
+    session_get = subject_service.session.get
+    def get(*args, **kwargs):
+        response = session_get(*args, **kwargs)
+        status_codes.append(response.status_code)
+        return response
+    subject_service.session.get = get
+    return status_codes
+
+
+def test_publish_through_the_direct_channel(test_service_url):
+    # the gateway is not reachable, so every test comes straight from the TestService
+    app, subject_service = create_subject_service(CLOSED_URL, test_service_url)
+    status_codes = record_status_codes(subject_service)
+    assert publish(app, 'mmm', 'A').status_code == 200
+    # the second publish only revalidates the cached test
+    assert publish(app, 'mmm', 'B').status_code == 200
+    assert status_codes == [200, 304]
+    assert subject_service.TEST_INSTANCES['mmm_subject_0'][('mmm_test_0', 'B')].test.info.id == 'mmm_test_0'
+
+
+def test_direct_channel_checks_the_owner(test_service_url):
+    app, _ = create_subject_service(CLOSED_URL, test_service_url)
+    response = publish(app, 'musterfrau', 'A')
+    assert response.status_code == 500
+    assert 'cannot retrieve the publisher info' in response.get_data(as_text=True)
+
+
+def test_publish_through_the_gateway(gateway_url):
+    app, subject_service = create_subject_service(gateway_url, None)
+    status_codes = record_status_codes(subject_service)
+    assert publish(app, 'mmm', 'A').status_code == 200
+    assert publish(app, 'mmm', 'B').status_code == 200
+    assert publish(app, 'musterfrau', 'C').status_code == 500
+    assert status_codes[:2] == [200, 304]
+
+
+def test_unreachable_direct_channel_falls_back_to_the_gateway(gateway_url):
+    app, subject_service = create_subject_service(gateway_url, CLOSED_URL)
+    assert publish(app, 'mmm', 'A').status_code == 200
+    assert subject_service._direct_channel_retry_at > 0
@@ -0,0 +1,62 @@
+import json
+
+import msgpack
+import pytest
+from flask import Flask
+from flask_jwt_extended import create_access_token
+
+from gateway_api_service.UserTypes import Role
+from test_service.TestService import TestService
+from gateway_api_service.GatewayAPIService import GatewayAPIService
+
+
+SECRETS = {'user_service': 'user_service_secret', 'test_service': 'test_service_secret',
+           'subject_service': 'subject_service_secret', 'service_api': 'service_api_secret'}
+# nothing listens there, a call fails at once
+CLOSED_URL = 'http://127.0.0.1:9'
+TEST_INFO = {'id': 'mmm_test_0', 'name': 'Mini-Test', 'description': 'math tests'}
+# a teacher batch: its own tests, the admin-only list of all tests and one of its tests
+SUB_REQUESTS = [{'method': 'GET', 'url': '/frontend_api/get_my_tests_info'},
+                {'method': 'GET', 'url': '/frontend_api/get_all_tests_info'},
+                {'method': 'GET', 'url': '/frontend_api/get_test_info/mmm_test_0'}]
+FORBIDDEN = ['Access forbidden', 'the user does not have rights for this operation']
+
+
+@pytest.fixture
+def gateway(serve):
+    test_service = Flask('TestService')
+    test_service.config['SERVICE_SECRET'] = SECRETS['test_service']
+    TestService(test_service, CLOSED_URL)
+    app = Flask('GatewayAPIService')
+    app.config['JWT_SECRET_KEY'] = 'test-jwt-secret-key-of-32-bytes!'
+    # the identity is a (role, username) list, which PyJWT >= 2.10 rejects as the sub claim
+    app.config['JWT_IDENTITY_CLAIM'] = 'identity'
+    GatewayAPIService(app, {'user_service': CLOSED_URL, 'test_service': serve(test_service), 'subject_service': CLOSED_URL}, SECRETS)
+    with app.app_context():
+        token = create_access_token(identity=(Role.TEACHER.value, 'mmm'))
+    client = app.test_client()
+    def batch(accept : str = None):
+        headers = {'Authorization': f'Bearer {token}', **({'Accept': accept} if accept else {})}
+        return client.post('/frontend_api/batch', data={'requests': json.dumps(SUB_REQUESTS)}, headers=headers)
+    return batch
+
+
+def test_legacy_batch_keeps_the_bodies_as_text(gateway):
+    response = gateway()
+    assert response.status_code == 200
+    results = json.loads(response.get_data())
+    assert [result['status'] for result in results] == [200, 403, 200]
+    assert [json.loads(item) for item in json.loads(results[0]['response'])] == [TEST_INFO]
+    assert json.loads(results[1]['response']) == FORBIDDEN
+    assert json.loads(results[2]['response']) == TEST_INFO
+
+
+@pytest.mark.parametrize('accept, unpack', [('application/json', json.loads), ('application/msgpack', msgpack.unpackb)])
+def test_batch_forwards_the_wire_format(gateway, accept, unpack):
+    response = gateway(accept)
+    assert response.status_code == 200
+    assert response.mimetype == accept
+    # the sub-responses are values of the batch body, list items are not double encoded
+    assert unpack(response.get_data()) == [{'status': 200, 'response': [TEST_INFO]},
+                                           {'status': 403, 'response': FORBIDDEN},
+                                           {'status': 200, 'response': TEST_INFO}]
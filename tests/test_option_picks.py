@@ -0,0 +1,42 @@
+import pytest
+
+from global_types.TaskTypes import TaskType
+from global_types.TestTypes import Test, TestInfo
+from subject_service.AnswerKey import AnswerKey
+from subject_service.AttemptTable import AttemptTable, Usernames
+from subject_service.TestAggregate import TestAggregate
+from subject_service.TestAnalytics import compute_test_analytics
+from subject_service.TestTypes import TestSolutionAttempt
+
+
+TEST = Test(info=TestInfo(id='mmm_test_0', name='test', description='test'), pass_percents=50, tasks=[
+    {'question': 'question', 'tag': 'tag', 'options': ['a', 'b', 'c'], 'type': TaskType.SINGLE_CHOICE, 'answer': 1, 'points': 1},
+    {'question': 'question', 'tag': 'tag', 'options': ['a', 'b', 'c'], 'type': TaskType.MULTIPLE_CHOICE, 'answer': [0, 2], 'points': 2},
+])
+
+
+# answers as they arrive from the form, most of them do not fit the packed layout of the attempt table
+@pytest.mark.parametrize('answers', [
+    [1, [0, 2]],
+    [1.0, [0.0, 2]],
+    [2.5, [1, 1.0, 1]],
+    [True, [2, 0, 7, -1, 'x']],
+    ['b', 'not a list'],
+    [None, []],
+])
+def test_aggregate_and_analytics_count_the_same_picks(answers):
+    attempts = AnswerKey(TEST).check_many([TestSolutionAttempt(solved_by=f'student_{index}', solved_at='2024-01-15T10:00:00+00:00',
+                                                               answers=answers if index else [0, [1]]) for index in range(2)])
+    aggregate = TestAggregate(TEST)
+    for attempt in attempts:
+        aggregate.add_attempt(attempt)
+    analytics = compute_test_analytics(TEST, [AttemptTable(TEST, Usernames(), attempts)])
+    assert aggregate.task_results() == [task.option_picks for task in analytics.tasks]
+
+
+def test_integral_floats_are_picks():
+    attempt = AnswerKey(TEST).check(TestSolutionAttempt(solved_by='student', solved_at='2024-01-15T10:00:00+00:00', answers=[1.0, [0.0, 2.0]]))
+    aggregate = TestAggregate(TEST)
+    aggregate.add_attempt(attempt)
+    assert aggregate.task_results() == [[0, 100, 0], [100, 0, 100]]
+    assert attempt.task_points == [1.0, 2.0]
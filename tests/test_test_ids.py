@@ -0,0 +1,35 @@
+import os
+
+import pytest
+from flask import Flask
+
+from global_types.TestTypes import Test, TestInfo
+from test_service.TestService import TestService
+
+
+def create_worker(path : str) -> tuple[Flask, TestService]:
+    app = Flask('TestService')
+    app.config.update(SERVICE_SECRET='test_service_secret', TEST_STORAGE='sqlite', TEST_DATABASE_PATH=path)
+    return app, TestService(app, 'http://127.0.0.1:9')
+
+
+def create_empty_test(app : Flask):
+    return app.test_client().post('/test_service/get_test?username=mmm', headers={'ServiceSecret': 'test_service_secret'})
+
+
+def test_workers_generate_distinct_test_ids(tmp_path):
+    path = os.path.join(tmp_path, 'tests.db')
+    (first_app, first), (second_app, second) = create_worker(path), create_worker(path)
+    created = Test.model_validate_json(create_empty_test(first_app).get_data()).info.id
+    # the second worker has not seen the create yet, its counter is behind
+    generated = second._generate_test_id('mmm')
+    assert generated != created
+    assert Test.model_validate_json(create_empty_test(second_app).get_data()).info.id not in (created, generated)
+
+
+def test_create_does_not_overwrite_a_taken_id(tmp_path):
+    app, service = create_worker(os.path.join(tmp_path, 'tests.db'))
+    test = Test(info=TestInfo(id='mmm_test_0', name='other', description=''), tasks=[], pass_percents=50)
+    with pytest.raises(Exception):
+        service.storage.create_test('mmm', 'mmm_test_0', test)
+    assert service.storage.load_test('mmm_test_0').info.name != 'other'